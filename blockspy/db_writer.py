@@ -0,0 +1,155 @@
+import asyncio
+import logging
+import time
+from typing import Callable, Hashable, List, Optional, Sequence, Tuple
+
+import aiosqlite
+
+Statement = Tuple[str, Sequence]
+
+
+class DbWriter:
+    """
+    Escritor único do monitoramento, com commit em grupo.
+
+    As verificações enfileiram seus comandos SQL (uma lista de `(sql, params)`
+    por resultado) e esta tarefa os grava em lote: comandos iguais viram um
+    único `executemany` e o lote inteiro entra em uma só transação. A fila é
+    limitada, então verificações esperam (backpressure) se o disco não acompanhar.
+
+    `on_commit`, se informado, recebe as chaves de cada lote logo após o commit;
+    `on_discard`, a chave de um resultado que não pôde ser gravado.
+    """
+
+    def __init__(self, connection: aiosqlite.Connection, lock: asyncio.Lock,
+                 max_fila: int = 1000, max_lote: int = 500, intervalo_flush: float = 0.5,
+                 on_commit: Optional[Callable[[List[Hashable]], None]] = None,
+                 on_discard: Optional[Callable[[Hashable], None]] = None):
+        self.connection = connection
+        self.lock = lock
+        self.on_commit = on_commit
+        self.on_discard = on_discard
+        self.max_lote = max_lote
+        self.intervalo_flush = intervalo_flush
+        self.logger = logging.getLogger(self.__class__.__name__)
+        self._fila: asyncio.Queue = asyncio.Queue(maxsize=max_fila)
+        self._pendente = None
+        self._lotes = 0
+        self._resultados = 0
+        self._linhas = 0
+        self._erros = 0
+        self._flush_ultimo = 0.0
+        self._flush_medio = 0.0
+        self._flush_max = 0.0
+        self._espera_media = 0.0
+
+    async def submit(self, chave: Hashable, statements: List[Statement]):
+        """Enfileira os comandos de um resultado. Bloqueia se a fila estiver cheia."""
+        if statements:
+            await self._fila.put((chave, statements, time.monotonic()))
+
+    def stats(self) -> dict:
+        return {
+            "fila": self._fila.qsize(),
+            "fila_max": self._fila.maxsize,
+            "lotes": self._lotes,
+            "resultados": self._resultados,
+            "linhas": self._linhas,
+            "erros": self._erros,
+            "flush_ultimo_ms": round(self._flush_ultimo * 1000, 2),
+            "flush_medio_ms": round(self._flush_medio * 1000, 2),
+            "flush_max_ms": round(self._flush_max * 1000, 2),
+            "espera_media_ms": round(self._espera_media * 1000, 2),
+        }
+
+    async def _coletar_lote(self) -> list:
+        primeiro = self._pendente or await self._fila.get()
+        self._pendente = None
+        lote = [primeiro]
+        chaves = {primeiro[0]}
+        limite = time.monotonic() + self.intervalo_flush
+
+        while len(lote) < self.max_lote:
+            restante = limite - time.monotonic()
+            try:
+                if restante <= 0:
+                    item = self._fila.get_nowait()
+                else:
+                    item = await asyncio.wait_for(self._fila.get(), timeout=restante)
+            except (asyncio.TimeoutError, asyncio.QueueEmpty):
+                break
+            if item[0] in chaves:
+                # Dois resultados da mesma chave no mesmo lote poderiam ser
+                # reordenados pelo agrupamento; o segundo vai para o próximo lote.
+                self._pendente = item
+                break
+            chaves.add(item[0])
+            lote.append(item)
+        return lote
+
+    @staticmethod
+    def _agrupar(lote: list) -> dict:
+        agrupado = {}
+        for _, statements, _ in lote:
+            for sql, params in statements:
+                agrupado.setdefault(sql, []).append(params)
+        return agrupado
+
+    async def _gravar(self, lote: list) -> int:
+        agrupado = self._agrupar(lote)
+        async with self.lock:
+            try:
+                for sql, linhas in agrupado.items():
+                    await self.connection.executemany(sql, linhas)
+                await self.connection.commit()
+            except Exception:
+                await self.connection.rollback()
+                raise
+        if self.on_commit:
+            self.on_commit([item[0] for item in lote])
+        return sum(len(linhas) for linhas in agrupado.values())
+
+    async def _flush(self, lote: list):
+        inicio = time.monotonic()
+        for _, _, enfileirado in lote:
+            self._espera_media += 0.05 * ((inicio - enfileirado) - self._espera_media)
+        try:
+            self._linhas += await self._gravar(lote)
+        except Exception as e:
+            self.logger.error(f"Falha ao gravar lote de {len(lote)} resultados, gravando um a um: {e}")
+            # Isola o resultado problemático para não perder o lote inteiro.
+            for item in lote:
+                try:
+                    self._linhas += await self._gravar([item])
+                except Exception as e_item:
+                    self._erros += 1
+                    self.logger.error(f"Resultado de {item[0]} descartado: {e_item}")
+                    if self.on_discard:
+                        self.on_discard(item[0])
+
+        duracao = time.monotonic() - inicio
+        self._lotes += 1
+        self._resultados += len(lote)
+        self._flush_ultimo = duracao
+        self._flush_max = max(self._flush_max, duracao)
+        self._flush_medio = duracao if self._lotes == 1 else self._flush_medio * 0.95 + duracao * 0.05
+
+    async def run(self):
+        while True:
+            lote = await self._coletar_lote()
+            await self._flush(lote)
+
+    async def drain(self):
+        """Grava tudo o que ainda estiver na fila (usado no encerramento)."""
+        while self._pendente or not self._fila.empty():
+            lote = [self._pendente] if self._pendente else [self._fila.get_nowait()]
+            self._pendente = None
+            chaves = {lote[0][0]}
+            while len(lote) < self.max_lote and not self._fila.empty():
+                item = self._fila.get_nowait()
+                if item[0] in chaves:
+                    self._pendente = item
+                    break
+                chaves.add(item[0])
+                lote.append(item)
+            await self._flush(lote)
@@ -0,0 +1,192 @@
+import asyncio
+import ipaddress
+import logging
+import time
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+
+import dns.asyncresolver
+import dns.exception
+import dns.resolver
+
+PORTA_PADRAO_MINECRAFT = 25565
+
+
+class DnsResolutionError(Exception):
+    """O nome não pôde ser resolvido (resolvedor indisponível e sem cache)."""
+    pass
+
+
+class DnsNotFoundError(DnsResolutionError):
+    """O domínio não existe (NXDOMAIN), possivelmente vindo do cache negativo."""
+    pass
+
+
+class _Entrada:
+    __slots__ = ("valor", "expira", "negativo")
+
+    def __init__(self, valor, expira: float, negativo: bool = False):
+        self.valor = valor
+        self.expira = expira
+        self.negativo = negativo
+
+
+def _e_ip(host: str) -> bool:
+    try:
+        ipaddress.ip_address(host)
+        return True
+    except ValueError:
+        return False
+
+
+def split_address(address: str) -> Tuple[str, Optional[int]]:
+    """Separa 'host:porta' em (host, porta); porta é None quando não informada."""
+    address = address.strip()
+    if address.startswith('['):
+        host, _, resto = address[1:].partition(']')
+        return host, int(resto[1:]) if resto.startswith(':') else None
+    if address.count(':') == 1:
+        host, porta = address.split(':')
+        return host, int(porta)
+    return address, None
+
+
+class DnsCache:
+    """
+    Cache de resolução SRV (`_minecraft._tcp`) e A/AAAA para os servidores monitorados.
+
+    Respostas positivas ficam em cache pelo TTL do próprio registro (limitado
+    entre `ttl_minimo` e `ttl_maximo`), NXDOMAIN fica em cache negativo, e se o
+    resolvedor falhar usamos a última resposta conhecida, mesmo expirada.
+    """
+
+    def __init__(self, ttl_minimo: int = 30, ttl_maximo: int = 3600, ttl_negativo: int = 300,
+                 timeout: float = 5.0):
+        self.ttl_minimo = ttl_minimo
+        self.ttl_maximo = ttl_maximo
+        self.ttl_negativo = ttl_negativo
+        self.timeout = timeout
+        self.logger = logging.getLogger(self.__class__.__name__)
+        self._entradas: Dict[tuple, _Entrada] = {}
+        self._em_andamento: Dict[tuple, asyncio.Future] = {}
+        self._acertos = 0
+        self._falhas = 0
+        self._consultas = 0
+        self._obsoletos_usados = 0
+        self._resolver: Optional[dns.asyncresolver.Resolver] = None
+
+    def _get_resolver(self) -> dns.asyncresolver.Resolver:
+        if self._resolver is None:
+            self._resolver = dns.asyncresolver.Resolver()
+            self._resolver.lifetime = self.timeout
+        return self._resolver
+
+    def _ttl(self, ttl: int) -> float:
+        return time.monotonic() + min(max(ttl, self.ttl_minimo), self.ttl_maximo)
+
+    async def _cached(self, chave: tuple, consultar: Callable[[], Awaitable[Tuple[object, int]]]):
+        entrada = self._entradas.get(chave)
+        if entrada and entrada.expira > time.monotonic():
+            self._acertos += 1
+            if entrada.negativo:
+                raise DnsNotFoundError(f"{chave[1]} não existe (cache negativo).")
+            return entrada.valor
+
+        # Várias verificações do mesmo nome ao mesmo tempo compartilham uma consulta.
+        pendente = self._em_andamento.get(chave)
+        if pendente:
+            return await asyncio.shield(pendente)
+
+        self._falhas += 1
+        futuro = asyncio.get_running_loop().create_future()
+        self._em_andamento[chave] = futuro
+        try:
+            valor = await self._consultar(chave, entrada, consultar)
+            futuro.set_result(valor)
+            return valor
+        except Exception as e:
+            futuro.set_exception(e)
+            # Evita o aviso de exceção nunca lida quando ninguém mais esperava.
+            futuro.exception()
+            raise
+        finally:
+            self._em_andamento.pop(chave, None)
+
+    async def _consultar(self, chave: tuple, antiga: Optional[_Entrada], consultar):
+        self._consultas += 1
+        try:
+            valor, ttl = await consultar()
+        except dns.resolver.NXDOMAIN:
+            self._entradas[chave] = _Entrada(None, time.monotonic() + self.ttl_negativo, negativo=True)
+            raise DnsNotFoundError(f"{chave[1]} não existe.")
+        except (dns.exception.DNSException, OSError) as e:
+            if antiga and not antiga.negativo:
+                self._obsoletos_usados += 1
+                self.logger.warning(f"Falha no DNS para {chave[1]} ({e}); usando resposta anterior.")
+                return antiga.valor
+            raise DnsResolutionError(f"Não foi possível resolver {chave[1]}: {e}")
+        self._entradas[chave] = _Entrada(valor, self._ttl(ttl))
+        return valor
+
+    async def resolve_server(self, address: str) -> Tuple[str, int]:
+        """Resolve o endereço de um servidor Minecraft para (host, porta), seguindo o SRV."""
+        host, porta = split_address(address)
+        if porta is not None or _e_ip(host):
+            return host, porta or PORTA_PADRAO_MINECRAFT
+
+        async def consultar():
+            try:
+                resposta = await self._get_resolver().resolve(f"_minecraft._tcp.{host}", "SRV")
+            except (dns.resolver.NoAnswer, dns.resolver.NXDOMAIN):
+                # Sem registro SRV: conecta direto no host, porta padrão.
+                return (host, PORTA_PADRAO_MINECRAFT), self.ttl_negativo
+            registro = resposta[0]
+            return (str(registro.target).rstrip('.'), int(registro.port)), resposta.rrset.ttl
+
+        return await self._cached(("SRV", host), consultar)
+
+    async def resolve_ip(self, host: str) -> str:
+        """Resolve um nome para um endereço IP (A, ou AAAA se não houver A)."""
+        if _e_ip(host):
+            return host
+
+        async def consultar():
+            resolver = self._get_resolver()
+            try:
+                resposta = await resolver.resolve(host, "A")
+            except dns.resolver.NoAnswer:
+                resposta = await resolver.resolve(host, "AAAA")
+            return resposta[0].to_text(), resposta.rrset.ttl
+
+        return await self._cached(("A", host), consultar)
+
+    def flush(self, host: Optional[str] = None) -> int:
+        """Limpa o cache inteiro, ou só as entradas de um host. Retorna quantas foram removidas."""
+        if host is None:
+            removidas = len(self._entradas)
+            self._entradas.clear()
+            return removidas
+        host = split_address(host)[0]
+        chaves = [c for c in self._entradas if c[1] == host]
+        # O endereço do destino do SRV sai junto, para a próxima verificação resolver tudo de novo.
+        srv = self._entradas.get(("SRV", host))
+        if srv and not srv.negativo and srv.valor[0] != host and ("A", srv.valor[0]) in self._entradas:
+            chaves.append(("A", srv.valor[0]))
+        for chave in chaves:
+            del self._entradas[chave]
+        return len(chaves)
+
+    def stats(self) -> dict:
+        agora = time.monotonic()
+        return {
+            "entradas": len(self._entradas),
+            "validas": sum(1 for e in self._entradas.values() if e.expira > agora),
+            "negativas": sum(1 for e in self._entradas.values() if e.negativo),
+            "acertos": self._acertos,
+            "falhas": self._falhas,
+            "consultas": self._consultas,
+            "respostas_obsoletas_usadas": self._obsoletos_usados,
+        }
+
+
+# Instância compartilhada pelo processo (cada processo de verificação tem a sua).
+dns_cache = DnsCache()
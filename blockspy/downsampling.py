@@ -0,0 +1,97 @@
+from collections import deque
+from typing import Any, List, Optional, Tuple
+
+
+class LttbDownsampler:
+    """
+    Largest-Triangle-Three-Buckets em fluxo, com buckets de tempo fixo.
+
+    A janela [inicio, fim] é dividida em `pontos - 2` buckets de mesma largura;
+    o primeiro e o último ponto são sempre mantidos e, de cada bucket, fica o
+    ponto que forma o maior triângulo com o ponto escolhido antes e a média do
+    bucket seguinte. Como os pontos chegam em ordem, basta guardar dois buckets
+    por vez: `push()` devolve o que já pode ser emitido e `finish()` o restante.
+
+    Pontos com `y` None (servidor offline) não concorrem no triângulo; um
+    bucket com algum deles é representado pelo primeiro, no lugar do escolhido,
+    para que a queda continue visível. Cada bucket emite um ponto só, então a
+    saída nunca passa de `pontos`.
+    """
+
+    def __init__(self, inicio: float, fim: float, pontos: int):
+        if pontos < 3:
+            raise ValueError("são necessários pelo menos 3 pontos")
+        self.inicio = inicio
+        self.max_bucket = pontos - 3
+        self.largura = max((fim - inicio) / (pontos - 2), 1e-9)
+        self._buckets = deque()  # [indice, [(x, y, item), ...]]
+        self._anterior: Optional[Tuple[float, float]] = None
+        self._ultimo = None
+        self._iniciado = False
+
+    def push(self, x: float, y: Optional[float], item: Any) -> List[Any]:
+        if not self._iniciado:
+            self._iniciado = True
+            if y is not None:
+                self._anterior = (x, y)
+            return [item]
+        # O ponto mais recente fica guardado: se for o último, é emitido por `finish()`.
+        pendente, self._ultimo = self._ultimo, (x, y, item)
+        return self._adicionar(pendente) if pendente else []
+
+    def finish(self) -> List[Any]:
+        saida = []
+        while self._buckets:
+            _, pontos = self._buckets.popleft()
+            if self._buckets:
+                proximo = self._media(self._buckets[0][1])
+            else:
+                proximo = self._media([self._ultimo]) if self._ultimo else None
+            saida.extend(self._selecionar(pontos, proximo))
+        if self._ultimo:
+            saida.append(self._ultimo[2])
+            self._ultimo = None
+        return saida
+
+    def _adicionar(self, ponto) -> List[Any]:
+        indice = min(max(int((ponto[0] - self.inicio) // self.largura), 0), self.max_bucket)
+        if self._buckets and self._buckets[-1][0] == indice:
+            self._buckets[-1][1].append(ponto)
+            return []
+        self._buckets.append([indice, [ponto]])
+        saida = []
+        # Com um terceiro bucket aberto, o segundo está completo e serve de referência para o primeiro.
+        while len(self._buckets) >= 3:
+            _, pontos = self._buckets.popleft()
+            saida.extend(self._selecionar(pontos, self._media(self._buckets[0][1])))
+        return saida
+
+    @staticmethod
+    def _media(pontos) -> Optional[Tuple[float, float]]:
+        validos = [p for p in pontos if p[1] is not None]
+        if not validos:
+            return None
+        return sum(p[0] for p in validos) / len(validos), sum(p[1] for p in validos) / len(validos)
+
+    def _selecionar(self, pontos, proximo) -> List[Any]:
+        offline = next((p for p in pontos if p[1] is None), None)
+        if offline is not None:
+            # A referência do próximo triângulo continua sendo o último ponto online emitido.
+            return [offline[2]]
+        escolhido = None
+        if self._anterior is None or proximo is None:
+            # Sem referência de um dos lados: fica com o pico do bucket.
+            for p in pontos:
+                if escolhido is None or p[1] > escolhido[1]:
+                    escolhido = p
+        else:
+            ax, ay = self._anterior
+            cx, cy = proximo
+            maior_area = -1.0
+            for p in pontos:
+                area = abs((ax - cx) * (p[1] - ay) - (ax - p[0]) * (cy - ay))
+                if area > maior_area:
+                    maior_area, escolhido = area, p
+
+        self._anterior = (escolhido[0], escolhido[1])
+        return [escolhido[2]]
@@ -0,0 +1,122 @@
+import os
+from typing import Dict, Iterable, List, Optional, Set
+
+from blockspy.utils import dumps_json
+
+# Colunas de `servidores` que podem ir para o navegador (sem senha RCON nem webhook).
+COLUNAS_PUBLICAS_SERVIDOR = (
+    'id', 'ip_servidor', 'nome_servidor', 'nome_customizado', 'versao', 'jogadores_online', 'jogadores_maximos',
+    'ping', 'status', 'pausado', 'tem_icone_customizado', 'icone_hash', 'localizacao', 'tipo_servidor',
+    'caminho_servidor', 'rcon_port', 'ultima_verificacao', 'notificar_online_offline', 'notificar_pico_jogadores',
+    'notificar_marcos_lotacao', 'notificar_primeira_entrada', 'intervalo_min', 'intervalo_max',
+)
+CAMPOS_ESTADO = COLUNAS_PUBLICAS_SERVIDOR + ('rcon_configurado',)
+# Campos escritos pelas verificações; na memória podem estar à frente do banco (escritor em lote).
+CAMPOS_VERIFICACAO = (
+    'status', 'nome_servidor', 'versao', 'jogadores_online', 'jogadores_maximos', 'ping',
+    'tem_icone_customizado', 'icone_hash', 'localizacao', 'ultima_verificacao', 'tipo_servidor',
+)
+
+
+class ServerState:
+    """Estado atual de um servidor (só os campos públicos), indexável como uma linha do banco."""
+
+    __slots__ = CAMPOS_ESTADO
+
+    def __init__(self, linha):
+        for campo in CAMPOS_ESTADO:
+            setattr(self, campo, linha[campo])
+        self.rcon_configurado = bool(self.rcon_configurado)
+
+    def __getitem__(self, campo: str):
+        return getattr(self, campo)
+
+    def update(self, campos: dict) -> bool:
+        """Aplica os campos alterados; retorna True se algum valor mudou de fato."""
+        mudou = False
+        for campo, valor in campos.items():
+            if getattr(self, campo) != valor:
+                setattr(self, campo, valor)
+                mudou = True
+        return mudou
+
+    def to_dict(self) -> dict:
+        return {campo: getattr(self, campo) for campo in CAMPOS_ESTADO}
+
+
+class FleetRegistry:
+    """
+    Estado em memória de todos os servidores, fonte da lista do painel.
+
+    As verificações atualizam os registros no lugar e avançam `versao`; o
+    SQLite continua sendo a cópia durável, relida por inteiro só depois de
+    inclusões, remoções e edições. O JSON de `/api/servers` é gerado uma vez
+    por versão e reaproveitado por todos os pedidos até a próxima mudança.
+    """
+
+    def __init__(self):
+        self._servidores: Dict[int, ServerState] = {}
+        self.versao = 0
+        self._json: Optional[bytes] = None
+        self._versao_json = -1
+        self._serializacoes = 0
+        self._instancia = os.urandom(4).hex()
+
+    def load(self, linhas: Iterable):
+        """Recarrega do banco, mantendo o resultado mais recente das verificações ainda não gravado."""
+        servidores = {}
+        for linha in linhas:
+            estado = ServerState(linha)
+            anterior = self._servidores.get(estado.id)
+            if anterior is not None:
+                for campo in CAMPOS_VERIFICACAO:
+                    setattr(estado, campo, getattr(anterior, campo))
+            servidores[estado.id] = estado
+        self._servidores = servidores
+        self.versao += 1
+
+    def get(self, server_id: int) -> Optional[ServerState]:
+        return self._servidores.get(server_id)
+
+    def ids(self) -> Set[int]:
+        return set(self._servidores)
+
+    def active_ids(self) -> Set[int]:
+        return {server_id for server_id, estado in self._servidores.items() if not estado.pausado}
+
+    def update(self, server_id: int, **campos) -> bool:
+        estado = self._servidores.get(server_id)
+        if estado is None or not estado.update(campos):
+            return False
+        self.versao += 1
+        return True
+
+    def rows(self, server_ids: Optional[Iterable[int]] = None) -> List[dict]:
+        if server_ids is None:
+            return [estado.to_dict() for estado in self._servidores.values()]
+        return [self._servidores[sid].to_dict() for sid in server_ids if sid in self._servidores]
+
+    @property
+    def etag(self) -> str:
+        return f'W/"{self._instancia}-{self.versao}"'
+
+    def json_bytes(self) -> bytes:
+        """Lista pública ordenada por jogadores online, serializada só quando o estado mudou."""
+        if self._versao_json != self.versao:
+            linhas = self.rows()
+            linhas.sort(key=lambda s: s['jogadores_online'] or 0, reverse=True)
+            self._json = dumps_json(linhas)
+            self._versao_json = self.versao
+            self._serializacoes += 1
+        return self._json
+
+    def __len__(self) -> int:
+        return len(self._servidores)
+
+    def stats(self) -> dict:
+        return {
+            "servidores": len(self._servidores),
+            "versao": self.versao,
+            "serializacoes": self._serializacoes,
+            "bytes_resposta": len(self._json) if self._json else 0,
+        }
@@ -0,0 +1,215 @@
+import bisect
+import csv
+import gzip
+import ipaddress
+import logging
+import os
+import threading
+from array import array
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional, Tuple
+
+try:
+    import maxminddb
+except ImportError:  # Dependência opcional, só para bases .mmdb.
+    maxminddb = None
+
+from blockspy.utils import get_persistent_data_path
+
+# Procurados na pasta de dados (~/BlockSpy), nesta ordem.
+ARQUIVOS_GEOIP = ('geoip.mmdb', 'geoip.csv', 'geoip.csv.gz')
+
+Pais = Tuple[str, str]  # (código ISO, nome)
+
+
+def _abrir_texto(caminho: str):
+    if caminho.endswith('.gz'):
+        return gzip.open(caminho, 'rt', encoding='utf-8', errors='ignore', newline='')
+    return open(caminho, 'r', encoding='utf-8', errors='ignore', newline='')
+
+
+def _para_int(valor: str) -> Tuple[int, int]:
+    """Converte um IP (texto ou inteiro decimal) em (versão, inteiro)."""
+    valor = valor.strip()
+    if valor.isdigit():
+        numero = int(valor)
+        return (4 if numero < 2 ** 32 else 6), numero
+    ip = ipaddress.ip_address(valor)
+    return ip.version, int(ip)
+
+
+class _Faixas:
+    """Faixas ordenadas de uma versão de IP, com busca binária."""
+
+    __slots__ = ("inicios", "fins", "paises")
+
+    def __init__(self, inicios, fins, paises):
+        self.inicios = inicios
+        self.fins = fins
+        self.paises = paises
+
+    def find(self, numero: int) -> int:
+        i = bisect.bisect_right(self.inicios, numero) - 1
+        if i >= 0 and numero <= self.fins[i]:
+            return self.paises[i]
+        return -1
+
+
+class GeoIpDatabase:
+    """
+    Base de geolocalização local (país por IP).
+
+    Aceita uma base MaxMind/DB-IP em .mmdb (se `maxminddb` estiver instalado) ou
+    um CSV de faixas `inicio,fim,codigo[,nome]` (formatos DB-IP e IP2Location
+    LITE), compilado em arrays ordenados e consultado com bisect.
+    """
+
+    def __init__(self, cache_size: int = 8192):
+        self.logger = logging.getLogger(self.__class__.__name__)
+        self.caminho: Optional[str] = None
+        self._paises: List[Pais] = []
+        self._faixas: Dict[int, _Faixas] = {}
+        self._mmdb = None
+        self._lookup_cached = lru_cache(maxsize=cache_size)(self._lookup)
+
+    @property
+    def disponivel(self) -> bool:
+        return bool(self._faixas) or self._mmdb is not None
+
+    @classmethod
+    def from_default_paths(cls) -> "GeoIpDatabase":
+        base = cls()
+        for nome in ARQUIVOS_GEOIP:
+            caminho = get_persistent_data_path(nome)
+            if not os.path.exists(caminho):
+                continue
+            try:
+                base.load(caminho)
+                break
+            except Exception as e:
+                base.logger.warning(f"Não foi possível carregar a base de geolocalização {caminho}: {e}")
+        return base
+
+    def load(self, caminho: str):
+        if caminho.endswith('.mmdb'):
+            if maxminddb is None:
+                raise RuntimeError("o pacote 'maxminddb' não está instalado")
+            self._mmdb = maxminddb.open_database(caminho)
+        else:
+            self._load_csv(caminho)
+        self.caminho = caminho
+        self._lookup_cached.cache_clear()
+        self.logger.info(f"Base de geolocalização carregada de {caminho}.")
+
+    def _load_csv(self, caminho: str):
+        indices: Dict[Pais, int] = {}
+        paises: List[Pais] = []
+        linhas = {4: [], 6: []}
+        with _abrir_texto(caminho) as f:
+            for registro in csv.reader(f):
+                if len(registro) < 3:
+                    continue
+                try:
+                    versao, inicio = _para_int(registro[0])
+                    _, fim = _para_int(registro[1])
+                except ValueError:
+                    continue  # Cabeçalho ou linha inválida.
+                codigo = registro[2].strip().upper()
+                if not codigo or codigo in ('-', 'ZZ'):
+                    continue
+                nome = registro[3].strip() if len(registro) > 3 else codigo
+                pais = (codigo, nome)
+                if pais not in indices:
+                    indices[pais] = len(paises)
+                    paises.append(pais)
+                linhas[versao].append((inicio, fim, indices[pais]))
+
+        faixas = {}
+        for versao, registros in linhas.items():
+            if not registros:
+                continue
+            registros.sort()
+            if versao == 4:
+                faixas[4] = _Faixas(array('I', (r[0] for r in registros)),
+                                    array('I', (r[1] for r in registros)),
+                                    array('H', (r[2] for r in registros)))
+            else:
+                # Endereços IPv6 não cabem em arrays de tamanho fixo.
+                faixas[6] = _Faixas([r[0] for r in registros], [r[1] for r in registros],
+                                    array('H', (r[2] for r in registros)))
+        self._paises = paises
+        self._faixas = faixas
+
+    def _lookup(self, ip: str) -> Optional[Pais]:
+        if self._mmdb is not None:
+            registro = self._mmdb.get(ip) or {}
+            pais = registro.get('country') or registro.get('registered_country') or {}
+            codigo = pais.get('iso_code')
+            if not codigo:
+                return None
+            return codigo, pais.get('names', {}).get('en', codigo)
+
+        endereco = ipaddress.ip_address(ip)
+        faixas = self._faixas.get(endereco.version)
+        if not faixas:
+            return None
+        indice = faixas.find(int(endereco))
+        return self._paises[indice] if indice >= 0 else None
+
+    def lookup(self, ip: str) -> Optional[Pais]:
+        """Retorna (código, nome) do país do IP, ou None se não estiver na base."""
+        return self._lookup_cached(ip)
+
+    def lookup_many(self, ips: Iterable[str]) -> Dict[str, Optional[Pais]]:
+        """Consulta vários IPs de uma vez, percorrendo as faixas em ordem."""
+        if self._mmdb is not None:
+            return {ip: self.lookup(ip) for ip in set(ips)}
+
+        resultado: Dict[str, Optional[Pais]] = {}
+        por_versao: Dict[int, List[Tuple[int, str]]] = {4: [], 6: []}
+        for ip in set(ips):
+            try:
+                endereco = ipaddress.ip_address(ip)
+            except ValueError:
+                resultado[ip] = None
+                continue
+            por_versao[endereco.version].append((int(endereco), ip))
+
+        for versao, enderecos in por_versao.items():
+            faixas = self._faixas.get(versao)
+            enderecos.sort()
+            inicio_busca = 0
+            for numero, ip in enderecos:
+                # Como os IPs estão ordenados, a busca continua de onde parou.
+                i = bisect.bisect_right(faixas.inicios, numero, inicio_busca) - 1 if faixas else -1
+                if i >= 0 and numero <= faixas.fins[i]:
+                    resultado[ip] = self._paises[faixas.paises[i]]
+                else:
+                    resultado[ip] = None
+                inicio_busca = max(i, 0)
+        return resultado
+
+    def stats(self) -> dict:
+        info = self._lookup_cached.cache_info()
+        return {
+            "arquivo": self.caminho,
+            "faixas_ipv4": len(self._faixas[4].inicios) if 4 in self._faixas else 0,
+            "faixas_ipv6": len(self._faixas[6].inicios) if 6 in self._faixas else 0,
+            "cache_acertos": info.hits,
+            "cache_falhas": info.misses,
+            "cache_tamanho": info.currsize,
+        }
+
+
+_base: Optional[GeoIpDatabase] = None
+_base_lock = threading.Lock()
+
+
+def get_geoip_database() -> GeoIpDatabase:
+    """Base compartilhada, carregada na primeira chamada."""
+    global _base
+    if _base is None:
+        with _base_lock:
+            if _base is None:
+                _base = GeoIpDatabase.from_default_paths()
+    return _base
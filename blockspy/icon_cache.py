@@ -0,0 +1,69 @@
+import base64
+import binascii
+import hashlib
+import logging
+import os
+from typing import Callable, Optional
+
+from blockspy.utils import get_persistent_data_path
+
+
+class IconCache:
+    """
+    Ícones dos servidores, salvos em disco pelo hash do conteúdo.
+
+    O ícone vem em `status.icon` como data URI em base64. O hash é calculado
+    sobre esse texto, então uma verificação com o mesmo ícone não decodifica
+    nem grava nada; o arquivo só é escrito quando ainda não existe em disco, e o
+    do hash anterior é apagado quando o ícone do servidor muda.
+    """
+
+    def __init__(self, pasta: Optional[str] = None, compartilhado: Optional[Callable[[str], bool]] = None):
+        self.pasta = pasta or get_persistent_data_path('icons')
+        os.makedirs(self.pasta, exist_ok=True)
+        # Diz se outro servidor ainda usa o ícone com esse hash (o arquivo não é apagado).
+        self.compartilhado = compartilhado
+        self.logger = logging.getLogger(self.__class__.__name__)
+
+    @staticmethod
+    def _payload(data_uri: str) -> str:
+        return data_uri.split(',', 1)[1] if data_uri.startswith('data:') else data_uri
+
+    def path(self, icone_hash: str) -> str:
+        return os.path.join(self.pasta, f"{icone_hash}.png")
+
+    def store(self, data_uri: str, hash_atual: Optional[str] = None) -> Optional[str]:
+        """Salva o ícone (se ainda não existir) e retorna o hash do conteúdo."""
+        payload = self._payload(data_uri).strip()
+        icone_hash = hashlib.sha256(payload.encode('ascii', errors='ignore')).hexdigest()[:32]
+        # Só o arquivo decide: um ícone apagado do disco é regravado na próxima verificação.
+        if not os.path.exists(self.path(icone_hash)):
+            try:
+                conteudo = base64.b64decode(payload, validate=False)
+            except (binascii.Error, ValueError) as e:
+                self.logger.warning(f"Ícone recebido em base64 inválido: {e}")
+                return hash_atual
+            temporario = self.path(icone_hash) + '.tmp'
+            with open(temporario, 'wb') as f:
+                f.write(conteudo)
+            os.replace(temporario, self.path(icone_hash))
+        if hash_atual and hash_atual != icone_hash:
+            self._remove(hash_atual)
+        return icone_hash
+
+    def _remove(self, icone_hash: str):
+        if self.compartilhado and self.compartilhado(icone_hash):
+            return
+        try:
+            os.remove(self.path(icone_hash))
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            self.logger.warning(f"Não foi possível apagar o ícone antigo {icone_hash}: {e}")
+
+    def read(self, icone_hash: str) -> Optional[bytes]:
+        try:
+            with open(self.path(icone_hash), 'rb') as f:
+                return f.read()
+        except OSError:
+            return None
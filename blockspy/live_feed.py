@@ -0,0 +1,158 @@
+import asyncio
+import logging
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional, Set
+
+from blockspy.utils import dumps_json
+
+Carregador = Callable[[Optional[List[int]]], Awaitable[List[dict]]]
+
+
+def _serializar(dados: dict) -> str:
+    return dumps_json(dados).decode('utf-8')
+
+
+class FeedSubscriber:
+    """Fila de quadros de um navegador conectado."""
+
+    __slots__ = ("fila", "atrasado")
+
+    def __init__(self, tamanho: int):
+        self.fila: asyncio.Queue = asyncio.Queue(maxsize=tamanho)
+        # Cliente lento demais: os diffs pendentes são descartados e ele recebe um snapshot novo.
+        self.atrasado = False
+
+    def entregar(self, quadro: str):
+        if self.atrasado:
+            return
+        try:
+            self.fila.put_nowait(quadro)
+        except asyncio.QueueFull:
+            self.atrasado = True
+            while not self.fila.empty():
+                self.fila.get_nowait()
+            self.fila.put_nowait(None)  # Acorda o envio para mandar o snapshot.
+
+
+class ServerFeed:
+    """
+    Estado ao vivo da lista de servidores para os painéis conectados.
+
+    Guarda a última versão pública de cada servidor. Quando o escritor
+    confirma resultados, os servidores afetados são marcados; a cada `tick`
+    eles são relidos, comparados campo a campo com o estado anterior, e só o
+    que mudou vira um quadro de diff. O quadro é serializado uma vez e o mesmo
+    texto vai para todos os navegadores.
+    """
+
+    def __init__(self, carregar: Carregador, tick: float = 0.25, tamanho_fila: int = 64):
+        self.carregar = carregar
+        self.tick = tick
+        self.tamanho_fila = tamanho_fila
+        self.logger = logging.getLogger(self.__class__.__name__)
+        self._estado: Dict[int, dict] = {}
+        self._sujos: Set[int] = set()
+        self._recarregar_tudo = True
+        self._acordar: Optional[asyncio.Event] = None
+        self._assinantes: Set[FeedSubscriber] = set()
+        self._seq = 0
+        self._snapshot: Optional[str] = None
+        self._quadros = 0
+        self._bytes_enviados = 0
+
+    def mark_dirty(self, server_ids: Optional[Iterable[int]] = None):
+        """Marca servidores como alterados; sem argumento, relê a lista inteira (inclusão/remoção)."""
+        if server_ids is None:
+            self._recarregar_tudo = True
+        else:
+            self._sujos.update(server_ids)
+        if self._acordar:
+            self._acordar.set()
+
+    def subscribe(self) -> FeedSubscriber:
+        assinante = FeedSubscriber(self.tamanho_fila)
+        self._assinantes.add(assinante)
+        return assinante
+
+    def unsubscribe(self, assinante: FeedSubscriber):
+        self._assinantes.discard(assinante)
+
+    def snapshot(self) -> str:
+        if self._snapshot is None:
+            self._snapshot = _serializar({"type": "snapshot", "seq": self._seq, "servers": list(self._estado.values())})
+        return self._snapshot
+
+    async def next_frame(self, assinante: FeedSubscriber) -> str:
+        quadro = await assinante.fila.get()
+        if quadro is None or assinante.atrasado:
+            assinante.atrasado = False
+            return self.snapshot()
+        return quadro
+
+    async def _atualizar(self) -> Optional[str]:
+        if self._recarregar_tudo:
+            self._recarregar_tudo = False
+            self._sujos.clear()
+            linhas = await self.carregar(None)
+            removidos = [sid for sid in self._estado if sid not in {linha['id'] for linha in linhas}]
+        else:
+            ids = sorted(self._sujos)
+            self._sujos.clear()
+            linhas = await self.carregar(ids)
+            encontrados = {linha['id'] for linha in linhas}
+            removidos = [sid for sid in ids if sid not in encontrados and sid in self._estado]
+
+        mudancas = []
+        for linha in linhas:
+            anterior = self._estado.get(linha['id'])
+            if anterior is None:
+                mudancas.append(linha)
+            else:
+                diff = {campo: valor for campo, valor in linha.items() if anterior.get(campo) != valor}
+                if diff:
+                    diff['id'] = linha['id']
+                    mudancas.append(diff)
+            self._estado[linha['id']] = linha
+        for sid in removidos:
+            self._estado.pop(sid, None)
+
+        if not mudancas and not removidos:
+            return None
+        self._seq += 1
+        self._snapshot = None
+        return _serializar({"type": "diff", "seq": self._seq, "servers": mudancas, "removed": removidos})
+
+    def _publicar(self, quadro: str):
+        self._quadros += 1
+        for assinante in list(self._assinantes):
+            assinante.entregar(quadro)
+            self._bytes_enviados += len(quadro)
+
+    async def run(self):
+        self._acordar = asyncio.Event()
+        while True:
+            await self._acordar.wait()
+            # Junta os commits que chegarem dentro do mesmo tick em um só quadro.
+            await asyncio.sleep(self.tick)
+            self._acordar.clear()
+            try:
+                quadro = await self._atualizar()
+            except Exception as e:
+                self.logger.error(f"Erro ao atualizar o painel ao vivo: {e}")
+                self._recarregar_tudo = True
+                continue
+            if quadro:
+                self._publicar(quadro)
+
+    async def prime(self):
+        """Carrega o estado inicial (para o primeiro snapshot não sair vazio)."""
+        await self._atualizar()
+        self._snapshot = None
+
+    def stats(self) -> dict:
+        return {
+            "assinantes": len(self._assinantes),
+            "servidores": len(self._estado),
+            "seq": self._seq,
+            "quadros": self._quadros,
+            "bytes_enviados": self._bytes_enviados,
+        }
@@ -0,0 +1,348 @@
+import asyncio
+import gzip
+import logging
+import os
+import re
+import time
+import zlib
+from datetime import datetime
+from typing import Callable, Iterable, List, Optional, Tuple
+
+import aiosqlite
+
+from blockspy.migrations import apply_pragmas
+
+# Linhas gravadas por transação; entre dois lotes o índice pode ser consultado e o processo encerrado.
+LINHAS_POR_LOTE = 5000
+NOME_LOG_ATUAL = 'latest.log'
+# Logs rotacionados pelo servidor: 2026-10-18-1.log.gz
+RE_LOG_ROTACIONADO = re.compile(r'^(\d{4}-\d{2}-\d{2})-(\d+)\.log(?:\.gz)?$')
+# Um .gz incompleto mais velho que isso não está mais sendo escrito: é dado como corrompido.
+IDADE_GZ_INCOMPLETO = 600
+MAX_CONTEXTO = 10
+MAX_RESULTADOS = 200
+# O rowid de cada linha é (arquivo_id << 32) | número da linha: as linhas de um arquivo
+# ficam contíguas, e o contexto de um resultado é só uma faixa de rowids.
+BITS_LINHA = 32
+
+SQLS_CRIAR_INDICE = (
+    """
+    CREATE TABLE IF NOT EXISTS arquivos_log (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        servidor_id INTEGER NOT NULL,
+        caminho TEXT NOT NULL UNIQUE,
+        data TEXT,
+        identidade TEXT,
+        posicao INTEGER NOT NULL DEFAULT 0,
+        linhas INTEGER NOT NULL DEFAULT 0,
+        concluido INTEGER NOT NULL DEFAULT 0
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_arquivos_log_servidor ON arquivos_log(servidor_id)",
+    # `servidor` guarda o token 's<id>', para filtrar por servidor dentro da própria busca.
+    # '_' faz parte das palavras: nomes de jogador como Player_One viram um token só.
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS linhas_log USING fts5(
+        texto, servidor, deslocamento UNINDEXED,
+        tokenize = "unicode61 tokenchars '_'"
+    )
+    """,
+)
+SQL_INSERIR_LINHA = "INSERT INTO linhas_log (rowid, texto, servidor, deslocamento) VALUES (?, ?, ?, ?)"
+SQL_APAGAR_LINHAS_ARQUIVO = "DELETE FROM linhas_log WHERE rowid BETWEEN ? AND ?"
+
+
+def _faixa_arquivo(arquivo_id: int) -> Tuple[int, int]:
+    return arquivo_id << BITS_LINHA, ((arquivo_id + 1) << BITS_LINHA) - 1
+
+
+def expressao_busca(consulta: str) -> str:
+    """
+    Converte o texto digitado numa expressão FTS5 segura: cada palavra vira um
+    termo entre aspas (todas obrigatórias); um '*' no fim busca pelo prefixo.
+    """
+    termos = []
+    for palavra in consulta.split():
+        prefixo = palavra.endswith('*')
+        palavra = palavra.rstrip('*').replace('"', '""')
+        if palavra:
+            termos.append(f'"{palavra}"*' if prefixo else f'"{palavra}"')
+    if not termos:
+        raise ValueError("A busca precisa de pelo menos uma palavra.")
+    return ' '.join(termos)
+
+
+def listar_logs(pasta: str) -> List[Tuple[str, str, bool, os.stat_result]]:
+    """Logs de uma pasta em ordem cronológica: (caminho, data, rotacionado, stat); o latest.log por último."""
+    rotacionados, atual = [], []
+    try:
+        entradas = list(os.scandir(pasta))
+    except OSError:
+        return []
+    for entrada in entradas:
+        if not entrada.is_file():
+            continue
+        casamento = RE_LOG_ROTACIONADO.match(entrada.name)
+        if casamento:
+            chave = (casamento.group(1), int(casamento.group(2)))
+            rotacionados.append((chave, (entrada.path, casamento.group(1), True, entrada.stat())))
+        elif entrada.name == NOME_LOG_ATUAL:
+            estado = entrada.stat()
+            data = datetime.fromtimestamp(estado.st_mtime).date().isoformat()
+            atual.append((entrada.path, data, False, estado))
+    rotacionados.sort(key=lambda item: item[0])
+    return [arquivo for _, arquivo in rotacionados] + atual
+
+
+class _LeitorLog:
+    """Lê linhas completas de um log (texto ou gzip, descomprimido em fluxo) a partir de uma posição."""
+
+    def __init__(self, caminho: str, posicao: int, numero: int, completo: bool):
+        self.arquivo = gzip.open(caminho, 'rb') if caminho.endswith('.gz') else open(caminho, 'rb')
+        # Um .gz não tem acesso aleatório: retomar descomprime até o checkpoint, mas não regrava nada.
+        if posicao:
+            self.arquivo.seek(posicao)
+        self.posicao = posicao
+        self.numero = numero
+        self.completo = completo
+
+    def proximo_lote(self, max_linhas: int) -> List[Tuple[int, int, str]]:
+        """Até `max_linhas` linhas como (número, deslocamento, texto)."""
+        lote = []
+        while len(lote) < max_linhas:
+            linha = self.arquivo.readline()
+            if not linha:
+                break
+            if not linha.endswith(b'\n') and not self.completo:
+                break  # Linha do latest.log ainda sendo escrita; entra na próxima passada.
+            self.numero += 1
+            texto = linha.decode('utf-8', errors='ignore').rstrip('\r\n')
+            lote.append((self.numero, self.posicao, texto))
+            self.posicao += len(linha)
+        return lote
+
+    def close(self):
+        self.arquivo.close()
+
+
+class LogIndex:
+    """
+    Índice de busca de texto (FTS5) dos logs dos servidores locais.
+
+    Fica num arquivo SQLite próprio, com conexões próprias: indexar nunca
+    disputa o lock do escritor das verificações, e o índice pode ser apagado
+    e reconstruído a qualquer momento. A cada passada, os logs rotacionados
+    (`logs/*.log.gz`) são lidos em fluxo e gravados em lotes, cada um junto
+    com o checkpoint do arquivo, então uma interrupção retoma de onde parou.
+    O latest.log é indexado conforme cresce; quando é rotacionado, suas linhas
+    saem do índice e voltam pelo .log.gz correspondente.
+    """
+
+    def __init__(self, db_path: str, servidores: Callable[[], Iterable[Tuple[int, str]]],
+                 linhas_por_lote: int = LINHAS_POR_LOTE):
+        self.db_path = db_path
+        self.servidores = servidores
+        self.linhas_por_lote = linhas_por_lote
+        self.logger = logging.getLogger(self.__class__.__name__)
+        self.escrita: Optional[aiosqlite.Connection] = None
+        self.leitura: Optional[aiosqlite.Connection] = None
+        self._linhas_indexadas = 0
+        self._ultima_passada: Optional[dict] = None
+
+    async def open(self):
+        self.escrita = await aiosqlite.connect(self.db_path)
+        self.escrita.row_factory = aiosqlite.Row
+        await apply_pragmas(self.escrita)
+        for sql in SQLS_CRIAR_INDICE:
+            await self.escrita.execute(sql)
+        await self.escrita.commit()
+        # Buscas numa conexão separada: em WAL não esperam o lote que está sendo gravado.
+        self.leitura = await aiosqlite.connect(self.db_path)
+        self.leitura.row_factory = aiosqlite.Row
+        await apply_pragmas(self.leitura, wal=False)
+
+    async def close(self):
+        for conn in (self.leitura, self.escrita):
+            if conn:
+                await conn.close()
+        self.escrita = self.leitura = None
+
+    async def _apagar_arquivo(self, arquivo_id: int):
+        await self.escrita.execute(SQL_APAGAR_LINHAS_ARQUIVO, _faixa_arquivo(arquivo_id))
+        await self.escrita.execute("DELETE FROM arquivos_log WHERE id = ?", (arquivo_id,))
+
+    async def _remover_servidores_ausentes(self, servidor_ids: set):
+        cursor = await self.escrita.execute("SELECT id, servidor_id FROM arquivos_log")
+        removidos = [row['id'] for row in await cursor.fetchall() if row['servidor_id'] not in servidor_ids]
+        for arquivo_id in removidos:
+            await self._apagar_arquivo(arquivo_id)
+        if removidos:
+            await self.escrita.commit()
+
+    async def _checkpoint(self, servidor_id: int, caminho: str, data: str, identidade: str):
+        cursor = await self.escrita.execute("SELECT * FROM arquivos_log WHERE caminho = ?", (caminho,))
+        row = await cursor.fetchone()
+        if row is None:
+            cursor = await self.escrita.execute(
+                "INSERT INTO arquivos_log (servidor_id, caminho, data, identidade) VALUES (?, ?, ?, ?)",
+                (servidor_id, caminho, data, identidade),
+            )
+            await self.escrita.commit()
+            cursor = await self.escrita.execute("SELECT * FROM arquivos_log WHERE id = ?", (cursor.lastrowid,))
+            row = await cursor.fetchone()
+        return row
+
+    async def _indexar_arquivo(self, servidor_id: int, caminho: str, data: str, rotacionado: bool,
+                               estado: os.stat_result) -> int:
+        identidade = f"{estado.st_dev}:{estado.st_ino}"
+        row = await self._checkpoint(servidor_id, caminho, data, identidade)
+        if row['concluido']:
+            return 0
+        if not rotacionado:
+            if row['identidade'] != identidade or estado.st_size < row['posicao']:
+                # latest.log rotacionado ou truncado: as linhas antigas estão no .log.gz
+                # (indexado antes, na mesma passada). Um id novo mantém a ordem cronológica.
+                await self._apagar_arquivo(row['id'])
+                await self.escrita.commit()
+                row = await self._checkpoint(servidor_id, caminho, data, identidade)
+            if estado.st_size == row['posicao']:
+                return 0
+
+        loop = asyncio.get_running_loop()
+        arquivo_id = row['id']
+        token_servidor = f"s{servidor_id}"
+        base = arquivo_id << BITS_LINHA
+        total = 0
+        leitor = await loop.run_in_executor(None, _LeitorLog, caminho, row['posicao'], row['linhas'], rotacionado)
+        try:
+            while True:
+                try:
+                    lote = await loop.run_in_executor(None, leitor.proximo_lote, self.linhas_por_lote)
+                except (EOFError, zlib.error, gzip.BadGzipFile) as e:
+                    # .gz ainda sendo escrito pelo servidor, ou corrompido se já for antigo.
+                    if time.time() - estado.st_mtime > IDADE_GZ_INCOMPLETO:
+                        self.logger.warning(f"Log {caminho} corrompido a partir da linha {leitor.numero}: {e}")
+                        await self.escrita.execute("UPDATE arquivos_log SET concluido = 1 WHERE id = ?", (arquivo_id,))
+                        await self.escrita.commit()
+                    break
+                if not lote:
+                    if rotacionado:
+                        await self.escrita.execute("UPDATE arquivos_log SET concluido = 1 WHERE id = ?", (arquivo_id,))
+                        await self.escrita.commit()
+                    break
+                await self.escrita.executemany(
+                    SQL_INSERIR_LINHA,
+                    [(base | numero, texto, token_servidor, deslocamento) for numero, deslocamento, texto in lote],
+                )
+                await self.escrita.execute(
+                    "UPDATE arquivos_log SET posicao = ?, linhas = ?, data = ? WHERE id = ?",
+                    (leitor.posicao, leitor.numero, data, arquivo_id),
+                )
+                await self.escrita.commit()
+                total += len(lote)
+                self._linhas_indexadas += len(lote)
+        finally:
+            await loop.run_in_executor(None, leitor.close)
+        return total
+
+    async def index_once(self) -> dict:
+        inicio = time.monotonic()
+        loop = asyncio.get_running_loop()
+        servidores = list(self.servidores())
+        await self._remover_servidores_ausentes({servidor_id for servidor_id, _ in servidores})
+        linhas, arquivos = 0, 0
+        for servidor_id, caminho_servidor in servidores:
+            logs = await loop.run_in_executor(None, listar_logs, os.path.join(caminho_servidor, 'logs'))
+            for caminho, data, rotacionado, estado in logs:
+                try:
+                    novas = await self._indexar_arquivo(servidor_id, caminho, data, rotacionado, estado)
+                except OSError as e:
+                    self.logger.warning(f"Não foi possível indexar o log {caminho}: {e}")
+                    continue
+                linhas += novas
+                arquivos += bool(novas)
+        self._ultima_passada = {
+            "linhas": linhas,
+            "arquivos": arquivos,
+            "duracao_s": round(time.monotonic() - inicio, 2),
+            "em": datetime.now().isoformat(timespec='seconds'),
+        }
+        if linhas:
+            self.logger.info(f"Índice de logs: {linhas} linhas novas de {arquivos} arquivos.")
+        return self._ultima_passada
+
+    async def run(self, intervalo: float, atraso_inicial: float = 30):
+        await asyncio.sleep(atraso_inicial)
+        while True:
+            try:
+                await self.index_once()
+            except Exception as e:
+                self.logger.error(f"Erro na indexação dos logs: {e}", exc_info=True)
+            await asyncio.sleep(intervalo)
+
+    async def search(self, servidor_id: int, consulta: str, limite: int = 50, antes: Optional[int] = None,
+                     contexto: int = 2) -> dict:
+        """
+        Linhas do servidor que contêm todas as palavras de `consulta`, das mais
+        recentes para as mais antigas, com `contexto` linhas antes e depois.
+        Para a próxima página, passe o `proximo` retornado em `antes`.
+        """
+        if not 1 <= limite <= MAX_RESULTADOS:
+            raise ValueError(f"limite deve estar entre 1 e {MAX_RESULTADOS}")
+        if not 0 <= contexto <= MAX_CONTEXTO:
+            raise ValueError(f"contexto deve estar entre 0 e {MAX_CONTEXTO}")
+        expressao = f'servidor : "s{servidor_id}" AND ({expressao_busca(consulta)})'
+        try:
+            cursor = await self.leitura.execute(
+                "SELECT rowid, texto, deslocamento FROM linhas_log WHERE linhas_log MATCH ? AND rowid < ? "
+                "ORDER BY rowid DESC LIMIT ?",
+                (expressao, antes if antes is not None else 1 << 62, limite + 1),
+            )
+            resultados = await cursor.fetchall()
+        except aiosqlite.OperationalError as e:
+            raise ValueError(f"Busca inválida: {e}")
+        proximo = resultados[limite - 1]['rowid'] if len(resultados) > limite else None
+        resultados = resultados[:limite]
+
+        arquivo_ids = sorted({row['rowid'] >> BITS_LINHA for row in resultados})
+        arquivos = {}
+        if arquivo_ids:
+            cursor = await self.leitura.execute(
+                f"SELECT id, caminho, data FROM arquivos_log WHERE id IN ({', '.join('?' * len(arquivo_ids))})",
+                arquivo_ids,
+            )
+            arquivos = {row['id']: row for row in await cursor.fetchall()}
+
+        mascara = (1 << BITS_LINHA) - 1
+        saida = []
+        for row in resultados:
+            rowid = row['rowid']
+            arquivo = arquivos.get(rowid >> BITS_LINHA)
+            antes_linhas, depois_linhas = [], []
+            if contexto:
+                cursor = await self.leitura.execute(
+                    "SELECT rowid, texto FROM linhas_log WHERE rowid BETWEEN ? AND ? ORDER BY rowid",
+                    (rowid - contexto, rowid + contexto),
+                )
+                for vizinha in await cursor.fetchall():
+                    # A faixa não passa do início do arquivo: número de linha 0 não existe.
+                    if vizinha['rowid'] >> BITS_LINHA != rowid >> BITS_LINHA or vizinha['rowid'] == rowid:
+                        continue
+                    (antes_linhas if vizinha['rowid'] < rowid else depois_linhas).append(vizinha['texto'])
+            saida.append({
+                "arquivo": os.path.basename(arquivo['caminho']) if arquivo else None,
+                "data": arquivo['data'] if arquivo else None,
+                "linha": rowid & mascara,
+                "deslocamento": row['deslocamento'],
+                "texto": row['texto'],
+                "antes": antes_linhas,
+                "depois": depois_linhas,
+            })
+        return {"resultados": saida, "proximo": proximo}
+
+    def stats(self) -> dict:
+        return {
+            "arquivo": self.db_path,
+            "linhas_indexadas": self._linhas_indexadas,
+            "ultima_passada": self._ultima_passada,
+        }
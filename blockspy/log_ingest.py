@@ -0,0 +1,61 @@
+import re
+from typing import List, NamedTuple, Optional
+
+# Tipos de evento reconhecidos no latest.log.
+EVENTO_ENTROU = 'entrou'
+EVENTO_SAIU = 'saiu'
+EVENTO_UUID = 'uuid'
+EVENTO_INICIADO = 'iniciado'
+EVENTO_PARANDO = 'parando'
+
+# Prefixo das linhas: "[12:00:00] [Server thread/INFO]: " (vanilla/Spigot), "[12:00:00 INFO]: " (Paper)
+# ou "[data] [Server thread/INFO] [minecraft/DedicatedServer]: " (Forge). Mensagens de chat têm
+# "<Nome>" logo após o prefixo, então um jogador digitando "X joined the game" não casa.
+_PREFIXO = r'^(?:\[[^\]]*\] ?)+: '
+# Nomes Java, com o prefixo opcional ('.' ou '*') que o Floodgate dá aos jogadores Bedrock.
+_NOME = r'(?P<nome>[.*]?[A-Za-z0-9_]{1,16})'
+
+# (tipo, trecho fixo, regex): o trecho é testado antes, então a maioria das linhas não passa por regex.
+PADROES = (
+    (EVENTO_ENTROU, ' joined the game',
+     re.compile(_PREFIXO + _NOME + r'(?: \(formerly known as [^)]*\))? joined the game$')),
+    (EVENTO_SAIU, ' left the game', re.compile(_PREFIXO + _NOME + r' left the game$')),
+    (EVENTO_UUID, 'UUID of player ',
+     re.compile(_PREFIXO + r'UUID of player ' + _NOME + r' is (?P<uuid>[0-9a-fA-F-]{32,36})$')),
+    (EVENTO_INICIADO, 'Done (', re.compile(_PREFIXO + r'Done \([\d.,]+s\)!')),
+    (EVENTO_PARANDO, 'Stopping ', re.compile(_PREFIXO + r'Stopping (?:the )?server$')),
+)
+
+
+class LogEvent(NamedTuple):
+    tipo: str
+    nome: Optional[str] = None
+    uuid: Optional[str] = None
+
+
+def classificar_linha(linha: str) -> Optional[LogEvent]:
+    """Evento de jogador ou de ciclo de vida do servidor contido na linha, se houver."""
+    for tipo, trecho, regex in PADROES:
+        if trecho in linha:
+            casamento = regex.match(linha)
+            if casamento:
+                grupos = casamento.groupdict()
+                return LogEvent(tipo, grupos.get('nome'), grupos.get('uuid'))
+    return None
+
+
+# Resposta do comando "list": "There are 2 of a max of 20 players online: A, B" (1.13+)
+# ou "There are 2/20 players online:\nA, B" (versões antigas).
+_RE_LIST = re.compile(r'There are (?P<total>\d+)(?: of a max of |/)\d+ players online:(?P<nomes>.*)', re.DOTALL)
+_RE_NOME = re.compile(_NOME)
+
+
+def jogadores_do_list(resposta: str) -> Optional[List[str]]:
+    """Nomes na resposta do "list", ou None se o formato não for o padrão (plugins que trocam o comando)."""
+    casamento = _RE_LIST.search(resposta)
+    if not casamento:
+        return None
+    nomes = [nome for nome in re.split(r'[,\s]+', casamento.group('nomes')) if nome]
+    if len(nomes) != int(casamento.group('total')) or not all(_RE_NOME.fullmatch(nome) for nome in nomes):
+        return None
+    return nomes
@@ -0,0 +1,267 @@
+import asyncio
+import logging
+import os
+import threading
+from collections import deque
+from typing import Deque, Dict, List, Optional, Set, Tuple
+
+from watchdog.events import FileSystemEventHandler
+from watchdog.observers import Observer
+
+# Linhas recentes guardadas por arquivo; quem conecta recebe as últimas daqui, sem reler o log.
+LINHAS_RECENTES = 200
+# Linhas pendentes por assinante; um console que não acompanha perde as mais antigas.
+MAX_LINHAS_FILA = 2000
+# Espera após a primeira linha nova, para juntar uma rajada (ex.: a inicialização) num único quadro.
+INTERVALO_LOTE = 0.05
+TAMANHO_BLOCO = 8192
+# Uma "linha" sem quebra maior que isso é entregue assim mesmo.
+MAX_BYTES_LINHA = 64 * 1024
+
+
+def _decodificar(linha: bytes) -> str:
+    return linha.decode('utf-8', errors='ignore').rstrip('\r')
+
+
+def ultimas_linhas(caminho: str, n: int, tamanho_bloco: int = TAMANHO_BLOCO) -> Tuple[List[str], int]:
+    """
+    Últimas `n` linhas completas do arquivo e a posição logo após a última delas.
+
+    Lê blocos a partir do fim, então o custo depende de `n` e não do tamanho
+    do log. Uma linha final ainda sem quebra fica de fora (a posição para
+    antes dela) e chega inteira na próxima leitura.
+    """
+    with open(caminho, 'rb') as f:
+        f.seek(0, os.SEEK_END)
+        inicio = f.tell()
+        dados = b''
+        while inicio > 0 and dados.count(b'\n') <= n:
+            passo = min(tamanho_bloco, inicio)
+            inicio -= passo
+            f.seek(inicio)
+            dados = f.read(passo) + dados
+    corte = dados.rfind(b'\n') + 1
+    linhas = dados[:corte].split(b'\n')[:-1]
+    return [_decodificar(linha) for linha in linhas[-n:]] if n else [], inicio + corte
+
+
+class LogSubscriber:
+    """Fila limitada de linhas de um leitor do log (um console ou um consumidor interno)."""
+
+    __slots__ = ("tailer", "descartadas", "_linhas", "_acordar", "_descartadas_pendentes")
+
+    def __init__(self, tailer: "LogTailer", max_linhas: int):
+        self.tailer = tailer
+        self.descartadas = 0
+        self._linhas: Deque[str] = deque(maxlen=max_linhas)
+        self._acordar = asyncio.Event()
+        self._descartadas_pendentes = 0
+
+    def recent(self, n: int) -> List[str]:
+        return list(self.tailer.recentes)[-n:] if n else []
+
+    def entregar(self, linhas: List[str]):
+        excesso = len(self._linhas) + len(linhas) - self._linhas.maxlen
+        if excesso > 0:
+            self.descartadas += excesso
+            self._descartadas_pendentes += excesso
+        self._linhas.extend(linhas)
+        self._acordar.set()
+
+    async def next_batch(self, intervalo: float = INTERVALO_LOTE) -> Tuple[List[str], int]:
+        """Espera linhas novas e devolve todas as pendentes, com quantas foram descartadas desde o último lote."""
+        await self._acordar.wait()
+        if intervalo:
+            await asyncio.sleep(intervalo)
+        self._acordar.clear()
+        linhas = list(self._linhas)
+        self._linhas.clear()
+        descartadas, self._descartadas_pendentes = self._descartadas_pendentes, 0
+        return linhas, descartadas
+
+
+class LogTailer:
+    """
+    Acompanha um arquivo de log e repassa as linhas novas aos assinantes.
+
+    A leitura roda na thread do watchdog, a partir da última posição lida, e
+    as linhas completas vão para o loop com `call_soon_threadsafe`. Se o
+    arquivo foi trocado (rotação do latest.log) ou encolheu (truncado), a
+    leitura recomeça do início do arquivo atual.
+    """
+
+    def __init__(self, caminho: str, loop: asyncio.AbstractEventLoop, linhas_recentes: int = LINHAS_RECENTES):
+        self.caminho = caminho
+        self.loop = loop
+        self.assinantes: Set[LogSubscriber] = set()
+        self.recentes: Deque[str] = deque(maxlen=linhas_recentes)
+        self.linhas_lidas = 0
+        self.rotacoes = 0
+        self.truncamentos = 0
+        self._lock = threading.Lock()
+        self._identidade: Optional[Tuple[int, int]] = None
+        self._posicao = 0
+        self._resto = b''
+
+    def iniciar(self) -> List[str]:
+        """Posiciona no fim do arquivo e retorna as linhas recentes (roda fora do loop)."""
+        with self._lock:
+            linhas, self._posicao = ultimas_linhas(self.caminho, self.recentes.maxlen)
+            estado = os.stat(self.caminho)
+            self._identidade = (estado.st_dev, estado.st_ino)
+        return linhas
+
+    def ler(self):
+        """Lê o que foi acrescentado desde a última leitura (chamado na thread do watchdog)."""
+        with self._lock:
+            try:
+                estado = os.stat(self.caminho)
+            except FileNotFoundError:
+                return  # Entre a rotação e a criação do novo arquivo.
+            identidade = (estado.st_dev, estado.st_ino)
+            if identidade != self._identidade:
+                self._identidade = identidade
+                self._posicao, self._resto = 0, b''
+                self.rotacoes += 1
+            elif estado.st_size < self._posicao:
+                self._posicao, self._resto = 0, b''
+                self.truncamentos += 1
+            if estado.st_size == self._posicao:
+                return
+            try:
+                with open(self.caminho, 'rb') as f:
+                    f.seek(self._posicao)
+                    dados = f.read()
+                    self._posicao = f.tell()
+            except OSError as e:
+                logging.warning(f"Erro ao ler modificações do log {self.caminho}: {e}")
+                return
+            partes = (self._resto + dados).split(b'\n')
+            self._resto = partes.pop()
+            if len(self._resto) > MAX_BYTES_LINHA:
+                partes.append(self._resto)
+                self._resto = b''
+        if partes:
+            linhas = [_decodificar(parte) for parte in partes]
+            try:
+                self.loop.call_soon_threadsafe(self._publicar, linhas)
+            except RuntimeError:
+                pass  # Loop já encerrado.
+
+    def _publicar(self, linhas: List[str]):
+        self.recentes.extend(linhas)
+        self.linhas_lidas += len(linhas)
+        for assinante in self.assinantes:
+            assinante.entregar(linhas)
+
+
+class _DirectoryHandler(FileSystemEventHandler):
+    """Repassa os eventos de um diretório aos tailers dos arquivos acompanhados nele."""
+
+    def __init__(self, tailers: Dict[str, LogTailer]):
+        self.tailers = tailers
+
+    def _despachar(self, *caminhos):
+        for caminho in caminhos:
+            tailer = self.tailers.get(os.path.normcase(caminho)) if caminho else None
+            if tailer is not None:
+                tailer.ler()
+
+    # Só eventos de escrita: aberturas e fechamentos sem escrita incluem as do próprio tailer.
+    def on_modified(self, event):
+        if not event.is_directory:
+            self._despachar(event.src_path)
+
+    def on_closed(self, event):
+        self.on_modified(event)
+
+    def on_created(self, event):
+        self.on_modified(event)
+
+    def on_moved(self, event):
+        if not event.is_directory:
+            self._despachar(event.src_path, event.dest_path)
+
+
+class LogTailHub:
+    """
+    Um LogTailer por arquivo, compartilhado por todos que acompanham o mesmo log.
+
+    O arquivo é observado enquanto houver assinantes (contagem de referências
+    pelo conjunto de assinantes de cada tailer). Um único Observer do watchdog
+    atende todos os diretórios.
+    """
+
+    def __init__(self, max_linhas_fila: int = MAX_LINHAS_FILA):
+        self.max_linhas_fila = max_linhas_fila
+        self.logger = logging.getLogger(self.__class__.__name__)
+        self._tailers: Dict[str, LogTailer] = {}
+        self._diretorios: Dict[str, Tuple[object, Dict[str, LogTailer]]] = {}
+        self._observer: Optional[Observer] = None
+        self._lock: Optional[asyncio.Lock] = None
+
+    async def subscribe(self, caminho: str) -> LogSubscriber:
+        """Assina o log em `caminho`; levanta OSError se o arquivo não puder ser lido."""
+        chave = os.path.normcase(os.path.realpath(caminho))
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            tailer = self._tailers.get(chave)
+            if tailer is None:
+                loop = asyncio.get_running_loop()
+                tailer = LogTailer(chave, loop)
+                tailer.recentes.extend(await loop.run_in_executor(None, tailer.iniciar))
+                self._observar(tailer)
+                self._tailers[chave] = tailer
+                self.logger.info(f"Iniciado monitoramento de log para: {chave}")
+            assinante = LogSubscriber(tailer, self.max_linhas_fila)
+            tailer.assinantes.add(assinante)
+        return assinante
+
+    def unsubscribe(self, assinante: LogSubscriber):
+        tailer = assinante.tailer
+        tailer.assinantes.discard(assinante)
+        if not tailer.assinantes and self._tailers.get(tailer.caminho) is tailer:
+            del self._tailers[tailer.caminho]
+            self._deixar_de_observar(tailer)
+            self.logger.info(f"Encerrado monitoramento de log para: {tailer.caminho}")
+
+    def _observar(self, tailer: LogTailer):
+        if self._observer is None:
+            self._observer = Observer()
+            self._observer.daemon = True
+            self._observer.start()
+        diretorio = os.path.dirname(tailer.caminho)
+        entrada = self._diretorios.get(diretorio)
+        if entrada is None:
+            tailers: Dict[str, LogTailer] = {}
+            watch = self._observer.schedule(_DirectoryHandler(tailers), diretorio, recursive=False)
+            entrada = self._diretorios[diretorio] = (watch, tailers)
+        entrada[1][tailer.caminho] = tailer
+
+    def _deixar_de_observar(self, tailer: LogTailer):
+        diretorio = os.path.dirname(tailer.caminho)
+        watch, tailers = self._diretorios[diretorio]
+        tailers.pop(tailer.caminho, None)
+        if not tailers:
+            del self._diretorios[diretorio]
+            self._observer.unschedule(watch)
+
+    def close(self):
+        if self._observer is not None:
+            self._observer.stop()
+            self._observer.join()
+            self._observer = None
+        self._tailers.clear()
+        self._diretorios.clear()
+
+    def stats(self) -> dict:
+        tailers = list(self._tailers.values())
+        return {
+            "arquivos": len(tailers),
+            "assinantes": sum(len(t.assinantes) for t in tailers),
+            "linhas_lidas": sum(t.linhas_lidas for t in tailers),
+            "linhas_descartadas": sum(a.descartadas for t in tailers for a in t.assinantes),
+            "rotacoes": sum(t.rotacoes for t in tailers),
+            "truncamentos": sum(t.truncamentos for t in tailers),
+        }
@@ -0,0 +1,407 @@
+import logging
+import re
+from datetime import datetime, timezone
+from typing import Awaitable, Callable, List, Optional
+
+import aiosqlite
+
+from blockspy.rollups import RESOLUCOES, SQL_CRIAR_TABELA_ROLLUP
+from blockspy.sessions import SQL_ABRIR_SESSAO, SQL_CRIAR_TABELA_SESSOES, SQLS_INDICES_SESSOES
+
+logger = logging.getLogger("Migrations")
+
+# Linhas copiadas por transação na conversão do log_status (migração 5).
+TAMANHO_BLOCO_BACKFILL = 50000
+# Acima disso a migração 6 não reorganiza o banco na inicialização (fica para a manutenção manual).
+MAX_BYTES_VACUUM_MIGRACAO = 64 * 1024 * 1024
+
+# Texto dos eventos de entrada/saída gravados pelo monitoramento (migração 7).
+_RE_EVENTO_JOGADOR = re.compile(r"Jogador '(.+)' (?:entrou|saiu)\.$")
+
+# Ajustes aplicados em toda conexão aberta com o banco.
+PRAGMAS_CONEXAO = (
+    "PRAGMA synchronous = NORMAL",
+    "PRAGMA foreign_keys = ON",
+    "PRAGMA busy_timeout = 5000",
+    "PRAGMA temp_store = MEMORY",
+    "PRAGMA cache_size = -65536",      # 64 MB
+    "PRAGMA mmap_size = 268435456",    # 256 MB
+)
+
+
+class Migration:
+    """Um passo de schema, identificado por uma versão crescente."""
+
+    __slots__ = ("versao", "descricao", "aplicar", "transacional")
+
+    def __init__(self, versao: int, descricao: str,
+                 aplicar: Callable[[aiosqlite.Connection], Awaitable[None]], transacional: bool = True):
+        self.versao = versao
+        self.descricao = descricao
+        self.aplicar = aplicar
+        # Passos não transacionais controlam os próprios commits (ex.: backfill em blocos)
+        # e precisam ser seguros para rodar de novo se forem interrompidos no meio.
+        self.transacional = transacional
+
+
+async def _m001_tabelas_iniciais(conn: aiosqlite.Connection):
+    await conn.execute("""
+        CREATE TABLE IF NOT EXISTS servidores (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            ip_servidor TEXT NOT NULL UNIQUE,
+            nome_servidor TEXT,
+            nome_customizado TEXT,
+            versao TEXT,
+            jogadores_online INTEGER,
+            jogadores_maximos INTEGER,
+            ping REAL,
+            status TEXT DEFAULT 'pending',
+            pausado INTEGER DEFAULT 0,
+            tem_icone_customizado INTEGER DEFAULT 0,
+            localizacao TEXT,
+            tipo_servidor TEXT,
+            caminho_servidor TEXT,
+            rcon_port INTEGER,
+            rcon_password TEXT,
+            ultima_verificacao TEXT,
+            discord_webhook_url TEXT,
+            notificar_online_offline INTEGER DEFAULT 0,
+            notificar_pico_jogadores INTEGER DEFAULT 0,
+            notificar_marcos_lotacao INTEGER DEFAULT 0,
+            notificar_primeira_entrada INTEGER DEFAULT 0,
+            ultimo_marco_notificado INTEGER DEFAULT 0,
+            intervalo_min INTEGER,
+            intervalo_max INTEGER,
+            icone_hash TEXT
+        );
+    """)
+    await conn.execute("""
+        CREATE TABLE IF NOT EXISTS log_status (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            servidor_id INTEGER NOT NULL,
+            timestamp TEXT NOT NULL,
+            ping REAL,
+            jogadores_online INTEGER,
+            FOREIGN KEY(servidor_id) REFERENCES servidores(id) ON DELETE CASCADE
+        );
+    """)
+    await conn.execute("""
+        CREATE TABLE IF NOT EXISTS historico_jogadores (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            servidor_id INTEGER NOT NULL,
+            nome_jogador TEXT NOT NULL,
+            uuid TEXT,
+            status_online INTEGER DEFAULT 0,
+            ultima_vez_visto TEXT,
+            FOREIGN KEY(servidor_id) REFERENCES servidores(id) ON DELETE CASCADE,
+            UNIQUE(servidor_id, nome_jogador)
+        );
+    """)
+    await conn.execute("""
+        CREATE TABLE IF NOT EXISTS eventos (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            servidor_id INTEGER NOT NULL,
+            timestamp TEXT NOT NULL,
+            tipo_evento TEXT NOT NULL,
+            detalhes TEXT,
+            FOREIGN KEY(servidor_id) REFERENCES servidores(id) ON DELETE CASCADE
+        );
+    """)
+    await conn.execute("""
+        CREATE TABLE IF NOT EXISTS jogadores_vigiados (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            servidor_id INTEGER NOT NULL,
+            nome_jogador TEXT NOT NULL,
+            FOREIGN KEY(servidor_id) REFERENCES servidores(id) ON DELETE CASCADE,
+            UNIQUE(servidor_id, nome_jogador)
+        );
+    """)
+
+
+async def _m002_colunas_servidores(conn: aiosqlite.Connection):
+    """Bancos criados por versões antigas não têm todas as colunas de `servidores`."""
+    cursor = await conn.execute("PRAGMA table_info(servidores);")
+    columns = [row[1] for row in await cursor.fetchall()]
+
+    colunas_para_adicionar = {
+        'nome_customizado': 'TEXT',
+        'caminho_servidor': 'TEXT DEFAULT NULL',
+        'discord_webhook_url': 'TEXT',
+        'notificar_online_offline': 'INTEGER DEFAULT 0',
+        'notificar_pico_jogadores': 'INTEGER DEFAULT 0',
+        'notificar_marcos_lotacao': 'INTEGER DEFAULT 0',
+        'notificar_primeira_entrada': 'INTEGER DEFAULT 0',
+        'ultimo_marco_notificado': 'INTEGER DEFAULT 0',
+        'intervalo_min': 'INTEGER',
+        'intervalo_max': 'INTEGER',
+        'icone_hash': 'TEXT'
+    }
+
+    for col, tipo in colunas_para_adicionar.items():
+        if col not in columns:
+            logger.info(f"Adicionando coluna '{col}' à tabela 'servidores'...")
+            await conn.execute(f'ALTER TABLE servidores ADD COLUMN {col} {tipo};')
+
+
+async def _m003_indices_series_temporais(conn: aiosqlite.Connection):
+    # Em bancos grandes a criação leva alguns segundos, mas só acontece uma vez.
+    await conn.execute("CREATE INDEX IF NOT EXISTS idx_log_status_servidor_ts ON log_status(servidor_id, timestamp)")
+    await conn.execute("CREATE INDEX IF NOT EXISTS idx_eventos_servidor_ts ON eventos(servidor_id, timestamp)")
+    await conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_historico_servidor_online ON historico_jogadores(servidor_id, status_online, ultima_vez_visto)"
+    )
+    await conn.execute("ANALYZE")
+
+
+async def _m004_rollups_log_status(conn: aiosqlite.Connection):
+    for nome, _ in RESOLUCOES:
+        await conn.execute(SQL_CRIAR_TABELA_ROLLUP.format(nome=nome))
+
+    # O log antigo só tem verificações online, então o backfill não conhece as offline.
+    segundos_minuto = RESOLUCOES[0][1]
+    await conn.execute(f"""
+        INSERT INTO log_status_{RESOLUCOES[0][0]}
+            (servidor_id, bucket, amostras, amostras_online, soma_jogadores, min_jogadores, max_jogadores, soma_ping)
+        SELECT servidor_id, CAST(strftime('%s', timestamp) AS INTEGER) / {segundos_minuto} * {segundos_minuto} AS b,
+               COUNT(*), COUNT(jogadores_online), COALESCE(SUM(jogadores_online), 0),
+               MIN(jogadores_online), MAX(jogadores_online), COALESCE(SUM(ping), 0)
+        FROM log_status
+        WHERE strftime('%s', timestamp) IS NOT NULL AND servidor_id IN (SELECT id FROM servidores)
+        GROUP BY servidor_id, b
+    """)
+    # Cada nível é agregado a partir do anterior, que já é bem menor que o log bruto.
+    for (anterior, _), (nome, segundos) in zip(RESOLUCOES, RESOLUCOES[1:]):
+        await conn.execute(f"""
+            INSERT INTO log_status_{nome}
+                (servidor_id, bucket, amostras, amostras_online, soma_jogadores, min_jogadores, max_jogadores, soma_ping)
+            SELECT servidor_id, bucket / {segundos} * {segundos} AS b,
+                   SUM(amostras), SUM(amostras_online), SUM(soma_jogadores),
+                   MIN(min_jogadores), MAX(max_jogadores), SUM(soma_ping)
+            FROM log_status_{anterior}
+            GROUP BY servidor_id, b
+        """)
+
+
+async def _m005_log_status_epoch(conn: aiosqlite.Connection):
+    """
+    Converte o log_status para (servidor_id, ts) em segundos Unix, WITHOUT ROWID.
+
+    Cada bloco é copiado e apagado da tabela antiga na mesma transação, então
+    uma conversão interrompida continua de onde parou na próxima inicialização.
+    """
+    cursor = await conn.execute("PRAGMA table_info(log_status);")
+    if 'ts' in [row[1] for row in await cursor.fetchall()]:
+        return  # Já convertida; só faltou registrar a versão.
+
+    await conn.execute("""
+        CREATE TABLE IF NOT EXISTS log_status_ts (
+            servidor_id INTEGER NOT NULL,
+            ts INTEGER NOT NULL,
+            ping INTEGER,
+            jogadores_online INTEGER,
+            PRIMARY KEY (servidor_id, ts),
+            FOREIGN KEY(servidor_id) REFERENCES servidores(id) ON DELETE CASCADE
+        ) WITHOUT ROWID;
+    """)
+    await conn.commit()
+
+    total = 0
+    while True:
+        cursor = await conn.execute("SELECT MIN(id) FROM log_status")
+        inicio = (await cursor.fetchone())[0]
+        if inicio is None:
+            break
+        fim = inicio + TAMANHO_BLOCO_BACKFILL
+        await conn.execute("BEGIN")
+        # Duas amostras do mesmo servidor no mesmo segundo viram uma só. Linhas de
+        # servidores já removidos não são copiadas e saem junto com o bloco.
+        cursor = await conn.execute("""
+            INSERT OR IGNORE INTO log_status_ts (servidor_id, ts, ping, jogadores_online)
+            SELECT servidor_id, CAST(strftime('%s', timestamp) AS INTEGER), CAST(ROUND(ping) AS INTEGER), jogadores_online
+            FROM log_status
+            WHERE id >= ? AND id < ? AND strftime('%s', timestamp) IS NOT NULL
+              AND servidor_id IN (SELECT id FROM servidores)
+        """, (inicio, fim))
+        total += max(cursor.rowcount, 0)
+        await conn.execute("DELETE FROM log_status WHERE id >= ? AND id < ?", (inicio, fim))
+        await conn.commit()
+        logger.info(f"Convertendo log_status: {total} linhas copiadas...")
+
+    await conn.execute("BEGIN")
+    await conn.execute("DROP TABLE log_status")
+    await conn.execute("ALTER TABLE log_status_ts RENAME TO log_status")
+    await conn.commit()
+    await conn.execute("ANALYZE log_status")
+    await conn.commit()
+    logger.info(f"log_status convertido ({total} linhas).")
+
+
+async def _m006_auto_vacuum_incremental(conn: aiosqlite.Connection):
+    """Permite devolver ao disco o espaço das linhas apagadas pela retenção, aos poucos."""
+    cursor = await conn.execute("PRAGMA auto_vacuum")
+    if (await cursor.fetchone())[0] == 2:
+        return
+    # Em um banco já existente o modo só passa a valer depois de um VACUUM completo (uma única vez),
+    # que reescreve o arquivo inteiro e precisa de espaço livre do mesmo tamanho.
+    cursor = await conn.execute("SELECT page_count * page_size FROM pragma_page_count(), pragma_page_size()")
+    tamanho = (await cursor.fetchone())[0]
+    if tamanho > MAX_BYTES_VACUUM_MIGRACAO:
+        logger.info(
+            f"Banco com {tamanho / 1024 / 1024:.0f} MB: a conversão para auto_vacuum incremental fica para "
+            "POST /api/maintenance/retention?vacuum=1. Até lá o espaço liberado pela retenção é reutilizado, mas o arquivo não encolhe."
+        )
+        return
+    await conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+    await conn.execute("VACUUM")
+
+
+def _epoch_iso(valor: Optional[str]) -> Optional[int]:
+    try:
+        momento = datetime.fromisoformat(valor)
+    except (TypeError, ValueError):
+        return None
+    if momento.tzinfo is None:
+        momento = momento.replace(tzinfo=timezone.utc)
+    return int(momento.timestamp())
+
+
+async def _m007_sessoes_jogadores(conn: aiosqlite.Connection):
+    """
+    Cria o registro de sessões e o preenche com os pares entrou/saiu dos eventos já gravados.
+    Quem está online agora ganha uma sessão aberta desde a entrada (ultima_vez_visto).
+    """
+    await conn.execute(SQL_CRIAR_TABELA_SESSOES)
+    for sql in SQLS_INDICES_SESSOES:
+        await conn.execute(sql)
+
+    entradas = {}  # (servidor_id, nome_jogador) -> início da sessão ainda sem saída
+    fechadas = []
+    total = 0
+    async with conn.execute("""
+        SELECT e.servidor_id, e.timestamp, e.tipo_evento, e.detalhes
+        FROM eventos e JOIN servidores s ON s.id = e.servidor_id
+        WHERE e.tipo_evento IN ('JOGADOR_ENTROU', 'JOGADOR_SAIU')
+        ORDER BY e.servidor_id, e.timestamp
+    """) as cursor:
+        async for servidor_id, timestamp, tipo_evento, detalhes in cursor:
+            encontrado = _RE_EVENTO_JOGADOR.match(detalhes or '')
+            epoch = _epoch_iso(timestamp)
+            if not encontrado or epoch is None:
+                continue
+            chave = (servidor_id, encontrado.group(1))
+            if tipo_evento == 'JOGADOR_ENTROU':
+                entradas.setdefault(chave, epoch)
+            elif chave in entradas:
+                fechadas.append((servidor_id, chave[1], entradas.pop(chave), epoch))
+    for i in range(0, len(fechadas), TAMANHO_BLOCO_BACKFILL):
+        bloco = fechadas[i:i + TAMANHO_BLOCO_BACKFILL]
+        await conn.executemany(
+            "INSERT INTO sessoes_jogadores (servidor_id, nome_jogador, inicio, fim) VALUES (?, ?, ?, ?)", bloco
+        )
+        total += len(bloco)
+
+    # Entradas sem saída nos eventos ficam de fora: as sessões abertas vêm do estado atual.
+    cursor = await conn.execute("""
+        SELECT h.servidor_id, h.nome_jogador, h.uuid, h.ultima_vez_visto
+        FROM historico_jogadores h JOIN servidores s ON s.id = h.servidor_id
+        WHERE h.status_online = 1
+    """)
+    abertas = [
+        (row['servidor_id'], row['nome_jogador'], row['uuid'], _epoch_iso(row['ultima_vez_visto']))
+        for row in await cursor.fetchall()
+    ]
+    await conn.executemany(SQL_ABRIR_SESSAO, [sessao for sessao in abertas if sessao[3] is not None])
+    await conn.execute("""
+        UPDATE sessoes_jogadores SET uuid = (
+            SELECT h.uuid FROM historico_jogadores h
+            WHERE h.servidor_id = sessoes_jogadores.servidor_id AND h.nome_jogador = sessoes_jogadores.nome_jogador
+        ) WHERE uuid IS NULL
+    """)
+    await conn.execute("ANALYZE sessoes_jogadores")
+    logger.info(f"Sessões de jogadores: {total} reconstruídas a partir dos eventos, {len(abertas)} abertas.")
+
+
+MIGRACOES: List[Migration] = [
+    Migration(1, "Tabelas iniciais", _m001_tabelas_iniciais),
+    Migration(2, "Colunas adicionais em servidores", _m002_colunas_servidores),
+    Migration(3, "Índices por servidor e timestamp em log_status, eventos e historico_jogadores", _m003_indices_series_temporais),
+    Migration(4, "Rollups de log_status por minuto, hora e dia", _m004_rollups_log_status),
+    Migration(5, "log_status com timestamp inteiro e chave (servidor_id, ts)", _m005_log_status_epoch, transacional=False),
+    Migration(6, "auto_vacuum incremental", _m006_auto_vacuum_incremental, transacional=False),
+    Migration(7, "Registro de sessões de jogadores (sessoes_jogadores)", _m007_sessoes_jogadores),
+]
+
+
+async def apply_pragmas(conn: aiosqlite.Connection, wal: bool = True):
+    """Configura a conexão. O modo WAL é persistente no arquivo, mas reaplicá-lo é inofensivo."""
+    if wal:
+        cursor = await conn.execute("PRAGMA journal_mode = WAL")
+        modo = (await cursor.fetchone())[0]
+        if modo.lower() != 'wal':
+            logger.warning(f"Não foi possível ativar o modo WAL (modo atual: {modo}).")
+    for pragma in PRAGMAS_CONEXAO:
+        await conn.execute(pragma)
+
+
+async def _versao_atual(conn: aiosqlite.Connection) -> int:
+    await conn.execute("""
+        CREATE TABLE IF NOT EXISTS schema_version (
+            versao INTEGER PRIMARY KEY,
+            descricao TEXT NOT NULL,
+            aplicada_em TEXT NOT NULL
+        );
+    """)
+    await conn.commit()
+    cursor = await conn.execute("SELECT COALESCE(MAX(versao), 0) FROM schema_version")
+    return (await cursor.fetchone())[0]
+
+
+async def _remover_orfaos(conn: aiosqlite.Connection):
+    """
+    Apaga linhas de servidores que não existem mais.
+
+    Versões antigas não ativavam `foreign_keys`, então remover um servidor
+    deixava para trás seu log, eventos e jogadores; com a checagem ativa,
+    as migrações que copiam esses dados falhariam nessas linhas.
+    """
+    cursor = await conn.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name != 'servidores'")
+    for (tabela,) in await cursor.fetchall():
+        cursor = await conn.execute(f"PRAGMA foreign_key_list({tabela})")
+        colunas = [row[3] for row in await cursor.fetchall() if row[2] == 'servidores']
+        for coluna in colunas:
+            cursor = await conn.execute(
+                f"DELETE FROM {tabela} WHERE {coluna} NOT IN (SELECT id FROM servidores)"
+            )
+            if cursor.rowcount > 0:
+                logger.info(f"{cursor.rowcount} linhas de servidores removidos apagadas de '{tabela}'.")
+    await conn.commit()
+
+
+async def migrate(conn: aiosqlite.Connection, migracoes: List[Migration] = MIGRACOES) -> int:
+    """Aplica, em ordem, as migrações ainda não registradas em `schema_version`. Retorna a versão final."""
+    versao = await _versao_atual(conn)
+    pendentes = [m for m in sorted(migracoes, key=lambda m: m.versao) if m.versao > versao]
+    if not pendentes:
+        logger.info(f"Schema do banco de dados na versão {versao}.")
+        return versao
+
+    await _remover_orfaos(conn)
+    for migracao in pendentes:
+        logger.info(f"Aplicando migração {migracao.versao}: {migracao.descricao}...")
+        try:
+            if migracao.transacional:
+                await conn.execute("BEGIN")
+            await migracao.aplicar(conn)
+            await conn.execute(
+                "INSERT INTO schema_version (versao, descricao, aplicada_em) VALUES (?, ?, ?)",
+                (migracao.versao, migracao.descricao, datetime.now(timezone.utc).isoformat())
+            )
+            await conn.commit()
+        except Exception as e:
+            await conn.rollback()
+            logger.error(f"Falha na migração {migracao.versao} ({migracao.descricao}): {e}")
+            raise
+        versao = migracao.versao
+
+    logger.info(f"Schema do banco de dados atualizado para a versão {versao}.")
+    return versao
@@ -2,82 +2,237 @@ import asyncio
 import aiosqlite
 import logging
 from datetime import datetime
-from mcstatus import JavaServer
-from typing import Optional, List
+from typing import AsyncIterator, Dict, Optional, List, Set, Tuple
 import os
 import json
-from watchdog.observers import Observer
-from watchdog.events import FileSystemEventHandler
+import random
+import re
+import time
 from fastapi import WebSocket
-from blockspy.utils import determinar_tipo_servidor, get_country_from_ip
+from blockspy.utils import determinar_tipo_servidor, get_country_from_ip, get_timezone, dumps_json
+from blockspy.scheduler import PollScheduler, AdaptiveInterval
+from blockspy.db_writer import DbWriter
+from blockspy.probe import ProbeWorkerPool, probe_server
+from blockspy.dns_cache import dns_cache
+from blockspy.geoip import get_geoip_database
+from blockspy.icon_cache import IconCache
+from blockspy.migrations import apply_pragmas, migrate
+from blockspy.rollups import rollup_statements, escolher_resolucao, bucket, epoch_iso
+from blockspy.downsampling import LttbDownsampler
+from blockspy.retention import RetentionJob
+from blockspy.read_cache import ReadModelCache
+from blockspy.live_feed import ServerFeed
+from blockspy.fleet_state import COLUNAS_PUBLICAS_SERVIDOR, FleetRegistry
+from blockspy.read_pool import ReadPool
+from blockspy.log_tailer import LogTailHub
+from blockspy.log_index import LogIndex
+from blockspy.log_ingest import (
+    EVENTO_ENTROU, EVENTO_SAIU, EVENTO_UUID, EVENTO_INICIADO, EVENTO_PARANDO, classificar_linha, jogadores_do_list,
+)
+from blockspy.rcon_pool import RconPool, RconAuthenticationError, RconConnectionError
+from blockspy.sessions import (
+    SQL_ABRIR_SESSAO, SQL_FECHAR_SESSAO, SQL_FECHAR_SESSOES_SERVIDOR, SQL_TEMPO_JOGADO_POR_SERVIDOR, SQL_TOP_JOGADORES, SQL_SESSOES_DO_SERVIDOR,
+    parametros_janela, curva_concorrencia,
+)
 from async_mcrcon import MinecraftClient
 from datetime import datetime, timezone
 from datetime import datetime, timedelta
 
 
-class RconAuthenticationError(Exception):
-    """Exceção para falha de autenticação RCON."""
-    pass
-
-class RconConnectionError(Exception):
-    """Exceção para outras falhas de conexão RCON."""
-    pass
-
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 
 
 INTERVALO_SEGUNDOS_ONLINE = 20
-DELAY_BETWEEN_BATCHES = 5
-BATCH_SIZE = 5
-
-class LogFileHandler(FileSystemEventHandler):
-    def __init__(self, file_path, callback):
-        self.file_path = file_path
-        self.callback = callback
-        self.last_pos = 0
-        if os.path.exists(self.file_path):
-            try:
-                with open(self.file_path, 'r', encoding='utf-8', errors='ignore') as f:
-                    f.seek(0, 2)
-                    self.last_pos = f.tell()
-            except Exception as e:
-                logging.warning(f"Não foi possível acessar o log em {file_path}: {e}")
-
-    def on_modified(self, event):
-        if event.src_path == self.file_path:
-            try:
-                with open(self.file_path, 'r', encoding='utf-8', errors='ignore') as f:
-                    f.seek(self.last_pos)
-                    new_lines = f.readlines()
-                    if new_lines:
-                        asyncio.create_task(self.callback(new_lines))
-                        self.last_pos = f.tell()
-            except Exception as e:
-                logging.warning(f"Erro ao ler modificações do log {self.file_path}: {e}")
+MAX_VERIFICACOES_CONCORRENTES = int(os.environ.get('BLOCKSPY_MAX_CONCORRENTES', '32'))
+JITTER_AGENDAMENTO = 0.1
+INTERVALO_SINCRONIZACAO = 10
+TIMEOUT_VERIFICACAO = 10
+# Com valor > 0, as consultas de status rodam em N processos separados (shard por id do servidor).
+PROCESSOS_DE_VERIFICACAO = int(os.environ.get('BLOCKSPY_POLL_WORKERS', '0'))
+# Limites padrão do intervalo adaptativo (sobrescritos por intervalo_min/intervalo_max de cada servidor).
+INTERVALO_MINIMO_PADRAO = 10
+INTERVALO_MAXIMO_OFFLINE_PADRAO = 300
+# Escritor em lote: tamanho da fila (backpressure), resultados por transação e tempo máximo de um lote.
+TAMANHO_FILA_ESCRITA = 2000
+MAX_RESULTADOS_POR_LOTE = 500
+INTERVALO_FLUSH_SEGUNDOS = 0.5
+# Conexões só de leitura (API e consultas do monitoramento); as escritas ficam na conexão principal.
+CONEXOES_LEITURA = int(os.environ.get('BLOCKSPY_CONEXOES_LEITURA', '4'))
+# Sessões RCON autenticadas mantidas por servidor, e por quanto tempo uma sessão parada fica aberta.
+SESSOES_RCON_POR_SERVIDOR = int(os.environ.get('BLOCKSPY_RCON_SESSOES', '2'))
+TEMPO_OCIOSO_RCON_SEGUNDOS = int(os.environ.get('BLOCKSPY_RCON_OCIOSO', '300'))
+# Comando em vários servidores: quantos executam ao mesmo tempo e o prazo padrão de cada um.
+MAX_RCON_BROADCAST_CONCORRENTES = int(os.environ.get('BLOCKSPY_RCON_BROADCAST_CONCORRENTES', '32'))
+TIMEOUT_RCON_BROADCAST = 10
+TIMEOUT_RCON_BROADCAST_MAXIMO = 120
+# Índice de busca dos logs dos servidores com caminho configurado (0 desliga), em arquivo próprio.
+INDICE_LOGS = os.environ.get('BLOCKSPY_INDICE_LOGS', '1') != '0'
+INTERVALO_INDICE_LOGS_SEGUNDOS = 60
+# Servidores com latest.log local: entradas, saídas, início e parada vêm do log (0 desliga),
+# e a consulta de status vira um heartbeat (ping, MOTD e quedas sem "Stopping server").
+INGESTAO_LOGS = os.environ.get('BLOCKSPY_INGESTAO_LOGS', '1') != '0'
+INTERVALO_HEARTBEAT_LOG = 120
+# Heartbeats seguidos sem resposta até as sessões de um servidor com log acompanhado serem
+# encerradas (processo que caiu sem escrever "Stopping server"); uma falha isolada não encerra nada.
+FALHAS_HEARTBEAT_LOG = 3
+# Linhas do latest.log enviadas a um console ao conectar.
+LINHAS_INICIAIS_CONSOLE = 15
+# Códigos de cor (§a, §l...) nas respostas RCON.
+RE_CODIGO_COR = re.compile(r'§.')
+# Memória máxima (em MB) das respostas de leitura em cache por servidor.
+TAMANHO_CACHE_LEITURA_MB = int(os.environ.get('BLOCKSPY_CACHE_LEITURA_MB', '32'))
+# Intervalo entre as limpezas de dados antigos (retenção por tabela em blockspy/retention.py).
+INTERVALO_RETENCAO_SEGUNDOS = 3600
+# Acima disso o histórico passa a vir dos rollups (minuto/hora/dia) em vez do log bruto.
+PONTOS_HISTORICO_PADRAO = 2000
+
+SQL_SERVIDORES_PUBLICOS = (
+    f"SELECT {', '.join(COLUNAS_PUBLICAS_SERVIDOR)}, "
+    "(rcon_password IS NOT NULL AND rcon_password != '') AS rcon_configurado FROM servidores"
+)
+# Uptime ponderado pelo tempo: cada minuto com verificações vale até o próximo minuto verificado
+# (limitado à maior distância esperada entre verificações), então o resultado não depende da frequência.
+# Parâmetros: (agora, distância máxima, servidor_id, início da janela).
+SQL_UPTIME = """
+    SELECT SUM(fracao_online * peso) AS online, SUM(peso) AS coberto FROM (
+        SELECT amostras_online * 1.0 / amostras AS fracao_online,
+               MIN(COALESCE(LEAD(bucket) OVER (ORDER BY bucket), ?1) - bucket, ?2) AS peso
+        FROM log_status_minuto WHERE servidor_id = ?3 AND bucket >= ?4
+    )
+"""
+# Intervalo em que os resultados confirmados são juntados em um quadro do painel ao vivo.
+TICK_PAINEL_AO_VIVO = 0.25
+
+# Comandos gravados pelo escritor em lote; precisam ser idênticos para virarem um único executemany.
+SQL_INSERIR_EVENTO = "INSERT INTO eventos (servidor_id, timestamp, tipo_evento, detalhes) VALUES (?, ?, ?, ?)"
+# Duas verificações do mesmo servidor no mesmo segundo ficam com a mais recente.
+SQL_INSERIR_LOG_STATUS = "INSERT OR REPLACE INTO log_status (servidor_id, ts, ping, jogadores_online) VALUES (?, ?, ?, ?)"
+SQL_ATUALIZAR_SERVIDOR_ONLINE = """UPDATE servidores SET status=?, nome_servidor=?, versao=?, jogadores_online=?,
+    jogadores_maximos=?, ping=?, tem_icone_customizado=?, icone_hash=?, localizacao=?, ultima_verificacao=?,
+    tipo_servidor=? WHERE id=?"""
+SQL_ATUALIZAR_SERVIDOR_OFFLINE = "UPDATE servidores SET status='offline', ultima_verificacao=? WHERE id=?"
+SQL_JOGADOR_OFFLINE = "UPDATE historico_jogadores SET status_online = 0, ultima_vez_visto = ? WHERE servidor_id = ? AND nome_jogador = ?"
+SQL_JOGADORES_OFFLINE_SERVIDOR = "UPDATE historico_jogadores SET status_online = 0, ultima_vez_visto = ? WHERE servidor_id = ? AND status_online = 1"
+SQL_JOGADOR_ONLINE = """INSERT INTO historico_jogadores (servidor_id, nome_jogador, uuid, status_online, ultima_vez_visto)
+    VALUES (?, ?, ?, 1, ?)
+    ON CONFLICT(servidor_id, nome_jogador) DO UPDATE SET
+    status_online = 1, ultima_vez_visto = excluded.ultima_vez_visto, uuid = COALESCE(excluded.uuid, uuid)"""
 
 class MonitorService:
     def __init__(self, db_path: str):
         self.db_path = db_path
         self.db_connection: Optional[aiosqlite.Connection] = None
+        self.reads = ReadPool(self.db_path, CONEXOES_LEITURA)
         self.logger = logging.getLogger(self.__class__.__name__)
-        self.log_observers = {}
+        self.logs = LogTailHub()
+        self.scheduler = PollScheduler(
+            self._poll_server,
+            intervalo=INTERVALO_SEGUNDOS_ONLINE,
+            concorrencia=MAX_VERIFICACOES_CONCORRENTES,
+            jitter=JITTER_AGENDAMENTO,
+        )
+        self._intervalos = {}
+        self.db_lock: Optional[asyncio.Lock] = None
+        self.writer: Optional[DbWriter] = None
+        self._writer_task: Optional[asyncio.Task] = None
+        self.probe_pool: Optional[ProbeWorkerPool] = None
+        self.icons: Optional[IconCache] = None
+        self.retention: Optional[RetentionJob] = None
+        self.read_cache = ReadModelCache(max_bytes=TAMANHO_CACHE_LEITURA_MB * 1024 * 1024)
+        self.registry = FleetRegistry()
+        # Jogadores online por servidor, como gravado no historico_jogadores.
+        self._online_players: Dict[int, Set[str]] = {}
+        self.feed = ServerFeed(self._load_public_servers, tick=TICK_PAINEL_AO_VIVO)
+        self._feed_task: Optional[asyncio.Task] = None
+        self._retention_task: Optional[asyncio.Task] = None
+        self.rcon = RconPool(
+            self._load_rcon_credentials,
+            max_sessoes=SESSOES_RCON_POR_SERVIDOR,
+            tempo_ocioso=TEMPO_OCIOSO_RCON_SEGUNDOS,
+        )
+        self._rcon_task: Optional[asyncio.Task] = None
+        self.log_index = LogIndex(
+            os.path.join(os.path.dirname(os.path.abspath(self.db_path)), 'logs_index.db'),
+            self._log_sources,
+        )
+        self._log_index_task: Optional[asyncio.Task] = None
+        # Ingestão do latest.log: tarefa e caminho por servidor, e os que já estão acompanhando o arquivo.
+        self._log_ingest: Dict[int, Tuple[str, asyncio.Task]] = {}
+        self._log_ativo: Set[int] = set()
+        self._eventos_log: Dict[str, int] = {}
+        # Servidores cuja lista de online precisa ser refeita (início da ingestão, linhas descartadas)
+        # e heartbeats seguidos sem resposta de cada servidor com log acompanhado.
+        self._log_resync: Set[int] = set()
+        self._falhas_heartbeat: Dict[int, int] = {}
 
     async def connect_db(self):
         self.db_connection = await aiosqlite.connect(self.db_path)
         self.db_connection.row_factory = aiosqlite.Row
         self.logger.info(f"Conexão com o banco de dados '{self.db_path}' estabelecida.")
-        await self._criar_tabelas()
-        await self._atualizar_schema()
+        await apply_pragmas(self.db_connection)
+        await migrate(self.db_connection)
+        self.icons = IconCache(
+            os.path.join(os.path.dirname(os.path.abspath(self.db_path)), 'icons'), self._icon_shared,
+        )
+        # Carrega a base de geolocalização fora do loop (um CSV grande leva alguns segundos).
+        await asyncio.get_running_loop().run_in_executor(None, get_geoip_database)
+        # Toda escrita na conexão compartilhada passa por este lock, para que o
+        # commit de uma não feche a transação em grupo do escritor no meio.
+        self.db_lock = asyncio.Lock()
+        self.writer = DbWriter(
+            self.db_connection, self.db_lock,
+            max_fila=TAMANHO_FILA_ESCRITA,
+            max_lote=MAX_RESULTADOS_POR_LOTE,
+            intervalo_flush=INTERVALO_FLUSH_SEGUNDOS,
+            on_commit=self._on_commit,
+            on_discard=self._on_discard,
+        )
+        self.retention = RetentionJob(self.db_connection, self.db_lock)
+        # Abertas só depois das migrações, para já enxergarem o schema final.
+        await self.reads.open()
+        await self._reload_registry()
+        await self.log_index.open()
+
+    async def close(self):
+        """Grava o que estiver pendente no escritor e fecha o banco."""
+        if self.probe_pool:
+            self.probe_pool.stop()
+        if self._retention_task:
+            self._retention_task.cancel()
+        if self._feed_task:
+            self._feed_task.cancel()
+        if self._rcon_task:
+            self._rcon_task.cancel()
+        if self._log_index_task:
+            self._log_index_task.cancel()
+        for _, tarefa in self._log_ingest.values():
+            tarefa.cancel()
+        await self.log_index.close()
+        self.rcon.close()
+        self.logs.close()
+        if self.writer:
+            # Sem monitoramento ninguém é visto saindo: as sessões abertas terminam agora.
+            agora = datetime.now(timezone.utc)
+            escritas = []
+            for server_id in self.registry.ids():
+                escritas.extend(self._close_player_sessions(server_id, agora))
+            await self.writer.submit(None, escritas)
+        if self._writer_task:
+            self._writer_task.cancel()
+        if self.writer:
+            await self.writer.drain()
+        if self.db_connection:
+            await self.db_connection.execute("PRAGMA optimize")
+            await self.db_connection.close()
+        await self.reads.close()
     
     async def get_server_events(self, ip_servidor: str, limit: int = 50) -> list:
-        cursor = await self.db_connection.execute("SELECT id FROM servidores WHERE ip_servidor = ?", (ip_servidor,))
-        server_row = await cursor.fetchone()
+        server_row = await self.reads.fetchone("SELECT id FROM servidores WHERE ip_servidor = ?", (ip_servidor,))
         if not server_row:
             return []
         
         query = "SELECT timestamp, tipo_evento, detalhes FROM eventos WHERE servidor_id = ? ORDER BY timestamp DESC LIMIT ?"
-        cursor = await self.db_connection.execute(query, (server_row['id'], limit))
-        return [dict(row) for row in await cursor.fetchall()]
+        return [dict(row) for row in await self.reads.fetchall(query, (server_row['id'], limit))]
 
     async def test_rcon_connection(self, host: str, port: int, password: str):
         self.logger.info(f"Iniciando teste de RCON para {host}:{port}")
@@ -100,157 +255,164 @@ class MonitorService:
             else:
                 raise RconConnectionError(f"Erro inesperado na conexão RCON: {e}")
 
+    def _log_sources(self) -> List[Tuple[int, str]]:
+        return [(s['id'], s['caminho_servidor']) for s in self.registry.rows() if s['caminho_servidor']]
+
+    async def search_logs(self, ip_servidor: str, consulta: str, limite: int = 50, antes: Optional[int] = None,
+                          contexto: int = 2) -> Optional[dict]:
+        """Busca no índice dos logs (atual e rotacionados) do servidor; None se o servidor não existe."""
+        server_id = await self._cached_server_id(ip_servidor)
+        if server_id is None:
+            return None
+        return await self.log_index.search(server_id, consulta, limite=limite, antes=antes, contexto=contexto)
+
+    async def _load_rcon_credentials(self, ip_servidor: str) -> Optional[Tuple[str, int, str]]:
+        row = await self.reads.fetchone(
+            "SELECT ip_servidor, rcon_port, rcon_password FROM servidores WHERE ip_servidor = ?", (ip_servidor,)
+        )
+        if not row or not row['rcon_port'] or not row['rcon_password']:
+            return None
+        return row['ip_servidor'], int(row['rcon_port']), str(row['rcon_password'])
+
     async def execute_rcon_command(self, ip_servidor: str, command: str) -> str:
-        """Conecta-se via RCON, executa um comando e retorna a resposta."""
+        """Executa um comando numa sessão RCON já autenticada do servidor e retorna a resposta."""
         self.logger.info(f"Executando comando RCON em {ip_servidor}: '{command}'")
         try:
-            server_data = await self.get_server_data(ip_servidor)
-
-            if not server_data or not server_data['rcon_port'] or not server_data['rcon_password']:
+            if await self.rcon.credentials(ip_servidor) is None:
                 return "ERRO: Dados de conexão RCON não configurados."
 
-            async with MinecraftClient(
-                host=server_data['ip_servidor'],
-                port=int(server_data['rcon_port']),
-                password=str(server_data['rcon_password'])
-            ) as client:
-                response_raw = await client.send(command)
-
-                if isinstance(response_raw, bytes):
-                    response_text = response_raw.decode("utf-8", errors="ignore")
-                else:
-                    response_text = str(response_raw)
+            response_text = await self.rcon.execute(ip_servidor, command)
 
-                import re
-                response_text = re.sub(r'§.', '', response_text)
+            response_text = RE_CODIGO_COR.sub('', response_text)
 
-                return response_text if response_text.strip() else "[Servidor não retornou resposta]"
+            return response_text if response_text.strip() else "[Servidor não retornou resposta]"
 
         except Exception as e:
             self.logger.error(f"Falha ao executar comando RCON em {ip_servidor}: {e}", exc_info=True)
             return f"ERRO RCON: {type(e).__name__} - {e}"
 
 
-    async def get_server_data(self, ip_servidor: str) -> dict:
-        """ Busca todos os dados de um único servidor. """
-        cursor = await self.db_connection.execute(
-            "SELECT * FROM servidores WHERE ip_servidor = ?", (ip_servidor,)
-    )
-        row = await cursor.fetchone()
-        return dict(row) if row else None
-        
-    async def _criar_tabelas(self):
-        self.logger.info("Verificando e criando a estrutura final do banco de dados...")
-
-        await self.db_connection.execute("""
-            CREATE TABLE IF NOT EXISTS servidores (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                ip_servidor TEXT NOT NULL UNIQUE,
-                nome_servidor TEXT,
-                nome_customizado TEXT,
-                versao TEXT,
-                jogadores_online INTEGER,
-                jogadores_maximos INTEGER,
-                ping REAL,
-                status TEXT DEFAULT 'pending',
-                pausado INTEGER DEFAULT 0,
-                tem_icone_customizado INTEGER DEFAULT 0,
-                localizacao TEXT,
-                tipo_servidor TEXT,
-                caminho_servidor TEXT,
-                rcon_port INTEGER,
-                rcon_password TEXT,
-                ultima_verificacao TEXT,
-                discord_webhook_url TEXT,
-                notificar_online_offline INTEGER DEFAULT 0,
-                notificar_pico_jogadores INTEGER DEFAULT 0,
-                notificar_marcos_lotacao INTEGER DEFAULT 0,
-                notificar_primeira_entrada INTEGER DEFAULT 0,
-                ultimo_marco_notificado INTEGER DEFAULT 0
-            );
-        """)
-        
-        await self.db_connection.commit()
-
-        await self.db_connection.execute("""
-            CREATE TABLE IF NOT EXISTS log_status (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                servidor_id INTEGER NOT NULL,
-                timestamp TEXT NOT NULL,
-                ping REAL,
-                jogadores_online INTEGER,
-                FOREIGN KEY(servidor_id) REFERENCES servidores(id) ON DELETE CASCADE
-            );
-        """)
-        await self.db_connection.execute("""
-            CREATE TABLE IF NOT EXISTS historico_jogadores (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                servidor_id INTEGER NOT NULL,
-                nome_jogador TEXT NOT NULL,
-                uuid TEXT,
-                status_online INTEGER DEFAULT 0,
-                ultima_vez_visto TEXT,
-                FOREIGN KEY(servidor_id) REFERENCES servidores(id) ON DELETE CASCADE,
-                UNIQUE(servidor_id, nome_jogador)
-            );
-        """)
-        await self.db_connection.execute("""
-            CREATE TABLE IF NOT EXISTS eventos (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                servidor_id INTEGER NOT NULL,
-                timestamp TEXT NOT NULL,
-                tipo_evento TEXT NOT NULL,
-                detalhes TEXT,
-                FOREIGN KEY(servidor_id) REFERENCES servidores(id) ON DELETE CASCADE
-            );
-        """)
-        await self.db_connection.execute("""
-            CREATE TABLE IF NOT EXISTS jogadores_vigiados (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                servidor_id INTEGER NOT NULL,
-                nome_jogador TEXT NOT NULL,
-                FOREIGN KEY(servidor_id) REFERENCES servidores(id) ON DELETE CASCADE,
-                UNIQUE(servidor_id, nome_jogador)
-            );
-        """)
-        
-        await self.db_connection.commit()
+    def select_rcon_targets(self, ips: Optional[List[str]] = None, tipo_servidor: Optional[str] = None,
+                            somente_online: bool = True) -> List[str]:
+        """IPs dos servidores com RCON configurado que atendem ao seletor (lista de IPs, tipo e status)."""
+        servidores = self.registry.rows()
+        if ips:
+            conhecidos = {s['ip_servidor'] for s in servidores}
+            desconhecidos = [ip for ip in ips if ip not in conhecidos]
+            if desconhecidos:
+                raise ValueError(f"Servidores não encontrados: {', '.join(desconhecidos)}")
+            ips = set(ips)
+            servidores = [s for s in servidores if s['ip_servidor'] in ips]
+        alvos = [
+            s['ip_servidor'] for s in servidores
+            if s['rcon_configurado']
+            and (not tipo_servidor or s['tipo_servidor'] == tipo_servidor)
+            and (not somente_online or (s['status'] == 'online' and not s['pausado']))
+        ]
+        if not alvos:
+            raise ValueError("Nenhum servidor com RCON configurado corresponde à seleção.")
+        return alvos
 
-    async def _atualizar_schema(self):
-        """Verifica e aplica atualizações necessárias no schema do banco de dados."""
+    def broadcast_rcon_command(self, alvos: List[str], command: str,
+                               timeout: float = TIMEOUT_RCON_BROADCAST) -> AsyncIterator[dict]:
+        """
+        Executa o comando em todos os `alvos` pelas sessões do pool RCON e
+        entrega o resultado de cada servidor assim que ele termina, seguido de
+        um resumo. No máximo MAX_RCON_BROADCAST_CONCORRENTES comandos rodam ao
+        mesmo tempo; `timeout` vale para cada servidor, sem contar a espera na fila.
+        Os parâmetros são validados aqui, antes de o primeiro comando sair.
+        """
+        command = command.strip()
+        if not command:
+            raise ValueError("O comando não pode ser vazio.")
+        if not 0 < timeout <= TIMEOUT_RCON_BROADCAST_MAXIMO:
+            raise ValueError(f"O timeout deve estar entre 0 e {TIMEOUT_RCON_BROADCAST_MAXIMO} segundos.")
+        return self._broadcast_rcon_command(alvos, command, timeout)
+
+    async def _broadcast_rcon_command(self, alvos: List[str], command: str, timeout: float) -> AsyncIterator[dict]:
+        self.logger.info(f"Executando comando RCON em {len(alvos)} servidores: '{command}'")
+        limite = asyncio.Semaphore(MAX_RCON_BROADCAST_CONCORRENTES)
+        inicio = time.monotonic()
+
+        async def executar(ip_servidor: str) -> dict:
+            async with limite:
+                inicio_servidor = time.monotonic()
+                resultado = {"ip_servidor": ip_servidor, "ok": False}
+                try:
+                    resposta = await asyncio.wait_for(self.rcon.execute(ip_servidor, command), timeout)
+                    resultado.update(ok=True, resposta=RE_CODIGO_COR.sub('', resposta))
+                except asyncio.TimeoutError:
+                    resultado["erro"] = f"Sem resposta em {timeout:g}s."
+                except (RconAuthenticationError, RconConnectionError) as e:
+                    resultado["erro"] = str(e)
+                except Exception as e:
+                    self.logger.error(f"Falha ao executar comando RCON em {ip_servidor}: {e}", exc_info=True)
+                    resultado["erro"] = f"{type(e).__name__} - {e}"
+                resultado["duracao_ms"] = round((time.monotonic() - inicio_servidor) * 1000, 1)
+                return resultado
+
+        tarefas = [asyncio.create_task(executar(ip)) for ip in alvos]
+        sucessos = 0
         try:
-            self.logger.info("Verificando schema do banco de dados para atualizações...")
-            cursor = await self.db_connection.execute("PRAGMA table_info(servidores);")
-            columns = [row[1] for row in await cursor.fetchall()]
-
-            colunas_para_adicionar = {
-                'nome_customizado': 'TEXT',
-                'caminho_servidor': 'TEXT DEFAULT NULL',
-                'discord_webhook_url': 'TEXT',
-                'notificar_online_offline': 'INTEGER DEFAULT 0',
-                'notificar_pico_jogadores': 'INTEGER DEFAULT 0',
-                'notificar_marcos_lotacao': 'INTEGER DEFAULT 0',
-                'notificar_primeira_entrada': 'INTEGER DEFAULT 0',
-                'ultimo_marco_notificado': 'INTEGER DEFAULT 0'
-            }
-
-            for col, tipo in colunas_para_adicionar.items():
-                if col not in columns:
-                    self.logger.info(f"Adicionando coluna '{col}' à tabela 'servidores'...")
-                    await self.db_connection.execute(f'ALTER TABLE servidores ADD COLUMN {col} {tipo};')
-                    self.logger.info(f"Coluna '{col}' adicionada com sucesso.")
-            
-            await self.db_connection.commit()
-            self.logger.info("Schema verificado e atualizado!")
+            for proxima in asyncio.as_completed(tarefas):
+                resultado = await proxima
+                sucessos += resultado["ok"]
+                yield resultado
+        finally:
+            # Cliente desconectou no meio: os comandos que ainda não rodaram não são enviados.
+            for tarefa in tarefas:
+                tarefa.cancel()
+        yield {
+            "resumo": True,
+            "servidores": len(alvos),
+            "ok": sucessos,
+            "falhas": len(alvos) - sucessos,
+            "duracao_ms": round((time.monotonic() - inicio) * 1000, 1),
+        }
 
-        except Exception as e:
-            self.logger.error(f"Ocorreu um erro grave ao atualizar o schema do banco de dados: {e}")
+    async def get_server_icon_hash(self, ip_servidor: str) -> Optional[str]:
+        """Hash do ícone salvo localmente para o servidor, se houver."""
+        row = await self.reads.fetchone("SELECT icone_hash FROM servidores WHERE ip_servidor = ?", (ip_servidor,))
+        return row['icone_hash'] if row else None
 
+    async def _execute_write(self, query: str, params: tuple = ()):
+        """Executa uma escrita avulsa (fora do escritor em lote) e faz o commit."""
+        async with self.db_lock:
+            cursor = await self.db_connection.execute(query, params)
+            await self.db_connection.commit()
+        # Inclusões, remoções e edições: o estado em memória é relido do banco,
+        # e o painel ao vivo compara com o anterior e envia só o que mudou.
+        await self._reload_registry()
+        self.feed.mark_dirty()
+        return cursor
+
+    def _on_commit(self, server_ids: list):
+        """Chamado pelo escritor após cada lote confirmado."""
+        self.read_cache.bump(server_ids)
+        self.feed.mark_dirty(server_ids)
+
+    def _on_discard(self, server_id: int):
+        """O escritor descartou um resultado: o conjunto online em memória pode não bater mais com o banco."""
+        self._online_players.pop(server_id, None)
+
+    async def _reload_registry(self):
+        # Na conexão do escritor: logo após uma edição não fica atrás das leituras pesadas da API.
+        cursor = await self.db_connection.execute(SQL_SERVIDORES_PUBLICOS)
+        self.registry.load(await cursor.fetchall())
+        for server_id in self._online_players.keys() - self.registry.ids():
+            del self._online_players[server_id]
+
+    async def _load_public_servers(self, server_ids: Optional[List[int]] = None) -> List[dict]:
+        return self.registry.rows(server_ids)
 
+    async def get_server_data(self, ip_servidor: str) -> dict:
+        """ Busca todos os dados de um único servidor. """
+        row = await self.reads.fetchone("SELECT * FROM servidores WHERE ip_servidor = ?", (ip_servidor,))
+        return dict(row) if row else None
+        
     async def get_first_server_settings(self) -> dict:
         """Busca as configurações do primeiro servidor para usar como base global."""
-        cursor = await self.db_connection.execute("SELECT * FROM servidores ORDER BY id ASC LIMIT 1")
-        row = await cursor.fetchone()
+        row = await self.reads.fetchone("SELECT * FROM servidores ORDER BY id ASC LIMIT 1")
         return dict(row) if row else {}
 
     async def save_all_servers_settings(self, settings) -> bool:
@@ -264,8 +426,7 @@ class MonitorService:
             query = f"UPDATE servidores SET {', '.join(query_parts)}"
             params = list(settings_dict.values())
             
-            await self.db_connection.execute(query, tuple(params))
-            await self.db_connection.commit()
+            await self._execute_write(query, tuple(params))
             return True
         except Exception as e:
             self.logger.error(f"Erro ao salvar configurações globais: {e}")
@@ -273,147 +434,171 @@ class MonitorService:
 
     async def get_watchlist_for_server(self, server_ip: str) -> list:
         """Busca a lista de jogadores vigiados para um servidor."""
-        cursor = await self.db_connection.execute(
+        rows = await self.reads.fetchall(
             """SELECT jv.nome_jogador FROM jogadores_vigiados jv
                JOIN servidores s ON s.id = jv.servidor_id
                WHERE s.ip_servidor = ?""",
             (server_ip,)
         )
-        rows = await cursor.fetchall()
         return [dict(row) for row in rows]
 
     async def add_player_to_watchlist(self, server_ip: str, player_name: str) -> dict:
         """Adiciona um jogador à lista de vigilância de um servidor."""
-        cursor = await self.db_connection.execute("SELECT id FROM servidores WHERE ip_servidor = ?", (server_ip,))
-        server_row = await cursor.fetchone()
+        server_row = await self.reads.fetchone("SELECT id FROM servidores WHERE ip_servidor = ?", (server_ip,))
         if not server_row:
             raise ValueError("Servidor não encontrado.")
         
         try:
-            await self.db_connection.execute(
+            await self._execute_write(
                 "INSERT INTO jogadores_vigiados (servidor_id, nome_jogador) VALUES (?, ?)",
                 (server_row['id'], player_name)
             )
-            await self.db_connection.commit()
             return {"message": "Jogador adicionado à watchlist."}
         except Exception:
             raise ValueError(f"O jogador '{player_name}' já está na watchlist.")
 
     async def remove_player_from_watchlist(self, server_ip: str, player_name: str) -> bool:
         """Remove um jogador da lista de vigilância de um servidor."""
-        cursor = await self.db_connection.execute("SELECT id FROM servidores WHERE ip_servidor = ?", (server_ip,))
-        server_row = await cursor.fetchone()
+        server_row = await self.reads.fetchone("SELECT id FROM servidores WHERE ip_servidor = ?", (server_ip,))
         if not server_row:
             return False
             
-        delete_cursor = await self.db_connection.execute(
+        delete_cursor = await self._execute_write(
             "DELETE FROM jogadores_vigiados WHERE servidor_id = ? AND nome_jogador = ?",
             (server_row['id'], player_name)
         )
-        await self.db_connection.commit()
         return delete_cursor.rowcount > 0
 
-    async def get_calendar_heatmap_data(self, ip_servidor: str, year: int, month: int) -> list:
+    async def _hourly_rollups(self, server_id: int, inicio: int, fim: Optional[int] = None):
+        """Buckets de hora (início, soma de jogadores, amostras online) de um servidor, já pré-agregados."""
+        query = "SELECT bucket, soma_jogadores, amostras_online FROM log_status_hora WHERE servidor_id = ? AND bucket >= ? AND amostras_online > 0"
+        params = [server_id, inicio]
+        if fim is not None:
+            query += " AND bucket < ?"
+            params.append(fim)
+        return await self.reads.fetchall(query, params)
+
+    async def get_calendar_heatmap_data(self, ip_servidor: str, year: int, month: int, tz: Optional[str] = None) -> list:
+        """
+        Média diária de jogadores no mês, com os dias contados no fuso `tz` (padrão UTC).
+        Lê no máximo ~744 buckets de hora pré-agregados, em vez do log bruto.
+        """
         self.logger.info(f"Gerando dados de calendário para {ip_servidor} (Mês: {month}/{year})")
-        cursor = await self.db_connection.execute("SELECT id FROM servidores WHERE ip_servidor = ?", (ip_servidor,))
-        server_info = await cursor.fetchone()
+        fuso = get_timezone(tz)
+        server_info = await self.reads.fetchone("SELECT id FROM servidores WHERE ip_servidor = ?", (ip_servidor,))
         if not server_info: return []
 
-        start_date = f"{year}-{month:02d}-01"
-        next_month_date = (datetime(year, month, 1) + timedelta(days=32)).replace(day=1)
-        end_date = next_month_date.strftime('%Y-%m-%d')
-
-        query = """
-            SELECT
-                -- Timestamp em segundos, necessário para o frontend
-                CAST(strftime('%s', date(timestamp)) AS INTEGER) as timestamp,
-                -- Média de jogadores, arredondada para inteiro
-                CAST(AVG(jogadores_online) AS INTEGER) as value
-            FROM log_status
-            WHERE servidor_id = ? AND timestamp >= ? AND timestamp < ?
-            GROUP BY date(timestamp);
-        """
-        cursor = await self.db_connection.execute(query, (server_info['id'], start_date, end_date))
-        return [dict(row) for row in await cursor.fetchall()]
+        start_date = datetime(year, month, 1, tzinfo=fuso)
+        next_month_date = (datetime(year, month, 1) + timedelta(days=32)).replace(day=1, tzinfo=fuso)
+        rows = await self._hourly_rollups(server_info['id'], int(start_date.timestamp()), int(next_month_date.timestamp()))
+
+        # Fusos com meia hora de diferença atribuem cada bucket ao dia em que ele começa.
+        dias = {}
+        for row in rows:
+            dia = datetime.fromtimestamp(row['bucket'], fuso).date()
+            acumulado = dias.setdefault(dia, [0, 0])
+            acumulado[0] += row['soma_jogadores']
+            acumulado[1] += row['amostras_online']
+
+        return [
+            {
+                # Timestamp em segundos (meia-noite no fuso pedido), necessário para o frontend
+                "timestamp": int(datetime(dia.year, dia.month, dia.day, tzinfo=fuso).timestamp()),
+                "date": dia.isoformat(),
+                # Média de jogadores, arredondada para inteiro
+                "value": int(soma / amostras),
+            }
+            for dia, (soma, amostras) in sorted(dias.items())
+        ]
 
-    async def _update_server_data(self, servidor_row):
+    async def _update_server_data(self, servidor_row) -> Optional[int]:
+        """Verifica o servidor e enfileira o resultado no escritor. Retorna os jogadores online, ou None se estiver offline."""
         ip = servidor_row['ip_servidor']
         server_id = servidor_row['id']
-        timestamp = datetime.now(timezone.utc).isoformat()
+        agora = datetime.now(timezone.utc)
+        timestamp = agora.isoformat()
+        epoch = int(agora.timestamp())
+        jogadores_online = None
+        escritas = []
         
         status_anterior = servidor_row['status']
         versao_anterior = servidor_row['versao']
 
         try:
-            server = await JavaServer.async_lookup(ip, timeout=10)
-            status = await server.async_status()
+            status = await self._probe(server_id, ip)
             
             if status_anterior != 'online':
-                await self.db_connection.execute(
-                    "INSERT INTO eventos (servidor_id, timestamp, tipo_evento, detalhes) VALUES (?, ?, ?, ?)",
-                    (server_id, timestamp, 'SERVIDOR_ONLINE', f"Servidor ficou online com {status.players.online} jogadores.")
-                )
+                escritas.append((SQL_INSERIR_EVENTO, (server_id, timestamp, 'SERVIDOR_ONLINE', f"Servidor ficou online com {status.jogadores_online} jogadores.")))
 
             # --- NOVO: LÓGICA PARA NOVOS EVENTOS ---
             # 1. Evento de Mudança de Versão
-            if versao_anterior and status.version.name != versao_anterior:
-                await self.db_connection.execute(
-                    "INSERT INTO eventos (servidor_id, timestamp, tipo_evento, detalhes) VALUES (?, ?, ?, ?)",
-                    (server_id, timestamp, 'VERSAO_ALTERADA', f"Versão alterada de '{versao_anterior}' para '{status.version.name}'.")
-                )
+            if versao_anterior and status.versao != versao_anterior:
+                escritas.append((SQL_INSERIR_EVENTO, (server_id, timestamp, 'VERSAO_ALTERADA', f"Versão alterada de '{versao_anterior}' para '{status.versao}'.")))
             
             # 2. Evento de Novo Pico de Jogadores
-            stats_cursor = await self.db_connection.execute(
-                "SELECT MAX(jogadores_online) as peak_24h FROM log_status WHERE servidor_id = ? AND timestamp >= datetime('now', '-24 hours')",
-                (server_id,)
+            stats_24h = await self.reads.fetchone(
+                "SELECT MAX(jogadores_online) as peak_24h FROM log_status WHERE servidor_id = ? AND ts >= ?",
+                (server_id, epoch - 24 * 3600)
             )
-            stats_24h = await stats_cursor.fetchone()
             pico_anterior_24h = stats_24h['peak_24h'] if stats_24h and stats_24h['peak_24h'] is not None else 0
 
-            if status.players.online > pico_anterior_24h:
-                await self.db_connection.execute(
-                    "INSERT INTO eventos (servidor_id, timestamp, tipo_evento, detalhes) VALUES (?, ?, ?, ?)",
-                    (server_id, timestamp, 'NOVO_PICO_JOGADORES', f"🏆 Novo recorde de jogadores em 24h: {status.players.online} jogadores.")
-                )
+            if status.jogadores_online > pico_anterior_24h:
+                escritas.append((SQL_INSERIR_EVENTO, (server_id, timestamp, 'NOVO_PICO_JOGADORES', f"🏆 Novo recorde de jogadores em 24h: {status.jogadores_online} jogadores.")))
 
-
-            await self._update_player_history(server_id, status.players.sample)
+            # Com o log acompanhado, a lista completa vem dele; a amostra do status (até ~12 nomes) só
+            # é usada para refazer a lista quando o log não basta (ver _resync_online_players).
+            falhas = self._falhas_heartbeat.pop(server_id, 0)
+            if server_id not in self._log_ativo:
+                escritas.extend(await self._update_player_history(server_id, status.amostra))
+            elif server_id in self._log_resync or falhas >= FALHAS_HEARTBEAT_LOG:
+                escritas.extend(await self._resync_online_players(server_id, ip, status))
             
-            tem_icone = 1 if status.icon else 0
-            ping = round(status.latency)
-            jogadores_online = status.players.online
-            nome_servidor = str(status.description)
+            tem_icone = 1 if status.icone else 0
+            # O arquivo só é gravado quando o conteúdo (hash) do ícone muda.
+            icone_hash = self.icons.store(status.icone, servidor_row['icone_hash']) if status.icone else None
+            ping = round(status.latencia)
+            jogadores_online = status.jogadores_online
+            nome_servidor = status.motd
             localizacao = servidor_row['localizacao']
             if not localizacao or "Inválido" in localizacao or "Falha" in localizacao:
                 localizacao = await get_country_from_ip(ip, self.logger)
-            tipo_servidor = await determinar_tipo_servidor(status, servidor_row['tipo_servidor'], ip, self.logger)
+            tipo_servidor = await determinar_tipo_servidor(status.jogadores_online, status.amostra, servidor_row['tipo_servidor'], ip, self.logger)
             
-            await self.db_connection.execute(
-                """UPDATE servidores SET status=?, nome_servidor=?, versao=?, jogadores_online=?, 
-                jogadores_maximos=?, ping=?, tem_icone_customizado=?, localizacao=?, ultima_verificacao=?, 
-                tipo_servidor=? WHERE id=?""",
-                ('online', nome_servidor, status.version.name, 
-                jogadores_online, status.players.max, ping, tem_icone, localizacao, timestamp, 
-                tipo_servidor, server_id)
-            )
-            await self.db_connection.execute(
-                "INSERT INTO log_status (servidor_id, timestamp, ping, jogadores_online) VALUES (?, ?, ?, ?)",
-                (server_id, timestamp, ping, jogadores_online)
+            escritas.append((SQL_ATUALIZAR_SERVIDOR_ONLINE, (
+                'online', nome_servidor, status.versao,
+                jogadores_online, status.jogadores_maximos, ping, tem_icone, icone_hash, localizacao, timestamp,
+                tipo_servidor, server_id
+            )))
+            escritas.append((SQL_INSERIR_LOG_STATUS, (server_id, epoch, ping, jogadores_online)))
+            escritas.extend(rollup_statements(server_id, epoch, ping, jogadores_online))
+            self.registry.update(
+                server_id, status='online', nome_servidor=nome_servidor, versao=status.versao,
+                jogadores_online=jogadores_online, jogadores_maximos=status.jogadores_maximos, ping=ping,
+                tem_icone_customizado=tem_icone, icone_hash=icone_hash, localizacao=localizacao,
+                ultima_verificacao=timestamp, tipo_servidor=tipo_servidor,
             )
 
         except Exception as e:
+            escritas = []
             if status_anterior == 'online':
-                await self.db_connection.execute(
-                    "INSERT INTO eventos (servidor_id, timestamp, tipo_evento, detalhes) VALUES (?, ?, ?, ?)",
-                    (server_id, timestamp, 'SERVIDOR_OFFLINE', "Servidor ficou offline.")
-                )
-            await self.db_connection.execute(
-                "UPDATE servidores SET status='offline', ultima_verificacao=? WHERE id=?",
-                (timestamp, server_id)
-            )
+                escritas.append((SQL_INSERIR_EVENTO, (server_id, timestamp, 'SERVIDOR_OFFLINE', "Servidor ficou offline.")))
+            if server_id not in self._log_ativo:
+                if status_anterior == 'online':
+                    escritas.extend(self._close_player_sessions(server_id, agora))
+            else:
+                # Com o log acompanhado as sessões terminam no "Stopping server"; só uma sequência
+                # de heartbeats perdidos indica um processo que caiu sem registrar a parada.
+                falhas = self._falhas_heartbeat[server_id] = self._falhas_heartbeat.get(server_id, 0) + 1
+                if falhas == FALHAS_HEARTBEAT_LOG:
+                    escritas.extend(self._close_player_sessions(server_id, agora))
+            escritas.append((SQL_ATUALIZAR_SERVIDOR_OFFLINE, (timestamp, server_id)))
+            escritas.extend(rollup_statements(server_id, epoch, None, None))
+            self.registry.update(server_id, status='offline', ultima_verificacao=timestamp)
             self.logger.error(f"Erro ao monitorar {ip}: {e}")
+            jogadores_online = None
         
-        await self.db_connection.commit()
+        await self.writer.submit(server_id, escritas)
+        return jogadores_online
 
 
     async def get_server_stats(self, ip_servidor: str, hours: int = 24) -> dict:
@@ -424,141 +609,447 @@ class MonitorService:
             "average_players": 0,
         }
 
-        server_cursor = await self.db_connection.execute(
-            "SELECT id FROM servidores WHERE ip_servidor = ?", (ip_servidor,)
+        server_info = await self.reads.fetchone(
+            "SELECT id, intervalo_min, intervalo_max FROM servidores WHERE ip_servidor = ?", (ip_servidor,)
         )
-        server_info = await server_cursor.fetchone()
         if not server_info:
             return stats
         server_id = server_info['id']
+        agora = int(datetime.now(timezone.utc).timestamp())
+        inicio = agora - hours * 3600
 
-        log_cursor = await self.db_connection.execute(
-            "SELECT jogadores_online FROM log_status WHERE servidor_id = ? AND timestamp >= datetime('now', ?)",
-            (server_id, f'-{hours} hours')
+        row = await self.reads.fetchone(
+            """SELECT MAX(jogadores_online) as peak, AVG(jogadores_online) as media
+               FROM log_status WHERE servidor_id = ? AND ts >= ?""",
+            (server_id, inicio)
         )
-        logs = await log_cursor.fetchall()
-
-        if not logs:
-            return stats
 
-        online_players = [row['jogadores_online'] for row in logs if row['jogadores_online'] is not None]
-        if not online_players:
+        if not row or row['peak'] is None:
             return stats
 
-        stats["peak_players"] = max(online_players)
-        stats["average_players"] = round(sum(online_players) / len(online_players))
+        stats["peak_players"] = row['peak']
+        stats["average_players"] = round(row['media'])
 
-        total_possible_checks = (hours * 3600) / INTERVALO_SEGUNDOS_ONLINE
-        online_checks_count = len(logs)
-        stats["uptime_percent"] = round((online_checks_count / total_possible_checks) * 100, 1)
-        if stats["uptime_percent"] > 100:
-            stats["uptime_percent"] = 100.0
+        uptime = await self.reads.fetchone(SQL_UPTIME, (agora, self._uptime_max_gap(server_info), server_id, bucket(inicio, 60)))
+        if uptime and uptime['coberto']:
+            stats["uptime_percent"] = round(uptime['online'] / uptime['coberto'] * 100, 1)
 
         return stats
 
-    async def _update_player_history(self, server_id: int, players_from_status: Optional[list]):
-        if not self.db_connection: return
-        timestamp = datetime.now(timezone.utc).isoformat()
-        current_players_on_server = {p.name for p in players_from_status} if players_from_status else set()
-        
-        async with self.db_connection.execute("SELECT nome_jogador FROM historico_jogadores WHERE servidor_id = ? AND status_online = 1", (server_id,)) as cursor:
-            db_online_players = {row['nome_jogador'] for row in await cursor.fetchall()}
-        
+    def _uptime_max_gap(self, servidor_row) -> float:
+        """Maior distância entre verificações do servidor; um intervalo maior que isso é tempo sem monitoramento."""
+        maior_intervalo = max(
+            servidor_row['intervalo_min'] or 0,
+            servidor_row['intervalo_max'] or INTERVALO_MAXIMO_OFFLINE_PADRAO,
+            # Servidores com o latest.log acompanhado só recebem o heartbeat, mesmo com intervalo_max menor.
+            INTERVALO_HEARTBEAT_LOG if servidor_row['id'] in self._log_ativo else 0,
+        )
+        # Folga para o jitter da agenda e para a largura do bucket de um minuto.
+        return maior_intervalo * (1 + JITTER_AGENDAMENTO) + 60
+
+    def _close_player_sessions(self, server_id: int, agora: datetime) -> list:
+        """Comandos que encerram as sessões abertas do servidor; o conjunto online em memória fica vazio."""
+        self._online_players[server_id] = set()
+        return [
+            (SQL_FECHAR_SESSOES_SERVIDOR, (int(agora.timestamp()), server_id)),
+            (SQL_JOGADORES_OFFLINE_SERVIDOR, (agora.isoformat(), server_id)),
+        ]
+
+    def _icon_shared(self, icone_hash: str) -> bool:
+        """Se mais de um servidor usa o ícone (o que está trocando de ícone ainda conta)."""
+        return sum(1 for server_id in self.registry.ids() if self.registry.get(server_id)['icone_hash'] == icone_hash) > 1
+
+    async def _load_online_players(self, server_id: int) -> Set[str]:
+        # O conjunto online fica em memória; o banco só é lido na primeira verificação
+        # do servidor (ou depois de um resultado dele ser descartado pelo escritor).
+        online = self._online_players.get(server_id)
+        if online is None:
+            rows = await self.reads.fetchall("SELECT nome_jogador FROM historico_jogadores WHERE servidor_id = ? AND status_online = 1", (server_id,))
+            online = self._online_players[server_id] = {row['nome_jogador'] for row in rows}
+        return online
+
+    async def _update_player_history(self, server_id: int, players_from_status: Optional[list]) -> list:
+        """
+        Compara a amostra de jogadores (lista de (nome, uuid)) com quem estava online
+        e devolve as escritas (histórico, sessões e eventos) para o escritor.
+        """
+        if not self.db_connection: return []
+        agora = datetime.now(timezone.utc)
+        timestamp = agora.isoformat()
+        epoch = int(agora.timestamp())
+        uuids = dict(players_from_status) if players_from_status else {}
+        current_players_on_server = set(uuids)
+
+        db_online_players = await self._load_online_players(server_id)
+        self._online_players[server_id] = current_players_on_server
+
         logged_off = db_online_players - current_players_on_server
         logged_on = current_players_on_server - db_online_players
         
-        if not logged_off and not logged_on: return
-        
+        # Comandos repetidos viram um executemany por tabela no escritor, então uma
+        # onda de saídas (ex.: reinício do servidor) é gravada em poucos comandos.
+        escritas = []
+        for player_name in logged_off:
+            escritas.append((SQL_JOGADOR_OFFLINE, (timestamp, server_id, player_name)))
+            escritas.append((SQL_FECHAR_SESSAO, (epoch, server_id, player_name)))
+            # --- LÓGICA DE EVENTO DE JOGADOR ---
+            escritas.append((SQL_INSERIR_EVENTO, (server_id, timestamp, 'JOGADOR_SAIU', f"Jogador '{player_name}' saiu.")))
+
+        for player_name in logged_on:
+            player_uuid = uuids[player_name]
+            escritas.append((SQL_JOGADOR_ONLINE, (server_id, player_name, player_uuid, timestamp)))
+            escritas.append((SQL_ABRIR_SESSAO, (server_id, player_name, player_uuid, epoch)))
+            # --- LÓGICA DE EVENTO DE JOGADOR ---
+            escritas.append((SQL_INSERIR_EVENTO, (server_id, timestamp, 'JOGADOR_ENTROU', f"Jogador '{player_name}' entrou.")))
+
+        return escritas
+
+
+    async def _probe(self, server_id: int, ip: str):
+        """Consulta o status no próprio processo ou no worker dono do shard do servidor."""
+        if self.probe_pool:
+            return await self.probe_pool.probe(server_id, ip)
+        return await probe_server(ip, timeout=TIMEOUT_VERIFICACAO)
+
+    async def _poll_server(self, server_id: int):
+        """Executa uma verificação agendada, sempre com o estado mais recente do servidor."""
+        servidor_row = self.registry.get(server_id)
+        if not servidor_row or servidor_row['pausado']:
+            self.scheduler.remove(server_id)
+            self._intervalos.pop(server_id, None)
+            if servidor_row:
+                await self.writer.submit(server_id, self._close_player_sessions(server_id, datetime.now(timezone.utc)))
+            return None
+        jogadores_online = await self._update_server_data(servidor_row)
+        return self._next_interval(servidor_row, jogadores_online)
+
+    def _next_interval(self, servidor_row, jogadores_online: Optional[int]) -> float:
+        """Intervalo adaptativo até a próxima verificação, respeitando o piso/teto do servidor."""
+        piso = servidor_row['intervalo_min'] or INTERVALO_MINIMO_PADRAO
+        if servidor_row['id'] in self._log_ativo:
+            return max(piso, INTERVALO_HEARTBEAT_LOG)
+        # Sem teto configurado, servidores online nunca são verificados com menos
+        # frequência do que hoje, para não atrasar a detecção de queda.
+        teto_online = servidor_row['intervalo_max'] or INTERVALO_SEGUNDOS_ONLINE
+        teto_offline = servidor_row['intervalo_max'] or INTERVALO_MAXIMO_OFFLINE_PADRAO
+        estado = self._intervalos.setdefault(servidor_row['id'], AdaptiveInterval())
+        return estado.next(jogadores_online is not None, jogadores_online, piso, teto_online, teto_offline)
+
+    async def _sync_schedule(self, imediato: bool = False):
+        """Mantém a agenda alinhada com os servidores ativos no banco."""
+        if {row['id'] for row in await self.reads.fetchall("SELECT id FROM servidores")} != self.registry.ids():
+            # Servidor incluído ou removido por fora (ex.: add_server.py).
+            await self._reload_registry()
+            self.feed.mark_dirty()
+        ativos = self.registry.active_ids()
+        agendados = self.scheduler.keys()
+
+        for server_id in agendados - ativos:
+            self.scheduler.remove(server_id)
+            self._intervalos.pop(server_id, None)
+            if self.registry.get(server_id) is not None:
+                # Pausado: ninguém mais é visto saindo, então as sessões abertas terminam aqui.
+                await self.writer.submit(server_id, self._close_player_sessions(server_id, datetime.now(timezone.utc)))
+        novos = ativos - agendados
+        for server_id in novos:
+            # Espalha os servidores novos pelo intervalo para evitar rajadas na partida.
+            self.scheduler.schedule(server_id, 0 if imediato else random.uniform(0, INTERVALO_SEGUNDOS_ONLINE))
+        if novos:
+            self.logger.info(f"{len(novos)} servidor(es) adicionado(s) à agenda de monitoramento.")
+        self._sync_log_ingestion()
+
+    def _sync_log_ingestion(self):
+        """Acompanha o latest.log dos servidores ativos com caminho configurado."""
+        if not INGESTAO_LOGS:
+            return
+        desejados = {}
+        for server_id in self.registry.active_ids():
+            caminho_servidor = self.registry.get(server_id)['caminho_servidor']
+            if caminho_servidor:
+                desejados[server_id] = os.path.join(caminho_servidor, 'logs', 'latest.log')
+        for server_id, (caminho, tarefa) in list(self._log_ingest.items()):
+            # Caminho alterado, servidor pausado/removido, ou log ainda inexistente: recomeça na próxima sincronização.
+            if desejados.get(server_id) != caminho or tarefa.done():
+                tarefa.cancel()
+                del self._log_ingest[server_id]
+        for server_id, caminho in desejados.items():
+            if server_id not in self._log_ingest:
+                tarefa = asyncio.create_task(self._ingest_server_log(server_id, caminho))
+                self._log_ingest[server_id] = (caminho, tarefa)
+
+    async def _ingest_server_log(self, server_id: int, caminho: str):
+        """Passa as linhas novas do latest.log (o mesmo tailer dos consoles) pelo reconhecimento de eventos."""
         try:
-            await self.db_connection.execute('BEGIN')
-            if logged_off:
-                placeholders = ','.join('?' for _ in logged_off)
-                await self.db_connection.execute(f"UPDATE historico_jogadores SET status_online = 0, ultima_vez_visto = ? WHERE servidor_id = ? AND nome_jogador IN ({placeholders})", (timestamp, server_id, *logged_off))
-                # --- LÓGICA DE EVENTO DE JOGADOR ---
-                for player_name in logged_off:
-                    await self.db_connection.execute(
-                        "INSERT INTO eventos (servidor_id, timestamp, tipo_evento, detalhes) VALUES (?, ?, ?, ?)",
-                        (server_id, timestamp, 'JOGADOR_SAIU', f"Jogador '{player_name}' saiu.")
+            assinante = await self.logs.subscribe(caminho)
+        except OSError:
+            return
+        self._log_ativo.add(server_id)
+        # O arquivo é lido a partir do fim: quem já estava online antes vem da próxima verificação.
+        self._request_resync(server_id)
+        self.logger.info(f"Eventos do servidor {server_id} passam a vir de {caminho}.")
+        uuids: Dict[str, str] = {}
+        try:
+            while True:
+                linhas, descartadas = await assinante.next_batch(intervalo=0)
+                if descartadas:
+                    self.logger.warning(
+                        f"{descartadas} linhas do log de {server_id} não foram processadas a tempo; "
+                        f"a lista de jogadores online será refeita."
                     )
-
-            for player_name in logged_on:
-                player_uuid = next((p.id for p in players_from_status if p.name == player_name), None)
-                await self.db_connection.execute("""
-                    INSERT INTO historico_jogadores (servidor_id, nome_jogador, uuid, status_online, ultima_vez_visto)
-                    VALUES (?, ?, ?, 1, ?)
-                    ON CONFLICT(servidor_id, nome_jogador) DO UPDATE SET
-                    status_online = 1, ultima_vez_visto = excluded.ultima_vez_visto, uuid = excluded.uuid
-                """, (server_id, player_name, player_uuid, timestamp))
-                # --- LÓGICA DE EVENTO DE JOGADOR ---
-                await self.db_connection.execute(
-                    "INSERT INTO eventos (servidor_id, timestamp, tipo_evento, detalhes) VALUES (?, ?, ?, ?)",
-                    (server_id, timestamp, 'JOGADOR_ENTROU', f"Jogador '{player_name}' entrou.")
-                )
-
-            await self.db_connection.commit()
-        except Exception as e:
-            await self.db_connection.execute('ROLLBACK')
-            self.logger.error(f"Erro ao atualizar histórico de jogadores para o servidor {server_id}: {e}")
-
+                    self._request_resync(server_id)
+                eventos = [evento for evento in map(classificar_linha, linhas) if evento]
+                if eventos:
+                    await self._apply_log_events(server_id, eventos, uuids)
+        finally:
+            self._log_ativo.discard(server_id)
+            self._log_resync.discard(server_id)
+            self._falhas_heartbeat.pop(server_id, None)
+            self.logs.unsubscribe(assinante)
+            # Sem o log, ninguém mais é visto saindo de um servidor parado; num servidor online
+            # a amostra das próximas verificações volta a conduzir as sessões.
+            estado = self.registry.get(server_id)
+            if estado and estado['status'] != 'online':
+                await self.writer.submit(server_id, self._close_player_sessions(server_id, datetime.now(timezone.utc)))
+
+    def _request_resync(self, server_id: int):
+        """Marca a lista de online do servidor para ser refeita na próxima verificação, antecipando-a."""
+        self._log_resync.add(server_id)
+        if server_id in self.scheduler:
+            self.scheduler.schedule(server_id, 0)
+
+    async def _resync_online_players(self, server_id: int, ip: str, status) -> list:
+        """
+        Refaz a lista de online de um servidor com log acompanhado: pela amostra do status quando
+        ela está completa, senão pelo "list" via RCON. Sem nenhum dos dois, só quem aparece na
+        amostra entra; ninguém é dado como saído.
+        """
+        self._log_resync.discard(server_id)
+        amostra = list(status.amostra or [])
+        if len(amostra) < status.jogadores_online:
+            nomes = None
+            if await self.rcon.credentials(ip) is not None:
+                try:
+                    nomes = jogadores_do_list(RE_CODIGO_COR.sub('', await self.rcon.execute(ip, 'list')))
+                except (RconConnectionError, RconAuthenticationError, OSError, asyncio.TimeoutError) as e:
+                    self.logger.warning(f"Falha ao consultar os jogadores online de {ip} via RCON: {e}")
+            uuids = dict(amostra)
+            if nomes is not None:
+                amostra = [(nome, uuids.get(nome)) for nome in nomes]
+            else:
+                amostra += [(nome, None) for nome in await self._load_online_players(server_id) if nome not in uuids]
+        return await self._update_player_history(server_id, amostra)
+
+    async def _apply_log_events(self, server_id: int, eventos: list, uuids: Dict[str, str]):
+        """Atualiza o estado em memória e envia ao escritor as gravações de cada evento do log."""
+        agora = datetime.now(timezone.utc)
+        timestamp = agora.isoformat()
+        epoch = int(agora.timestamp())
+        online = await self._load_online_players(server_id)
+        estado = self.registry.get(server_id)
+        escritas, tocados = [], set()
+
+        async def enviar():
+            nonlocal escritas
+            await self.writer.submit(server_id, escritas)
+            escritas = []
+            tocados.clear()
+
+        def sair(nome: str):
+            escritas.append((SQL_JOGADOR_OFFLINE, (timestamp, server_id, nome)))
+            escritas.append((SQL_FECHAR_SESSAO, (epoch, server_id, nome)))
+            escritas.append((SQL_INSERIR_EVENTO, (server_id, timestamp, 'JOGADOR_SAIU', f"Jogador '{nome}' saiu.")))
+
+        async def sair_todos():
+            if tocados & online:
+                await enviar()
+            for nome in online:
+                sair(nome)
+            tocados.update(online)
+            online.clear()
+
+        for evento in eventos:
+            self._eventos_log[evento.tipo] = self._eventos_log.get(evento.tipo, 0) + 1
+            if evento.tipo == EVENTO_UUID:
+                uuids[evento.nome] = evento.uuid
+                continue
+            # O escritor agrupa comandos iguais de um mesmo envio; um jogador que sai e volta
+            # no mesmo lote de linhas vai em envios separados para manter a ordem.
+            if evento.nome in tocados:
+                await enviar()
+            if evento.tipo == EVENTO_ENTROU and evento.nome not in online:
+                online.add(evento.nome)
+                tocados.add(evento.nome)
+                uuid = uuids.pop(evento.nome, None)
+                escritas.append((SQL_JOGADOR_ONLINE, (server_id, evento.nome, uuid, timestamp)))
+                escritas.append((SQL_ABRIR_SESSAO, (server_id, evento.nome, uuid, epoch)))
+                escritas.append((SQL_INSERIR_EVENTO, (server_id, timestamp, 'JOGADOR_ENTROU', f"Jogador '{evento.nome}' entrou.")))
+            elif evento.tipo == EVENTO_SAIU and evento.nome in online:
+                online.discard(evento.nome)
+                tocados.add(evento.nome)
+                sair(evento.nome)
+            elif evento.tipo == EVENTO_PARANDO and estado and estado['status'] == 'online':
+                escritas.append((SQL_INSERIR_EVENTO, (server_id, timestamp, 'SERVIDOR_OFFLINE', "Servidor está sendo desligado.")))
+                escritas.append((SQL_ATUALIZAR_SERVIDOR_OFFLINE, (timestamp, server_id)))
+                self.registry.update(server_id, status='offline', ultima_verificacao=timestamp)
+                # As sessões terminam na parada; os "left the game" que vêm em seguida já não mudam nada.
+                await sair_todos()
+            elif evento.tipo == EVENTO_INICIADO:
+                # Quem ficou online desde antes do desligamento (queda sem "left the game") saiu.
+                await sair_todos()
+                # Servidor pronto: a verificação imediata traz MOTD, versão e o evento SERVIDOR_ONLINE.
+                if server_id in self.scheduler:
+                    self.scheduler.schedule(server_id, 0)
+        if estado and estado['status'] == 'online':
+            self.registry.update(server_id, jogadores_online=len(online))
+        await enviar()
 
     async def _monitor_loop(self):
+        scheduler_task = asyncio.create_task(self.scheduler.run())
         while True:
-            self.logger.info("--- INICIANDO NOVO CICLO DE MONITORAMENTO ---")
             try:
-                cursor = await self.db_connection.execute("SELECT * FROM servidores WHERE pausado = 0")
-                servidores_ativos = await cursor.fetchall()
-                if servidores_ativos:
-                    tasks = [self._update_server_data(s) for s in servidores_ativos]
-                    for i in range(0, len(tasks), BATCH_SIZE):
-                        batch_tasks = tasks[i:i + BATCH_SIZE]
-                        self.logger.info(f"Processando lote {i//BATCH_SIZE + 1}...")
-                        await asyncio.gather(*batch_tasks)
-                        if i + BATCH_SIZE < len(tasks):
-                            await asyncio.sleep(DELAY_BETWEEN_BATCHES)
+                await self._sync_schedule()
+                stats = self.scheduler.stats()
+                if stats['atraso_atual'] > INTERVALO_SEGUNDOS_ONLINE:
+                    self.logger.warning(
+                        f"Monitoramento atrasado em {stats['atraso_atual']}s "
+                        f"({stats['vencidos']} verificações vencidas, {stats['em_execucao']} em execução)."
+                    )
             except Exception as e:
                 self.logger.error(f"Erro grave no loop de monitoramento: {e}", exc_info=True)
-            
-            self.logger.info(f"--- CICLO COMPLETO. Próxima verificação em {INTERVALO_SEGUNDOS_ONLINE} segundos. ---")
-            await asyncio.sleep(INTERVALO_SEGUNDOS_ONLINE)
-            
+            if scheduler_task.done():
+                self.logger.error("Agendador de verificações parou; reiniciando.")
+                scheduler_task = asyncio.create_task(self.scheduler.run())
+            await asyncio.sleep(INTERVALO_SINCRONIZACAO)
+
+    def get_monitor_stats(self) -> dict:
+        """Métricas internas do monitoramento."""
+        return {
+            "agendador": self.scheduler.stats(),
+            "escritor": self.writer.stats() if self.writer else {},
+            "processos_verificacao": self.probe_pool.stats() if self.probe_pool else None,
+            "dns": dns_cache.stats(),
+            "geoip": get_geoip_database().stats(),
+            "retencao": self.retention.stats() if self.retention else None,
+            "cache_leitura": self.read_cache.stats(),
+            "painel_ao_vivo": self.feed.stats(),
+            "estado_servidores": self.registry.stats(),
+            "conexoes_leitura": self.reads.stats(),
+            "rcon": self.rcon.stats(),
+            "logs": self.logs.stats(),
+            "indice_logs": self.log_index.stats(),
+            "ingestao_logs": {"servidores": len(self._log_ativo), "eventos": dict(self._eventos_log)},
+        }
+
+    async def _cached_server_id(self, ip_servidor: str) -> Optional[int]:
+        server_id = self.read_cache.server_id(ip_servidor)
+        if server_id is None:
+            row = await self.reads.fetchone("SELECT id FROM servidores WHERE ip_servidor = ?", (ip_servidor,))
+            if not row:
+                return None
+            server_id = row['id']
+            self.read_cache.remember_server(ip_servidor, server_id)
+        return server_id
+
+    async def get_cached_read(self, ip_servidor: str, consulta: str, **params) -> Tuple[bytes, Optional[str]]:
+        """
+        JSON serializado de uma das leituras da tela de detalhes ('history', 'players',
+        'stats', 'events'), servido do cache enquanto o servidor não tiver dados novos,
+        e a ETag dessa versão (None se o servidor não existe).
+        """
+        leituras = {
+            'history': self.get_server_history,
+            'players': self.get_player_history,
+            'stats': self.get_server_stats,
+            'events': self.get_server_events,
+            'top_players': self.get_top_players,
+            'concurrency': self.get_session_concurrency,
+        }
+        leitura = leituras[consulta]
+
+        async def carregar() -> bytes:
+            return dumps_json(await leitura(ip_servidor, **params))
+
+        server_id = await self._cached_server_id(ip_servidor)
+        if server_id is None:
+            return await carregar(), None
+        chave = (consulta,) + tuple(sorted(params.items()))
+        entrada = await self.read_cache.get_or_load(server_id, chave, carregar)
+        return entrada.dados, entrada.etag
+
+    async def run_retention(self, vacuum: bool = False) -> dict:
+        """
+        Aplica a retenção agora, sem esperar o próximo ciclo. Retorna o relatório da execução.
+        Com `vacuum`, reescreve o banco em seguida (ativa o auto_vacuum incremental em bancos antigos).
+        """
+        relatorio = await self.retention.run_once()
+        if vacuum:
+            relatorio = {**relatorio, "vacuum": await self.retention.vacuum()}
+        return relatorio
+
+    def flush_dns_cache(self, host: Optional[str] = None) -> int:
+        """Limpa o cache de DNS/SRV (de um host ou inteiro), inclusive nos processos de verificação."""
+        if self.probe_pool:
+            self.probe_pool.flush_dns(host)
+        return dns_cache.flush(host)
+
     async def start_monitoring(self):
         self.logger.info("Iniciando loop de monitoramento inteligente...")
+        self._writer_task = asyncio.create_task(self.writer.run())
+        if PROCESSOS_DE_VERIFICACAO > 0:
+            self.probe_pool = ProbeWorkerPool(
+                PROCESSOS_DE_VERIFICACAO,
+                concorrencia=MAX_VERIFICACOES_CONCORRENTES,
+                timeout=TIMEOUT_VERIFICACAO,
+            )
+            self.probe_pool.start()
+        self._retention_task = asyncio.create_task(self.retention.run(INTERVALO_RETENCAO_SEGUNDOS))
+        await self.feed.prime()
+        self._feed_task = asyncio.create_task(self.feed.run())
+        self._rcon_task = asyncio.create_task(self.rcon.run())
+        if INDICE_LOGS:
+            self._log_index_task = asyncio.create_task(self.log_index.run(INTERVALO_INDICE_LOGS_SEGUNDOS))
         asyncio.create_task(self._monitor_loop())
 
     async def add_servidor(self, ip_servidor: str) -> dict:
-        cursor = await self.db_connection.execute("SELECT id FROM servidores WHERE ip_servidor = ?", (ip_servidor,))
-        if await cursor.fetchone():
+        if await self.reads.fetchone("SELECT id FROM servidores WHERE ip_servidor = ?", (ip_servidor,)):
             raise ValueError(f"O servidor '{ip_servidor}' já está na lista.")
         try:
-            await self.db_connection.execute(
+            await self._execute_write(
                 "INSERT INTO servidores (ip_servidor, nome_servidor, pausado, status, caminho_servidor) VALUES (?, ?, ?, ?, ?)",
                 (ip_servidor, ip_servidor, 0, 'pending', None)
             )
-            await self.db_connection.commit()
+            await self._sync_schedule(imediato=True)
             return {"message": f"Servidor '{ip_servidor}' adicionado à fila de monitoramento."}
         except Exception as e:
             raise ValueError(f"Erro de banco de dados ao adicionar '{ip_servidor}'.")
 
     async def get_all_servers_status(self) -> list:
-        cursor = await self.db_connection.execute("SELECT * FROM servidores ORDER BY jogadores_online DESC")
-        rows = await cursor.fetchall()
-        return [dict(row) for row in rows]
+        servidores = self.registry.rows()
+        servidores.sort(key=lambda s: s['jogadores_online'] or 0, reverse=True)
+        return servidores
+
+    def get_all_servers_json(self) -> Tuple[bytes, str]:
+        """Mesma lista de `get_all_servers_status`, já serializada a partir do estado em memória, e sua ETag."""
+        return self.registry.json_bytes(), self.registry.etag
     
     async def delete_server(self, ip_servidor: str) -> bool:
-        cursor = await self.db_connection.execute("DELETE FROM servidores WHERE ip_servidor = ?", (ip_servidor,))
-        await self.db_connection.commit()
+        cursor = await self._execute_write("DELETE FROM servidores WHERE ip_servidor = ?", (ip_servidor,))
+        self.read_cache.forget_server(ip_servidor)
+        self.rcon.forget(ip_servidor)
+        await self._sync_schedule()
         return cursor.rowcount > 0
 
     async def toggle_server_pause(self, ip_servidor: str) -> bool:
-        cursor = await self.db_connection.execute("UPDATE servidores SET pausado = NOT pausado WHERE ip_servidor = ?", (ip_servidor,))
-        await self.db_connection.commit()
+        cursor = await self._execute_write("UPDATE servidores SET pausado = NOT pausado WHERE ip_servidor = ?", (ip_servidor,))
+        await self._sync_schedule(imediato=True)
         return cursor.rowcount > 0
         
     async def update_server_details(self, original_ip: str, request_data) -> dict:
         self.logger.info("--- INICIANDO PROCESSO DE UPDATE (INVESTIGAÇÃO) ---")
         try:
-            cursor = await self.db_connection.execute("SELECT id FROM servidores WHERE ip_servidor = ?", (original_ip,))
-            server_id_row = await cursor.fetchone()
+            server_id_row = await self.reads.fetchone(
+                "SELECT id, intervalo_min, intervalo_max FROM servidores WHERE ip_servidor = ?", (original_ip,)
+            )
             if not server_id_row:
                 raise ValueError(f"Servidor original '{original_ip}' não encontrado.")
             server_id = server_id_row['id']
@@ -581,6 +1072,14 @@ class MonitorService:
 
             # Remove campos com valores vazios para não sujar a db
             db_update_dict_final = {k: v for k, v in db_update_dict.items() if v is not None and v != ''}
+            # Os limites de intervalo enviados explicitamente como null voltam ao padrão.
+            for campo in ('intervalo_min', 'intervalo_max'):
+                if campo in request_data.model_fields_set and update_dict[campo] is None:
+                    db_update_dict_final[campo] = None
+            intervalo_min = db_update_dict_final.get('intervalo_min', server_id_row['intervalo_min'])
+            intervalo_max = db_update_dict_final.get('intervalo_max', server_id_row['intervalo_max'])
+            if intervalo_min and intervalo_max and intervalo_min > intervalo_max:
+                raise ValueError(f"intervalo_min ({intervalo_min}s) não pode ser maior que intervalo_max ({intervalo_max}s).")
             self.logger.info(f"[ETAPA 4] Dicionário final após limpar vazios/nulos: {db_update_dict_final}")
 
             if not db_update_dict_final:
@@ -595,8 +1094,14 @@ class MonitorService:
             self.logger.info(f"[ETAPA 5] Query SQL montada: {query}")
             self.logger.info(f"[ETAPA 6] Parâmetros para a query: {tuple(params)}")
 
-            await self.db_connection.execute(query, tuple(params))
-            await self.db_connection.commit()
+            await self._execute_write(query, tuple(params))
+            self.read_cache.forget_server(original_ip)
+            # Nova porta ou senha RCON: as sessões abertas com as antigas são descartadas.
+            self.rcon.forget(original_ip)
+            # Novos limites de intervalo (ou novo IP) valem já na próxima verificação.
+            self._intervalos.pop(server_id, None)
+            if server_id in self.scheduler:
+                self.scheduler.schedule(server_id, 0)
             
             self.logger.info(f"[ETAPA 7] Servidor ID {server_id} atualizado com sucesso!")
             return {"message": "Servidor atualizado com sucesso."}
@@ -629,132 +1134,215 @@ class MonitorService:
             return f"ERRO RCON: {type(e).__name__} - {e}"
     
     async def stream_log_file(self, ip_servidor: str, websocket: WebSocket, manager):
-        observer = None
+        """Envia as últimas linhas do latest.log e depois as novas, em lotes, até o console desconectar."""
+        assinante = None
         try:
-            cursor = await self.db_connection.execute("SELECT caminho_servidor FROM servidores WHERE ip_servidor = ?", (ip_servidor,))
-            row = await cursor.fetchone()
+            row = await self.reads.fetchone("SELECT caminho_servidor FROM servidores WHERE ip_servidor = ?", (ip_servidor,))
             if not row or not row['caminho_servidor']:
                 await manager.send_personal_message('{"type": "status", "data": "ERRO: Caminho do servidor não configurado."}', websocket)
                 return
             log_path = os.path.join(row['caminho_servidor'], 'logs', 'latest.log')
-            if not os.path.exists(log_path):
+            try:
+                # O mesmo tailer atende todos os consoles abertos para este arquivo.
+                assinante = await self.logs.subscribe(log_path)
+            except OSError:
                 await manager.send_personal_message(f'{{"type": "status", "data": "ERRO: latest.log não encontrado."}}', websocket)
                 return
-            async def send_log_lines(lines: List[str]):
-                for line in lines:
-                    payload = {
-                        "type": "log",
-                        "data": line.strip()
-                    }
-                    log_message = json.dumps(payload)
-                    await manager.send_personal_message(log_message, websocket)
-            try:
-                with open(log_path, 'r', encoding='utf-8', errors='ignore') as f:
-                    last_lines = f.readlines()[-15:]
-                    if last_lines: await send_log_lines(last_lines)
-            except Exception as e:
-                self.logger.warning(f"Não foi possível ler o histórico do log: {e}")
-            event_handler = LogFileHandler(log_path, send_log_lines)
-            observer = Observer()
-            observer.schedule(event_handler, os.path.dirname(log_path), recursive=False)
-            observer.start()
-            self.log_observers[ip_servidor] = observer
-            self.logger.info(f"Iniciado monitoramento de log para: {log_path}")
 
+            recentes = assinante.recent(LINHAS_INICIAIS_CONSOLE)
+            if recentes:
+                await manager.send_personal_message(json.dumps({"type": "log_batch", "data": recentes}), websocket)
             await manager.send_personal_message('{"type": "status", "data": "--- Conectado ao console ao vivo ---"}', websocket)
-            while websocket.client_state.name == 'CONNECTED':
-                await asyncio.sleep(1)
+            while True:
+                linhas, descartadas = await assinante.next_batch()
+                if descartadas:
+                    aviso = f"--- {descartadas} linhas do log omitidas (console atrasado) ---"
+                    await manager.send_personal_message(json.dumps({"type": "status", "data": aviso}), websocket)
+                if linhas:
+                    await manager.send_personal_message(json.dumps({"type": "log_batch", "data": linhas}), websocket)
         except asyncio.CancelledError:
             self.logger.info(f"Streaming de log para {ip_servidor} cancelado.")
+        except Exception as e:
+            # Normalmente o navegador fechou entre dois lotes.
+            self.logger.info(f"Streaming de log para {ip_servidor} interrompido: {e}")
         finally:
-            if observer:
-                observer.stop()
-                observer.join()
-            self.log_observers.pop(ip_servidor, None)
-            self.logger.info(f"Encerrado monitoramento de log para: {ip_servidor}")
-        
-    async def get_server_history(self, ip_servidor: str, hours: int = 24) -> list:
-        server_cursor = await self.db_connection.execute(
+            if assinante:
+                self.logs.unsubscribe(assinante)
+
+    async def get_server_history(self, ip_servidor: str, hours: int = 24, max_pontos: int = PONTOS_HISTORICO_PADRAO,
+                                 points: Optional[int] = None) -> list:
+        """
+        Histórico de jogadores e ping. Janelas curtas vêm do log bruto; janelas longas
+        vêm do rollup mais fino que caiba em `max_pontos`, com média, mínimo e máximo por bucket.
+        Com `points`, o resultado é reduzido por LTTB enquanto o cursor é lido.
+        """
+        server_info = await self.reads.fetchone(
             "SELECT id, jogadores_maximos FROM servidores WHERE ip_servidor = ?", (ip_servidor,)
         )
-        server_info = await server_cursor.fetchone()
         if not server_info: return []
         
         server_id, jogadores_maximos = server_info['id'], server_info['jogadores_maximos']
+        agora = int(datetime.now(timezone.utc).timestamp())
         
-        log_query = "SELECT timestamp, jogadores_online, ping FROM log_status WHERE servidor_id = ? AND timestamp >= datetime('now', ?) ORDER BY timestamp ASC"
-        log_cursor = await self.db_connection.execute(log_query, (server_id, f'-{hours} hours'))
-        logs = await log_cursor.fetchall()
+        resolucao = escolher_resolucao(hours * 3600, max(max_pontos, points or 0))
+        if resolucao is None:
+            query = "SELECT ts, jogadores_online, ping FROM log_status WHERE servidor_id = ? AND ts >= ? ORDER BY ts ASC"
+            params = (server_id, agora - hours * 3600)
+
+            def converter(row):
+                return row['ts'], {
+                    'timestamp': epoch_iso(row['ts']),
+                    'jogadores_online': row['jogadores_online'],
+                    'ping': row['ping'],
+                }
+        else:
+            nome, segundos = resolucao
+            # Buckets só com verificações offline entram com jogadores None, marcando a queda no gráfico.
+            query = f"""
+                SELECT bucket, soma_jogadores * 1.0 / NULLIF(amostras_online, 0) AS media, min_jogadores, max_jogadores,
+                       soma_ping / NULLIF(amostras_online, 0) AS ping
+                FROM log_status_{nome}
+                WHERE servidor_id = ? AND bucket >= ?
+                ORDER BY bucket ASC
+            """
+            params = (server_id, bucket(agora - hours * 3600, segundos))
+
+            def converter(row):
+                online = row['media'] is not None
+                return row['bucket'], {
+                    'timestamp': epoch_iso(row['bucket']),
+                    'jogadores_online': round(row['media'], 1) if online else None,
+                    'jogadores_min': row['min_jogadores'],
+                    'jogadores_max': row['max_jogadores'],
+                    'ping': round(row['ping']) if online else None,
+                }
+
+        logs = []
+        reducao = LttbDownsampler(agora - hours * 3600, agora, points) if points else None
+        async with self.reads.connection() as conn, conn.execute(query, params) as cursor:
+            async for row in cursor:
+                epoch, log_data = converter(row)
+                if reducao:
+                    logs.extend(reducao.push(epoch, log_data['jogadores_online'], log_data))
+                else:
+                    logs.append(log_data)
+        if reducao:
+            logs.extend(reducao.finish())
         if not logs: return []
         
-        processed_history = []
         previous_players = logs[0]['jogadores_online']
         
-        for i, row in enumerate(logs):
-            log_data = dict(row)
-            if jogadores_maximos and jogadores_maximos > 0 and row['jogadores_online'] is not None:
-                log_data['lotacao_percentual'] = round((row['jogadores_online'] / jogadores_maximos) * 100, 2)
+        for log_data in logs:
+            jogadores = log_data['jogadores_online']
+            if jogadores_maximos and jogadores_maximos > 0 and jogadores is not None:
+                log_data['lotacao_percentual'] = round((jogadores / jogadores_maximos) * 100, 2)
             else:
                 log_data['lotacao_percentual'] = 0
             
-            if row['jogadores_online'] is not None and previous_players is not None:
-                log_data['variacao_jogadores'] = row['jogadores_online'] - previous_players
+            if jogadores is not None and previous_players is not None:
+                log_data['variacao_jogadores'] = round(jogadores - previous_players, 1)
             else:
                 log_data['variacao_jogadores'] = 0
             
-            previous_players = row['jogadores_online']
-            processed_history.append(log_data)
+            previous_players = jogadores
         
-        return processed_history
+        return logs
+
+    async def get_player_playtime(self, nome_jogador: str, dias: int = 7) -> dict:
+        """Tempo jogado por um jogador nos últimos `dias`, por servidor, a partir das sessões."""
+        agora = int(datetime.now(timezone.utc).timestamp())
+        inicio = agora - dias * 86400
+        rows = await self.reads.fetchall(SQL_TEMPO_JOGADO_POR_SERVIDOR, parametros_janela(nome_jogador, inicio, agora))
+        servidores = []
+        for row in rows:
+            estado = self.registry.get(row['servidor_id'])
+            servidores.append({
+                "ip_servidor": estado['ip_servidor'] if estado else None,
+                "nome_servidor": (estado['nome_customizado'] or estado['nome_servidor']) if estado else None,
+                "segundos_jogados": row['segundos'],
+                "horas_jogadas": round(row['segundos'] / 3600, 2),
+                "sessoes": row['sessoes'],
+            })
+        total = sum(s['segundos_jogados'] for s in servidores)
+        return {
+            "nome_jogador": nome_jogador,
+            "dias": dias,
+            "segundos_jogados": total,
+            "horas_jogadas": round(total / 3600, 2),
+            "servidores": servidores,
+        }
+
+    async def get_top_players(self, ip_servidor: str, dias: int = 7, limite: int = 10) -> list:
+        """Jogadores com mais tempo jogado no servidor nos últimos `dias`."""
+        server_id = await self._cached_server_id(ip_servidor)
+        if server_id is None:
+            return []
+        agora = int(datetime.now(timezone.utc).timestamp())
+        rows = await self.reads.fetchall(SQL_TOP_JOGADORES, parametros_janela(server_id, agora - dias * 86400, agora) + (limite,))
+        return [
+            {
+                "nome_jogador": row['nome_jogador'],
+                "segundos_jogados": row['segundos'],
+                "horas_jogadas": round(row['segundos'] / 3600, 2),
+                "sessoes": row['sessoes'],
+            }
+            for row in rows
+        ]
+
+    async def get_session_concurrency(self, ip_servidor: str, hours: int = 24, minutos: int = 5) -> list:
+        """Máximo de sessões simultâneas a cada `minutos` nas últimas `hours` horas."""
+        server_id = await self._cached_server_id(ip_servidor)
+        if server_id is None:
+            return []
+        largura = minutos * 60
+        agora = int(datetime.now(timezone.utc).timestamp())
+        inicio = bucket(agora - hours * 3600, largura)
+        rows = await self.reads.fetchall(SQL_SESSOES_DO_SERVIDOR, (server_id, inicio, server_id))
+        return curva_concorrencia(((row['inicio'], row['fim']) for row in rows), inicio, agora, largura)
 
     async def get_player_history(self, ip_servidor: str, limit: int = 50) -> list:
-        cursor = await self.db_connection.execute("SELECT id FROM servidores WHERE ip_servidor = ?", (ip_servidor,))
-        server_row = await cursor.fetchone()
+        server_row = await self.reads.fetchone("SELECT id FROM servidores WHERE ip_servidor = ?", (ip_servidor,))
         if not server_row: return {"online": [], "offline": []}
         
         server_id = server_row['id']
         
-        online_cursor = await self.db_connection.execute("SELECT nome_jogador FROM historico_jogadores WHERE servidor_id = ? AND status_online = 1 ORDER BY nome_jogador ASC", (server_id,))
-        online_players = [row['nome_jogador'] for row in await online_cursor.fetchall()]
+        online_rows = await self.reads.fetchall("SELECT nome_jogador FROM historico_jogadores WHERE servidor_id = ? AND status_online = 1 ORDER BY nome_jogador ASC", (server_id,))
+        online_players = [row['nome_jogador'] for row in online_rows]
         
-        offline_cursor = await self.db_connection.execute("SELECT nome_jogador, ultima_vez_visto FROM historico_jogadores WHERE servidor_id = ? AND status_online = 0 ORDER BY ultima_vez_visto DESC LIMIT ?", (server_id, limit))
-        offline_players = [dict(row) for row in await offline_cursor.fetchall()]
+        offline_rows = await self.reads.fetchall("SELECT nome_jogador, ultima_vez_visto FROM historico_jogadores WHERE servidor_id = ? AND status_online = 0 ORDER BY ultima_vez_visto DESC LIMIT ?", (server_id, limit))
+        offline_players = [dict(row) for row in offline_rows]
         
         return {"online": online_players, "offline": offline_players}
 
-    async def get_activity_heatmap(self, ip_servidor: str) -> list:
+    async def get_activity_heatmap(self, ip_servidor: str, tz: Optional[str] = None, dias: int = 30) -> list:
         """
         Busca e processa dados de log para criar um mapa de calor de atividade.
-        Os dados são agrupados por dia da semana e hora do dia.
+        Os dados são agrupados por dia da semana e hora do dia, no fuso `tz` (padrão UTC),
+        a partir dos buckets de hora dos últimos `dias` dias.
         """
         self.logger.info(f"Gerando dados de mapa de calor para {ip_servidor}")
+        fuso = get_timezone(tz)
 
-        cursor = await self.db_connection.execute(
-            "SELECT id FROM servidores WHERE ip_servidor = ?", (ip_servidor,)
-        )
-        server_info = await cursor.fetchone()
+        server_info = await self.reads.fetchone("SELECT id FROM servidores WHERE ip_servidor = ?", (ip_servidor,))
         if not server_info:
             return []
         server_id = server_info['id']
 
-        query = """
-            SELECT
-                CAST(strftime('%w', timestamp) AS INTEGER) as day_of_week,
-                CAST(strftime('%H', timestamp) AS INTEGER) as hour_of_day,
-                AVG(jogadores_online) as avg_players
-            FROM log_status
-            WHERE servidor_id = ? AND timestamp >= datetime('now', '-30 days')
-            GROUP BY day_of_week, hour_of_day;
-        """
-        cursor = await self.db_connection.execute(query, (server_id,))
-        rows = await cursor.fetchall()
+        inicio = bucket(int(datetime.now(timezone.utc).timestamp()) - dias * 86400, 3600)
+        celulas = {}  # (dia da semana, hora) -> [soma de jogadores, amostras online]
+        for row in await self._hourly_rollups(server_id, inicio):
+            local = datetime.fromtimestamp(row['bucket'], fuso)
+            # Domingo = 0, como o strftime('%w') usado antes.
+            acumulado = celulas.setdefault((local.isoweekday() % 7, local.hour), [0, 0])
+            acumulado[0] += row['soma_jogadores']
+            acumulado[1] += row['amostras_online']
 
         heatmap_data = [
             {
-                "x": row['hour_of_day'],
-                "y": 6 - row['day_of_week'],
-                "v": round(row['avg_players'], 1) if row['avg_players'] is not None else 0
+                "x": hour_of_day,
+                "y": 6 - day_of_week,
+                "v": round(soma / amostras, 1)
             }
-            for row in rows
+            for (day_of_week, hour_of_day), (soma, amostras) in sorted(celulas.items())
         ]
-        return heatmap_data
\ No newline at end of file
+        return heatmap_data
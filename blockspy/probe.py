@@ -0,0 +1,292 @@
+import asyncio
+import json
+import logging
+import multiprocessing
+import struct
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+from mcstatus.responses import JavaStatusResponse
+
+from blockspy.dns_cache import DnsResolutionError, dns_cache
+
+# Versão de protocolo anunciada no handshake; o servidor responde o status com a dele de qualquer forma.
+PROTOCOLO_STATUS = 47
+# Limite da resposta de status (o ícone em base64 vem junto); acima disso o fluxo está corrompido.
+MAX_BYTES_STATUS = 2 * 1024 * 1024
+
+
+class ProbeError(Exception):
+    """Falha ao consultar o status de um servidor."""
+    pass
+
+
+class ProbeResult:
+    """Resultado compacto de uma consulta de status, fácil de enviar entre processos."""
+
+    __slots__ = ("latencia", "jogadores_online", "jogadores_maximos", "versao", "motd", "amostra", "icone")
+
+    def __init__(self, latencia: float, jogadores_online: int, jogadores_maximos: int, versao: str,
+                 motd: str, amostra: List[Tuple[str, str]], icone: Optional[str]):
+        self.latencia = latencia
+        self.jogadores_online = jogadores_online
+        self.jogadores_maximos = jogadores_maximos
+        self.versao = versao
+        self.motd = motd
+        # Lista de (nome, uuid) dos jogadores que o servidor expõe na amostra.
+        self.amostra = amostra
+        self.icone = icone
+
+    def to_tuple(self) -> tuple:
+        return tuple(getattr(self, campo) for campo in self.__slots__)
+
+    @classmethod
+    def from_tuple(cls, dados: tuple) -> "ProbeResult":
+        return cls(*dados)
+
+
+def _varint(valor: int) -> bytes:
+    valor &= 0xFFFFFFFF
+    saida = bytearray()
+    while valor > 0x7F:
+        saida.append(valor & 0x7F | 0x80)
+        valor >>= 7
+    saida.append(valor)
+    return bytes(saida)
+
+
+def _pacote(*partes: bytes) -> bytes:
+    corpo = b"".join(partes)
+    return _varint(len(corpo)) + corpo
+
+
+def _varint_em(dados: bytes, posicao: int) -> Tuple[int, int]:
+    """VarInt que começa em `posicao` e a posição logo após ele."""
+    valor = 0
+    for deslocamento in range(0, 35, 7):
+        if posicao >= len(dados):
+            break
+        byte = dados[posicao]
+        posicao += 1
+        valor |= (byte & 0x7F) << deslocamento
+        if not byte & 0x80:
+            return valor, posicao
+    raise ProbeError("VarInt inválido na resposta de status.")
+
+
+async def _ler_varint(reader: asyncio.StreamReader) -> int:
+    dados = b""
+    while len(dados) < 5:
+        dados += await reader.readexactly(1)
+        if not dados[-1] & 0x80:
+            break
+    return _varint_em(dados, 0)[0]
+
+
+async def _consultar_status(endereco: str, host: str, porta: int) -> JavaStatusResponse:
+    """
+    Server List Ping em `endereco`, anunciando `host:porta` no handshake.
+
+    Proxies (BungeeCord, Velocity, TCPShield) escolhem o servidor pelo nome
+    do handshake, então ele precisa ser o do endereço, não o IP conectado.
+    """
+    reader, writer = await asyncio.open_connection(endereco, porta)
+    try:
+        nome = host.encode("utf-8")
+        writer.write(_pacote(
+            _varint(0), _varint(PROTOCOLO_STATUS), _varint(len(nome)), nome, struct.pack(">H", porta), _varint(1)
+        ))
+        writer.write(_pacote(_varint(0)))
+        inicio = time.perf_counter()
+        await writer.drain()
+        tamanho = await _ler_varint(reader)
+        if not 0 < tamanho <= MAX_BYTES_STATUS:
+            raise ProbeError(f"Resposta de status inválida ({tamanho} bytes).")
+        dados = await reader.readexactly(tamanho)
+        latencia = (time.perf_counter() - inicio) * 1000
+    finally:
+        writer.close()
+
+    pacote_id, posicao = _varint_em(dados, 0)
+    tamanho_texto, posicao = _varint_em(dados, posicao)
+    if pacote_id != 0:
+        raise ProbeError(f"Pacote inesperado na resposta de status (id {pacote_id}).")
+    try:
+        return JavaStatusResponse.build(json.loads(dados[posicao:posicao + tamanho_texto]), latency=latencia)
+    except (ValueError, KeyError, TypeError) as e:
+        raise ProbeError(f"Resposta de status inválida: {e}") from e
+
+
+async def probe_server(ip: str, timeout: float = 10) -> ProbeResult:
+    """Resolve o endereço (via cache de DNS/SRV) e consulta o status do servidor Minecraft (Java)."""
+    host, porta = await dns_cache.resolve_server(ip)
+    try:
+        # O IP do destino também vem do cache, sem consulta ao resolvedor do sistema a cada verificação.
+        endereco = await dns_cache.resolve_ip(host)
+    except DnsResolutionError:
+        # Nomes que só existem no /etc/hosts (ex.: localhost) ou resolvedor indisponível.
+        endereco = host
+    status = await asyncio.wait_for(_consultar_status(endereco, host, porta), timeout)
+    amostra = [(p.name, p.id) for p in status.players.sample] if status.players.sample else []
+    return ProbeResult(
+        latencia=status.latency,
+        jogadores_online=status.players.online,
+        jogadores_maximos=status.players.max,
+        versao=status.version.name,
+        motd=str(status.description),
+        amostra=amostra,
+        icone=status.icon,
+    )
+
+
+def _worker_main(pedidos, respostas, concorrencia: int, timeout: float):
+    """
+    Processo de verificação: consome (id, ip) e devolve (id, ok, dados).
+    Um pedido (None, host) limpa o cache de DNS do processo.
+    """
+
+    async def atender(loop):
+        semaforo = asyncio.Semaphore(concorrencia)
+
+        async def consultar(pedido_id, ip):
+            async with semaforo:
+                try:
+                    resultado = await probe_server(ip, timeout=timeout)
+                    respostas.put((pedido_id, True, resultado.to_tuple()))
+                except Exception as e:
+                    respostas.put((pedido_id, False, f"{type(e).__name__}: {e}"))
+
+        while True:
+            pedido = await loop.run_in_executor(None, pedidos.get)
+            if pedido is None:
+                return
+            if pedido[0] is None:
+                dns_cache.flush(pedido[1])
+                continue
+            asyncio.ensure_future(consultar(*pedido))
+
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    try:
+        loop.run_until_complete(atender(loop))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        loop.close()
+
+
+class ProbeWorkerPool:
+    """
+    Distribui as consultas de status entre N processos.
+
+    Cada processo é dono de um shard fixo de servidores (`server_id % N`), e o
+    processo principal recebe apenas o resultado compacto, continuando como
+    único dono do banco de dados.
+    """
+
+    def __init__(self, workers: int, concorrencia: int = 32, timeout: float = 10):
+        self.workers = workers
+        self.concorrencia = concorrencia
+        self.timeout = timeout
+        self.logger = logging.getLogger(self.__class__.__name__)
+        self._ctx = multiprocessing.get_context("spawn")
+        self._processos: List = [None] * workers
+        self._pedidos: List = [None] * workers
+        self._respostas = None
+        self._futuros: Dict[int, asyncio.Future] = {}
+        self._seq = 0
+        self._leitor: Optional[threading.Thread] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def start(self):
+        self._loop = asyncio.get_running_loop()
+        self._respostas = self._ctx.Queue()
+        for shard in range(self.workers):
+            self._iniciar_worker(shard)
+        self._leitor = threading.Thread(target=self._ler_respostas, name="probe-results", daemon=True)
+        self._leitor.start()
+        self.logger.info(f"{self.workers} processo(s) de verificação iniciado(s).")
+
+    def _iniciar_worker(self, shard: int):
+        pedidos = self._ctx.Queue()
+        processo = self._ctx.Process(
+            target=_worker_main,
+            args=(pedidos, self._respostas, self.concorrencia, self.timeout),
+            name=f"blockspy-probe-{shard}",
+            daemon=True,
+        )
+        processo.start()
+        self._pedidos[shard] = pedidos
+        self._processos[shard] = processo
+
+    def _ler_respostas(self):
+        while True:
+            try:
+                resposta = self._respostas.get()
+            except (EOFError, OSError):
+                return
+            if resposta is None:
+                return
+            try:
+                self._loop.call_soon_threadsafe(self._entregar, resposta)
+            except RuntimeError:
+                # Loop já encerrado.
+                return
+
+    def _entregar(self, resposta):
+        pedido_id, ok, dados = resposta
+        futuro = self._futuros.pop(pedido_id, None)
+        if futuro is None or futuro.done():
+            return
+        if ok:
+            futuro.set_result(ProbeResult.from_tuple(dados))
+        else:
+            futuro.set_exception(ProbeError(dados))
+
+    async def probe(self, server_id: int, ip: str) -> ProbeResult:
+        shard = server_id % self.workers
+        if not self._processos[shard].is_alive():
+            self.logger.warning(f"Processo de verificação {shard} morreu; reiniciando.")
+            self._iniciar_worker(shard)
+
+        self._seq += 1
+        pedido_id = self._seq
+        futuro = self._loop.create_future()
+        self._futuros[pedido_id] = futuro
+        self._pedidos[shard].put((pedido_id, ip))
+        try:
+            # Margem além do timeout do próprio worker, caso o processo morra no meio.
+            return await asyncio.wait_for(futuro, timeout=self.timeout * 2 + 5)
+        finally:
+            self._futuros.pop(pedido_id, None)
+
+    def flush_dns(self, host: Optional[str] = None):
+        """Repassa a limpeza do cache de DNS para todos os processos."""
+        for pedidos in self._pedidos:
+            if pedidos:
+                pedidos.put((None, host))
+
+    def stats(self) -> dict:
+        return {
+            "processos": self.workers,
+            "vivos": sum(1 for p in self._processos if p and p.is_alive()),
+            "pendentes": len(self._futuros),
+        }
+
+    def stop(self):
+        for pedidos in self._pedidos:
+            if pedidos:
+                try:
+                    pedidos.put(None)
+                except (OSError, ValueError):
+                    pass
+        for processo in self._processos:
+            if processo:
+                processo.join(timeout=2)
+                if processo.is_alive():
+                    processo.terminate()
+        if self._respostas:
+            self._respostas.put(None)
+        if self._leitor:
+            self._leitor.join(timeout=2)
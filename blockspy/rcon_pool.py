@@ -0,0 +1,298 @@
+import asyncio
+import logging
+import socket
+import struct
+import time
+from collections import Counter
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+# Tipos de pacote do protocolo RCON (o mesmo do Source, usado pelo Minecraft).
+TIPO_LOGIN = 3
+TIPO_COMANDO = 2
+# O servidor divide respostas longas em pacotes de até 4096 bytes com o mesmo id.
+TAMANHO_FRAGMENTO = 4096
+# Limite de um pacote recebido; acima disso o fluxo está corrompido.
+MAX_BYTES_PACOTE = 1024 * 1024
+
+TIMEOUT_CONEXAO = 5
+TIMEOUT_RESPOSTA = 10
+# Espera pelo próximo fragmento de uma resposta que encheu o anterior.
+TIMEOUT_FRAGMENTO = 0.05
+# Keepalive do TCP: detecta servidores que sumiram enquanto a sessão estava parada.
+KEEPALIVE_OCIOSO = 60
+KEEPALIVE_INTERVALO = 15
+KEEPALIVE_TENTATIVAS = 4
+
+Credenciais = Tuple[str, int, str]
+
+
+class RconAuthenticationError(Exception):
+    """Exceção para falha de autenticação RCON."""
+    pass
+
+class RconConnectionError(Exception):
+    """Exceção para outras falhas de conexão RCON."""
+    pass
+
+class _ConexaoPerdida(RconConnectionError):
+    """Uma sessão já aberta caiu antes de responder; o comando pode ser repetido numa nova."""
+    pass
+
+
+def ativar_keepalive(sock: Optional[socket.socket]):
+    if sock is None:
+        return
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+    # Opções por plataforma (Linux); sem elas vale o padrão do sistema, de horas.
+    for opcao, valor in (("TCP_KEEPIDLE", KEEPALIVE_OCIOSO), ("TCP_KEEPINTVL", KEEPALIVE_INTERVALO),
+                         ("TCP_KEEPCNT", KEEPALIVE_TENTATIVAS)):
+        if hasattr(socket, opcao):
+            sock.setsockopt(socket.IPPROTO_TCP, getattr(socket, opcao), valor)
+
+
+class RconSession:
+    """
+    Uma conexão RCON autenticada, reaproveitada entre comandos.
+
+    Os comandos passam um de cada vez (o lock é a fila da sessão), então a
+    resposta lida é sempre a do comando enviado. Cada pedido leva um id
+    próprio e pacotes com outro id (restos de uma resposta interrompida) são
+    descartados. A conexão é aberta no primeiro comando e reaberta no
+    seguinte se tiver caído.
+    """
+
+    def __init__(self, host: str, porta: int, senha: str, contadores: Optional[Counter] = None):
+        self.host = host
+        self.porta = porta
+        self.senha = senha
+        self.contadores = contadores if contadores is not None else Counter()
+        self.ultimo_uso = time.monotonic()
+        self.na_fila = 0
+        self.aposentada = False
+        self._lock = asyncio.Lock()
+        self._reader: Optional[asyncio.StreamReader] = None
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._ultimo_id = 0
+
+    @property
+    def conectada(self) -> bool:
+        # Um FIN ou RST do servidor chega ao reader mesmo sem leitura pendente.
+        return (
+            self._writer is not None and not self._writer.is_closing()
+            and not self._reader.at_eof() and self._reader.exception() is None
+        )
+
+    @property
+    def ocupada(self) -> bool:
+        return self.na_fila > 0
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+        self._reader = self._writer = None
+
+    async def command(self, comando: str) -> str:
+        self.na_fila += 1
+        try:
+            async with self._lock:
+                return await self._executar(comando)
+        finally:
+            self.na_fila -= 1
+            self.ultimo_uso = time.monotonic()
+            if self.aposentada and not self.na_fila:
+                self.close()
+
+    async def _executar(self, comando: str) -> str:
+        reaproveitada = self.conectada
+        if not reaproveitada:
+            self.close()
+            await self._conectar()
+        pedido_id = self._proximo_id()
+        try:
+            self._enviar(pedido_id, TIPO_COMANDO, comando)
+            partes = [await self._ler_resposta(pedido_id, TIMEOUT_RESPOSTA)]
+            while len(partes[-1]) >= TAMANHO_FRAGMENTO:
+                try:
+                    partes.append(await self._ler_resposta(pedido_id, TIMEOUT_FRAGMENTO))
+                except asyncio.TimeoutError:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError) as e:
+            self.close()
+            self.contadores["falhas"] += 1
+            if reaproveitada:
+                raise _ConexaoPerdida(f"Conexão RCON encerrada pelo servidor: {e}") from e
+            raise RconConnectionError(f"Conexão RCON encerrada pelo servidor: {e}") from e
+        except asyncio.TimeoutError as e:
+            self.close()
+            self.contadores["falhas"] += 1
+            raise RconConnectionError(f"Servidor não respondeu ao comando RCON em {TIMEOUT_RESPOSTA}s.") from e
+        except BaseException:
+            # Cancelado ou fluxo inválido: a próxima resposta no socket seria a deste comando.
+            self.close()
+            raise
+        self.contadores["comandos"] += 1
+        return b"".join(partes).decode("utf-8", errors="ignore")
+
+    async def _conectar(self):
+        try:
+            self._reader, self._writer = await asyncio.wait_for(
+                asyncio.open_connection(self.host, self.porta), timeout=TIMEOUT_CONEXAO
+            )
+            ativar_keepalive(self._writer.get_extra_info("socket"))
+            pedido_id = self._proximo_id()
+            self._enviar(pedido_id, TIPO_LOGIN, self.senha)
+            await self._ler_resposta(pedido_id, TIMEOUT_RESPOSTA)
+        except RconAuthenticationError:
+            self.close()
+            self.contadores["falhas_autenticacao"] += 1
+            raise
+        except (OSError, asyncio.IncompleteReadError, asyncio.TimeoutError) as e:
+            self.close()
+            self.contadores["falhas"] += 1
+            raise RconConnectionError(f"Porta RCON ({self.porta}) inacessível: {type(e).__name__} {e}") from e
+        except BaseException:
+            self.close()
+            raise
+        self.contadores["conexoes"] += 1
+
+    def _proximo_id(self) -> int:
+        # Ids positivos de 32 bits; -1 é reservado para a recusa da senha.
+        self._ultimo_id = self._ultimo_id % 0x7FFFFFFF + 1
+        return self._ultimo_id
+
+    def _enviar(self, pedido_id: int, tipo: int, texto: str):
+        corpo = struct.pack("<ii", pedido_id, tipo) + texto.encode("utf-8") + b"\x00\x00"
+        self._writer.write(struct.pack("<i", len(corpo)) + corpo)
+
+    async def _ler_resposta(self, pedido_id: int, timeout: float) -> bytes:
+        while True:
+            # Só o cabeçalho tem prazo: se expirar, nada foi consumido do fluxo.
+            (tamanho,) = struct.unpack("<i", await asyncio.wait_for(self._reader.readexactly(4), timeout))
+            if not 10 <= tamanho <= MAX_BYTES_PACOTE:
+                raise RconConnectionError(f"Pacote RCON inválido ({tamanho} bytes).")
+            dados = await asyncio.wait_for(self._reader.readexactly(tamanho), TIMEOUT_RESPOSTA)
+            resposta_id, _ = struct.unpack("<ii", dados[:8])
+            if resposta_id == -1:
+                raise RconAuthenticationError("Senha RCON incorreta.")
+            if resposta_id == pedido_id:
+                return dados[8:-2]
+            self.contadores["pacotes_descartados"] += 1
+
+
+class RconPool:
+    """
+    Sessões RCON autenticadas por servidor, reaproveitadas entre comandos.
+
+    Um comando usa uma sessão livre do servidor, abre uma nova enquanto houver
+    menos de `max_sessoes`, ou entra na fila da menos ocupada. As credenciais
+    vêm de `carregar_credenciais` e ficam em memória até `forget()` (edição ou
+    remoção do servidor) ou até o servidor recusar a senha, quando são relidas
+    uma vez. Uma sessão que caiu enquanto estava parada é reaberta sem o
+    comando falhar; sessões paradas há mais de `tempo_ocioso` são fechadas por
+    `run()`.
+    """
+
+    def __init__(self, carregar_credenciais: Callable[[str], Awaitable[Optional[Credenciais]]],
+                 max_sessoes: int = 2, tempo_ocioso: float = 300):
+        if max_sessoes < 1:
+            raise ValueError("o pool RCON precisa de pelo menos uma sessão por servidor")
+        self.carregar_credenciais = carregar_credenciais
+        self.max_sessoes = max_sessoes
+        self.tempo_ocioso = tempo_ocioso
+        self.logger = logging.getLogger(self.__class__.__name__)
+        self._credenciais: Dict[str, Credenciais] = {}
+        self._sessoes: Dict[str, List[RconSession]] = {}
+        self._contadores = Counter()
+        self._latencia_media = 0.0
+
+    async def credentials(self, chave: str) -> Optional[Credenciais]:
+        credenciais = self._credenciais.get(chave)
+        if credenciais is None:
+            credenciais = await self.carregar_credenciais(chave)
+            if credenciais is not None:
+                self._credenciais[chave] = credenciais
+        return credenciais
+
+    def forget(self, chave: str):
+        """Descarta as credenciais e as sessões do servidor (as ocupadas fecham ao terminar)."""
+        self._credenciais.pop(chave, None)
+        for sessao in self._sessoes.pop(chave, []):
+            sessao.aposentada = True
+            if not sessao.ocupada:
+                sessao.close()
+
+    def _escolher(self, chave: str, credenciais: Credenciais) -> RconSession:
+        sessoes = self._sessoes.setdefault(chave, [])
+        for sessao in sessoes:
+            if not sessao.ocupada:
+                return sessao
+        if len(sessoes) < self.max_sessoes:
+            sessao = RconSession(*credenciais, contadores=self._contadores)
+            sessoes.append(sessao)
+            return sessao
+        return min(sessoes, key=lambda s: s.na_fila)
+
+    async def execute(self, chave: str, comando: str) -> str:
+        inicio = time.monotonic()
+        for tentativa in (1, 2):
+            credenciais = await self.credentials(chave)
+            if credenciais is None:
+                raise RconConnectionError("Dados de conexão RCON não configurados.")
+            sessao = self._escolher(chave, credenciais)
+            try:
+                resposta = await sessao.command(comando)
+                break
+            except RconAuthenticationError:
+                # A senha pode ter mudado no banco por fora da API (add_server.py).
+                self.forget(chave)
+                if tentativa == 2:
+                    raise
+            except _ConexaoPerdida as e:
+                self.logger.info(f"Sessão RCON com {chave} caiu ({e}); reconectando.")
+                self._contadores["reconexoes"] += 1
+                if tentativa == 2:
+                    raise
+        latencia = time.monotonic() - inicio
+        self._latencia_media = latencia if not self._latencia_media else self._latencia_media * 0.9 + latencia * 0.1
+        return resposta
+
+    def reap(self) -> int:
+        """Fecha as sessões paradas há mais de `tempo_ocioso`; retorna quantas."""
+        limite = time.monotonic() - self.tempo_ocioso
+        fechadas = 0
+        for chave, sessoes in list(self._sessoes.items()):
+            for sessao in [s for s in sessoes if not s.ocupada and s.ultimo_uso < limite]:
+                sessao.close()
+                sessoes.remove(sessao)
+                fechadas += 1
+            if not sessoes:
+                del self._sessoes[chave]
+        return fechadas
+
+    async def run(self, intervalo: float = 30):
+        while True:
+            await asyncio.sleep(intervalo)
+            fechadas = self.reap()
+            if fechadas:
+                self.logger.info(f"{fechadas} sessões RCON ociosas fechadas.")
+
+    def close(self):
+        for chave in list(self._sessoes):
+            self.forget(chave)
+        self._credenciais.clear()
+
+    def stats(self) -> dict:
+        sessoes = [s for lista in self._sessoes.values() for s in lista]
+        return {
+            "servidores": len(self._sessoes),
+            "sessoes": len(sessoes),
+            "sessoes_conectadas": sum(s.conectada for s in sessoes),
+            "comandos_na_fila": sum(s.na_fila for s in sessoes),
+            "comandos": self._contadores["comandos"],
+            "conexoes": self._contadores["conexoes"],
+            "reconexoes": self._contadores["reconexoes"],
+            "falhas": self._contadores["falhas"],
+            "falhas_autenticacao": self._contadores["falhas_autenticacao"],
+            "pacotes_descartados": self._contadores["pacotes_descartados"],
+            "latencia_media_ms": round(self._latencia_media * 1000, 2),
+        }
@@ -0,0 +1,139 @@
+import asyncio
+import os
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, Hashable, Iterable, Optional, Tuple
+
+
+class CachedRead:
+    """Resposta serializada e sua ETag (única por geração, então serve para GET condicional)."""
+
+    __slots__ = ("versao", "expira", "dados", "etag")
+
+    def __init__(self, versao: int, expira: float, dados: bytes, etag: str):
+        self.versao = versao
+        self.expira = expira
+        self.dados = dados
+        self.etag = etag
+
+
+class ReadModelCache:
+    """
+    Cache das respostas de leitura por servidor (histórico, jogadores, estatísticas, eventos).
+
+    Cada entrada guarda o JSON já serializado e a versão dos dados do servidor
+    quando foi gerada. O escritor avança essa versão a cada commit com um
+    resultado do servidor, e a entrada antiga deixa de valer sem varredura
+    nenhuma. O TTL cobre o que muda só com o tempo (janelas "últimas 24h") em
+    servidores pausados. A memória é limitada por `max_bytes`, com descarte LRU.
+    """
+
+    def __init__(self, max_bytes: int = 32 * 1024 * 1024, ttl: float = 60):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._entradas: "OrderedDict[Tuple, CachedRead]" = OrderedDict()
+        self._bytes = 0
+        self._versoes: Dict[int, int] = {}
+        self._ids: Dict[str, int] = {}
+        self._em_andamento: Dict[Tuple, asyncio.Future] = {}
+        self._acertos = 0
+        self._falhas = 0
+        self._descartes = 0
+        # Prefixo das ETags: muda a cada execução, para uma ETag antiga nunca coincidir após reiniciar.
+        self._instancia = os.urandom(4).hex()
+        self._geracao = 0
+
+    def version(self, server_id: int) -> int:
+        return self._versoes.get(server_id, 0)
+
+    def bump(self, server_ids: Iterable[Hashable]):
+        """Marca os dados destes servidores como alterados (chamado após cada commit do escritor)."""
+        for server_id in server_ids:
+            self._versoes[server_id] = self._versoes.get(server_id, 0) + 1
+
+    def server_id(self, ip_servidor: str) -> Optional[int]:
+        return self._ids.get(ip_servidor)
+
+    def remember_server(self, ip_servidor: str, server_id: int):
+        self._ids[ip_servidor] = server_id
+
+    def forget_server(self, ip_servidor: str):
+        server_id = self._ids.pop(ip_servidor, None)
+        if server_id is not None:
+            self.bump([server_id])
+
+    def _remover(self, chave: Tuple):
+        entrada = self._entradas.pop(chave, None)
+        if entrada:
+            self._bytes -= len(entrada.dados)
+
+    def get(self, server_id: int, chave: Tuple) -> Optional[CachedRead]:
+        chave = (server_id,) + chave
+        entrada = self._entradas.get(chave)
+        if entrada is None:
+            return None
+        if entrada.versao != self.version(server_id) or entrada.expira <= time.monotonic():
+            self._remover(chave)
+            return None
+        self._entradas.move_to_end(chave)
+        return entrada
+
+    def put(self, server_id: int, chave: Tuple, dados: bytes, versao: Optional[int] = None) -> CachedRead:
+        self._geracao += 1
+        entrada = CachedRead(
+            self.version(server_id) if versao is None else versao, time.monotonic() + self.ttl, dados,
+            f'W/"{self._instancia}-{self._geracao}"',
+        )
+        if len(dados) > self.max_bytes:
+            return entrada
+        chave = (server_id,) + chave
+        self._remover(chave)
+        self._entradas[chave] = entrada
+        self._bytes += len(dados)
+        while self._bytes > self.max_bytes:
+            _, antiga = self._entradas.popitem(last=False)
+            self._bytes -= len(antiga.dados)
+            self._descartes += 1
+        return entrada
+
+    async def get_or_load(self, server_id: int, chave: Tuple, carregar: Callable[[], Awaitable[bytes]]) -> CachedRead:
+        """Devolve a resposta em cache ou gera uma nova; pedidos iguais simultâneos geram uma só."""
+        entrada = self.get(server_id, chave)
+        if entrada is not None:
+            self._acertos += 1
+            return entrada
+
+        chave_completa = (server_id, self.version(server_id)) + chave
+        pendente = self._em_andamento.get(chave_completa)
+        if pendente:
+            self._acertos += 1
+            return await asyncio.shield(pendente)
+
+        self._falhas += 1
+        versao = self.version(server_id)
+        futuro = asyncio.get_running_loop().create_future()
+        self._em_andamento[chave_completa] = futuro
+        try:
+            dados = await carregar()
+            # Grava com a versão do início da leitura: se houve commit no meio, a entrada já nasce vencida.
+            entrada = self.put(server_id, chave, dados, versao)
+            futuro.set_result(entrada)
+            return entrada
+        except Exception as e:
+            futuro.set_exception(e)
+            futuro.exception()
+            raise
+        finally:
+            self._em_andamento.pop(chave_completa, None)
+
+    def stats(self) -> dict:
+        total = self._acertos + self._falhas
+        return {
+            "entradas": len(self._entradas),
+            "bytes": self._bytes,
+            "max_bytes": self.max_bytes,
+            "acertos": self._acertos,
+            "falhas": self._falhas,
+            "taxa_acerto": round(self._acertos / total, 3) if total else None,
+            "descartes_lru": self._descartes,
+        }
@@ -0,0 +1,95 @@
+import asyncio
+import logging
+import time
+from contextlib import asynccontextmanager
+from pathlib import Path
+from typing import AsyncIterator, List, Optional, Sequence
+
+import aiosqlite
+
+from blockspy.migrations import apply_pragmas
+
+
+class ReadPool:
+    """
+    Conexões só de leitura para as consultas da API e do monitoramento.
+
+    Cada conexão do aiosqlite tem sua própria thread, então leituras em
+    conexões diferentes rodam em paralelo (o SQLite em WAL permite vários
+    leitores junto com o escritor) e uma consulta longa não atrasa as
+    escritas, que ficam sozinhas na conexão principal. Quem pede uma conexão
+    com todas ocupadas espera na fila; esse tempo aparece em `stats()`.
+    """
+
+    def __init__(self, db_path: str, tamanho: int = 4):
+        if tamanho < 1:
+            raise ValueError("o pool de leitura precisa de pelo menos uma conexão")
+        self.db_path = db_path
+        self.tamanho = tamanho
+        self.logger = logging.getLogger(self.__class__.__name__)
+        self._conexoes: List[aiosqlite.Connection] = []
+        self._livres: Optional[asyncio.Queue] = None
+        self._pedidos = 0
+        self._pedidos_com_espera = 0
+        self._esperando = 0
+        self._espera_media = 0.0
+        self._espera_max = 0.0
+
+    async def open(self):
+        # mode=ro: uma escrita por engano nestas conexões falha em vez de disputar o lock do escritor.
+        uri = f"{Path(self.db_path).absolute().as_uri()}?mode=ro"
+        self._livres = asyncio.Queue()
+        for _ in range(self.tamanho):
+            conn = await aiosqlite.connect(uri, uri=True)
+            conn.row_factory = aiosqlite.Row
+            await apply_pragmas(conn, wal=False)
+            await conn.execute("PRAGMA query_only = ON")
+            self._conexoes.append(conn)
+            self._livres.put_nowait(conn)
+        self.logger.info(f"{self.tamanho} conexões de leitura abertas.")
+
+    async def close(self):
+        for conn in self._conexoes:
+            await conn.close()
+        self._conexoes.clear()
+
+    @asynccontextmanager
+    async def connection(self) -> AsyncIterator[aiosqlite.Connection]:
+        """Empresta uma conexão (para ler um cursor em fluxo); devolve ao sair do bloco."""
+        inicio = time.monotonic()
+        self._esperando += 1
+        try:
+            conn = await self._livres.get()
+        finally:
+            self._esperando -= 1
+        espera = time.monotonic() - inicio
+        self._pedidos += 1
+        if espera > 0.001:
+            self._pedidos_com_espera += 1
+        self._espera_max = max(self._espera_max, espera)
+        self._espera_media = espera if self._pedidos == 1 else self._espera_media * 0.95 + espera * 0.05
+        try:
+            yield conn
+        finally:
+            self._livres.put_nowait(conn)
+
+    async def fetchall(self, sql: str, params: Sequence = ()) -> list:
+        async with self.connection() as conn:
+            cursor = await conn.execute(sql, params)
+            return await cursor.fetchall()
+
+    async def fetchone(self, sql: str, params: Sequence = ()):
+        async with self.connection() as conn:
+            cursor = await conn.execute(sql, params)
+            return await cursor.fetchone()
+
+    def stats(self) -> dict:
+        return {
+            "conexoes": self.tamanho,
+            "livres": self._livres.qsize() if self._livres else 0,
+            "esperando": self._esperando,
+            "pedidos": self._pedidos,
+            "pedidos_com_espera": self._pedidos_com_espera,
+            "espera_media_ms": round(self._espera_media * 1000, 2),
+            "espera_max_ms": round(self._espera_max * 1000, 2),
+        }
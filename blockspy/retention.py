@@ -0,0 +1,225 @@
+import asyncio
+import logging
+import os
+import time
+from datetime import datetime, timezone
+from typing import Dict, Optional
+
+import aiosqlite
+
+DIA = 86400
+
+# Dias de retenção por tabela; None guarda para sempre. Nada é apagado por padrão, como antes
+# da retenção existir: a limpeza vale só para as tabelas configuradas com
+# BLOCKSPY_RETENCAO_<TABELA> (em dias, 0 = para sempre).
+RETENCAO_PADRAO: Dict[str, Optional[int]] = {
+    'log_status': None,
+    'log_status_minuto': None,
+    'log_status_hora': None,
+    'log_status_dia': None,
+    'eventos': None,
+    'historico_jogadores': None,
+    'sessoes_jogadores': None,
+}
+
+
+class _Tabela:
+    """Como apagar linhas antigas de uma tabela, sempre por servidor para usar o índice."""
+
+    __slots__ = ("chave", "coluna", "epoch", "filtro")
+
+    def __init__(self, chave: str, coluna: str, epoch: bool, filtro: str = ""):
+        self.chave = chave      # Coluna que identifica a linha dentro do servidor.
+        self.coluna = coluna    # Coluna de tempo comparada com o limite.
+        self.epoch = epoch      # Tempo em segundos Unix (senão, texto ISO-8601).
+        self.filtro = filtro    # Condição extra, ex.: não apagar jogadores online.
+
+
+TABELAS: Dict[str, _Tabela] = {
+    'log_status': _Tabela('ts', 'ts', True),
+    'log_status_minuto': _Tabela('bucket', 'bucket', True),
+    'log_status_hora': _Tabela('bucket', 'bucket', True),
+    'log_status_dia': _Tabela('bucket', 'bucket', True),
+    'eventos': _Tabela('id', 'timestamp', False),
+    'historico_jogadores': _Tabela('id', 'ultima_vez_visto', False, "status_online = 0 AND "),
+    # Sessões abertas (fim NULL) nunca entram em `fim < ?`.
+    'sessoes_jogadores': _Tabela('id', 'fim', True),
+}
+
+
+def retencao_configurada() -> Dict[str, Optional[int]]:
+    politicas = dict(RETENCAO_PADRAO)
+    for tabela in politicas:
+        variavel = f"BLOCKSPY_RETENCAO_{tabela.upper()}"
+        valor = os.environ.get(variavel)
+        if valor is not None:
+            try:
+                dias = int(valor)
+            except ValueError:
+                logging.getLogger("RetentionJob").warning(
+                    f"{variavel}={valor!r} não é um número de dias; '{tabela}' segue guardando tudo."
+                )
+                continue
+            politicas[tabela] = dias if dias > 0 else None
+    return politicas
+
+
+class RetentionJob:
+    """
+    Remove dados mais antigos que a retenção de cada tabela.
+
+    Apaga em blocos pequenos, cada um em sua própria transação sob o lock do
+    banco, e solta o lock entre os blocos para o escritor das verificações não
+    ficar parado. No fim devolve as páginas livres ao disco com
+    `incremental_vacuum` (o banco usa auto_vacuum=INCREMENTAL).
+    """
+
+    def __init__(self, connection: aiosqlite.Connection, lock: asyncio.Lock,
+                 politicas: Optional[Dict[str, Optional[int]]] = None,
+                 tamanho_bloco: int = 2000, pausa: float = 0.05, paginas_por_vacuum: int = 2000):
+        self.connection = connection
+        self.lock = lock
+        self.politicas = politicas if politicas is not None else retencao_configurada()
+        self.tamanho_bloco = tamanho_bloco
+        self.pausa = pausa
+        self.paginas_por_vacuum = paginas_por_vacuum
+        self.logger = logging.getLogger(self.__class__.__name__)
+        self.ultimo_relatorio: Optional[dict] = None
+        self.auto_vacuum_incremental: Optional[bool] = None
+        self._execucao = None  # Evita duas limpezas ao mesmo tempo.
+
+    async def _pragma(self, nome: str) -> int:
+        cursor = await self.connection.execute(f"PRAGMA {nome}")
+        return (await cursor.fetchone())[0]
+
+    async def _tamanho_em_disco(self) -> int:
+        return (await self._pragma("page_count") - await self._pragma("freelist_count")) * await self._pragma("page_size")
+
+    async def _purgar_tabela(self, nome: str, dias: int, servidores: list) -> int:
+        tabela = TABELAS[nome]
+        limite_epoch = int(time.time()) - dias * DIA
+        limite = limite_epoch if tabela.epoch else datetime.fromtimestamp(limite_epoch, timezone.utc).isoformat()
+        sql = f"""
+            DELETE FROM {nome} WHERE servidor_id = ? AND {tabela.chave} IN (
+                SELECT {tabela.chave} FROM {nome}
+                WHERE servidor_id = ? AND {tabela.filtro}{tabela.coluna} < ?
+                ORDER BY {tabela.coluna} LIMIT ?
+            )
+        """
+        removidas = 0
+        for servidor_id in servidores:
+            while True:
+                async with self.lock:
+                    cursor = await self.connection.execute(sql, (servidor_id, servidor_id, limite, self.tamanho_bloco))
+                    await self.connection.commit()
+                apagadas = max(cursor.rowcount, 0)
+                removidas += apagadas
+                if apagadas < self.tamanho_bloco:
+                    break
+                await asyncio.sleep(self.pausa)
+        return removidas
+
+    async def _devolver_espaco(self) -> int:
+        liberadas = 0
+        while True:
+            async with self.lock:
+                livres = await self._pragma("freelist_count")
+                if not livres:
+                    break
+                # O pragma libera uma página por passo, e execute() só dá o primeiro passo
+                # em comandos sem colunas de resultado; executescript() roda até o fim.
+                await self.connection.executescript(f"PRAGMA incremental_vacuum({self.paginas_por_vacuum});")
+                restantes = await self._pragma("freelist_count")
+            liberadas += livres - restantes
+            if restantes == 0 or restantes >= livres:
+                break
+            await asyncio.sleep(self.pausa)
+        if liberadas:
+            async with self.lock:
+                # Só o checkpoint encolhe o arquivo principal quando o banco está em WAL.
+                await self.connection.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        return liberadas * await self._pragma("page_size")
+
+    async def vacuum(self) -> dict:
+        """
+        Reescreve o banco inteiro com VACUUM, ativando o auto_vacuum incremental se ainda não estiver.
+
+        Bloqueia o escritor durante toda a operação e precisa de espaço livre do
+        tamanho do banco; por isso só roda sob pedido (manutenção manual).
+        """
+        inicio = time.monotonic()
+        async with self.lock:
+            tamanho_antes = await self._pragma("page_count") * await self._pragma("page_size")
+            await self.connection.execute("PRAGMA auto_vacuum = INCREMENTAL")
+            await self.connection.execute("VACUUM")
+            await self.connection.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+            tamanho_depois = await self._pragma("page_count") * await self._pragma("page_size")
+            self.auto_vacuum_incremental = await self._pragma("auto_vacuum") == 2
+        relatorio = {
+            "bytes_antes": tamanho_antes,
+            "bytes_depois": tamanho_depois,
+            "duracao_s": round(time.monotonic() - inicio, 2),
+        }
+        self.logger.info(
+            f"VACUUM: {tamanho_antes / 1024 / 1024:.1f} MB -> {tamanho_depois / 1024 / 1024:.1f} MB em {relatorio['duracao_s']}s."
+        )
+        return relatorio
+
+    async def run_once(self) -> dict:
+        if self._execucao is not None:
+            return await asyncio.shield(self._execucao)
+        self._execucao = asyncio.ensure_future(self._run_once())
+        try:
+            return await asyncio.shield(self._execucao)
+        finally:
+            self._execucao = None
+
+    async def _run_once(self) -> dict:
+        inicio = time.monotonic()
+        cursor = await self.connection.execute("SELECT id FROM servidores")
+        servidores = [row[0] for row in await cursor.fetchall()]
+        tamanho_antes = await self._tamanho_em_disco()
+        self.auto_vacuum_incremental = await self._pragma("auto_vacuum") == 2
+
+        linhas = {}
+        for nome, dias in self.politicas.items():
+            if dias is None or nome not in TABELAS:
+                continue
+            try:
+                linhas[nome] = await self._purgar_tabela(nome, dias, servidores)
+            except Exception as e:
+                self.logger.error(f"Erro ao aplicar a retenção em '{nome}': {e}")
+
+        bytes_devolvidos = await self._devolver_espaco()
+        relatorio = {
+            "executado_em": datetime.now(timezone.utc).isoformat(),
+            "linhas_removidas": linhas,
+            "total_linhas_removidas": sum(linhas.values()),
+            "bytes_liberados": max(tamanho_antes - await self._tamanho_em_disco(), 0),
+            "bytes_devolvidos_ao_disco": bytes_devolvidos,
+            "duracao_s": round(time.monotonic() - inicio, 2),
+        }
+        self.ultimo_relatorio = relatorio
+        if relatorio["total_linhas_removidas"]:
+            self.logger.info(
+                f"Retenção: {relatorio['total_linhas_removidas']} linhas removidas, "
+                f"{bytes_devolvidos / 1024 / 1024:.1f} MB devolvidos ao disco em {relatorio['duracao_s']}s."
+            )
+        return relatorio
+
+    async def run(self, intervalo: float, atraso_inicial: float = 60):
+        await asyncio.sleep(atraso_inicial)
+        while True:
+            try:
+                await self.run_once()
+            except Exception as e:
+                self.logger.error(f"Erro na limpeza de dados antigos: {e}")
+            await asyncio.sleep(intervalo)
+
+    def stats(self) -> dict:
+        return {
+            "politicas_dias": self.politicas,
+            # Sem o modo incremental (banco antigo ainda sem VACUUM), o arquivo não encolhe.
+            "auto_vacuum_incremental": self.auto_vacuum_incremental,
+            "ultima_execucao": self.ultimo_relatorio,
+        }
@@ -0,0 +1,71 @@
+from datetime import datetime, timezone
+from typing import List, Optional, Tuple
+
+# (nome, segundos por bucket), da mais fina para a mais grossa.
+RESOLUCOES: Tuple[Tuple[str, int], ...] = (
+    ("minuto", 60),
+    ("hora", 3600),
+    ("dia", 86400),
+)
+
+# Resolução "bruta" do log_status, usada para estimar quantos pontos uma janela terá.
+SEGUNDOS_AMOSTRA_BRUTA = 20
+
+SQL_CRIAR_TABELA_ROLLUP = """
+    CREATE TABLE IF NOT EXISTS log_status_{nome} (
+        servidor_id INTEGER NOT NULL,
+        bucket INTEGER NOT NULL,
+        amostras INTEGER NOT NULL DEFAULT 0,
+        amostras_online INTEGER NOT NULL DEFAULT 0,
+        soma_jogadores INTEGER NOT NULL DEFAULT 0,
+        min_jogadores INTEGER,
+        max_jogadores INTEGER,
+        soma_ping REAL NOT NULL DEFAULT 0,
+        PRIMARY KEY (servidor_id, bucket),
+        FOREIGN KEY(servidor_id) REFERENCES servidores(id) ON DELETE CASCADE
+    ) WITHOUT ROWID;
+"""
+
+# `bucket` é o início do intervalo em segundos Unix (UTC). Verificações offline contam
+# em `amostras` mas não em `amostras_online`, e não entram nas somas/mínimo/máximo.
+SQL_UPSERT_ROLLUP = """
+    INSERT INTO log_status_{nome} (servidor_id, bucket, amostras, amostras_online, soma_jogadores, min_jogadores, max_jogadores, soma_ping)
+    VALUES (?, ?, 1, ?, ?, ?, ?, ?)
+    ON CONFLICT(servidor_id, bucket) DO UPDATE SET
+        amostras = amostras + 1,
+        amostras_online = amostras_online + excluded.amostras_online,
+        soma_jogadores = soma_jogadores + excluded.soma_jogadores,
+        min_jogadores = COALESCE(MIN(min_jogadores, excluded.min_jogadores), min_jogadores, excluded.min_jogadores),
+        max_jogadores = COALESCE(MAX(max_jogadores, excluded.max_jogadores), max_jogadores, excluded.max_jogadores),
+        soma_ping = soma_ping + excluded.soma_ping
+"""
+
+SQLS_UPSERT = {nome: SQL_UPSERT_ROLLUP.format(nome=nome) for nome, _ in RESOLUCOES}
+
+
+def bucket(epoch: int, segundos: int) -> int:
+    return epoch - epoch % segundos
+
+
+def rollup_statements(server_id: int, epoch: int, ping: Optional[float], jogadores: Optional[int]) -> List[tuple]:
+    """Escritas (sql, params) que somam uma verificação aos rollups de todas as resoluções."""
+    online = jogadores is not None
+    valores = (1 if online else 0, jogadores or 0, jogadores, jogadores, ping or 0)
+    return [(SQLS_UPSERT[nome], (server_id, bucket(epoch, segundos)) + valores) for nome, segundos in RESOLUCOES]
+
+
+def escolher_resolucao(segundos_janela: int, max_pontos: int) -> Optional[Tuple[str, int]]:
+    """
+    Retorna a resolução mais fina cuja quantidade de pontos cabe em `max_pontos`,
+    ou None se as amostras brutas já couberem. Se nada couber, fica com a mais grossa.
+    """
+    if segundos_janela / SEGUNDOS_AMOSTRA_BRUTA <= max_pontos:
+        return None
+    for nome, segundos in RESOLUCOES:
+        if segundos_janela / segundos <= max_pontos:
+            return nome, segundos
+    return RESOLUCOES[-1]
+
+
+def epoch_iso(epoch: int) -> str:
+    return datetime.fromtimestamp(epoch, timezone.utc).isoformat()
@@ -0,0 +1,196 @@
+import asyncio
+import heapq
+import logging
+import random
+import time
+from typing import Awaitable, Callable, Dict, Hashable, Optional
+
+
+class PollScheduler:
+    """
+    Agenda verificações por prazo (deadline) individual de cada servidor.
+
+    Cada chave tem o seu próximo horário de execução guardado em um heap. As
+    verificações vencidas rodam em paralelo, limitadas por um semáforo, e cada
+    uma é reagendada sozinha ao terminar, então um servidor lento nunca atrasa
+    os outros.
+    """
+
+    def __init__(self, poll: Callable[[Hashable], Awaitable[Optional[float]]],
+                 intervalo: float, concorrencia: int = 32, jitter: float = 0.1):
+        # `poll` recebe a chave e pode devolver o intervalo até a próxima
+        # execução; se devolver None, vale o intervalo padrão.
+        self.poll = poll
+        self.intervalo = intervalo
+        self.jitter = jitter
+        self.logger = logging.getLogger(self.__class__.__name__)
+        self._concorrencia = concorrencia
+        # Criados em run() para ficarem presos ao loop que executa o agendador.
+        self._semaforo: Optional[asyncio.Semaphore] = None
+        self._acordar: Optional[asyncio.Event] = None
+        self._heap = []
+        self._prazos: Dict[Hashable, float] = {}
+        self._em_execucao = set()
+        self._seq = 0
+        self._execucoes = 0
+        self._atraso_max = 0.0
+        self._atraso_medio = 0.0
+        self._atraso_ultimo = 0.0
+
+    def _com_jitter(self, segundos: float) -> float:
+        if self.jitter <= 0:
+            return segundos
+        return segundos * (1 + random.uniform(-self.jitter, self.jitter))
+
+    def schedule(self, chave: Hashable, atraso: float = 0.0):
+        """Agenda (ou reagenda) uma chave para daqui a `atraso` segundos."""
+        prazo = time.monotonic() + max(atraso, 0.0)
+        self._prazos[chave] = prazo
+        if chave in self._em_execucao:
+            # Será recolocada no heap quando a execução atual terminar.
+            return
+        self._seq += 1
+        heapq.heappush(self._heap, (prazo, self._seq, chave))
+        if self._acordar:
+            self._acordar.set()
+
+    def remove(self, chave: Hashable):
+        """Remove a chave da agenda. Entradas antigas no heap são descartadas ao sair."""
+        self._prazos.pop(chave, None)
+
+    def __contains__(self, chave: Hashable) -> bool:
+        return chave in self._prazos
+
+    def keys(self):
+        return set(self._prazos)
+
+    def stats(self) -> dict:
+        """Métricas de atraso em relação à agenda, em segundos."""
+        agora = time.monotonic()
+        vencidos = [p for c, p in self._prazos.items() if p <= agora and c not in self._em_execucao]
+        return {
+            "servidores_agendados": len(self._prazos),
+            "em_execucao": len(self._em_execucao),
+            "concorrencia": self._concorrencia,
+            "vencidos": len(vencidos),
+            "atraso_atual": round(agora - min(vencidos), 3) if vencidos else 0.0,
+            "atraso_ultimo": round(self._atraso_ultimo, 3),
+            "atraso_medio": round(self._atraso_medio, 3),
+            "atraso_max": round(self._atraso_max, 3),
+            "execucoes": self._execucoes,
+        }
+
+    async def run(self):
+        if self._semaforo is None:
+            self._semaforo = asyncio.Semaphore(self._concorrencia)
+            self._acordar = asyncio.Event()
+        while True:
+            if not self._heap:
+                self._acordar.clear()
+                await self._acordar.wait()
+                continue
+
+            prazo, _, chave = self._heap[0]
+            if self._prazos.get(chave) != prazo or chave in self._em_execucao:
+                # Entrada obsoleta (removida ou reagendada).
+                heapq.heappop(self._heap)
+                continue
+
+            espera = prazo - time.monotonic()
+            if espera > 0:
+                self._acordar.clear()
+                try:
+                    await asyncio.wait_for(self._acordar.wait(), timeout=espera)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            await self._semaforo.acquire()
+            # O heap pode ter mudado enquanto esperávamos uma vaga.
+            if not self._heap or self._heap[0][2] != chave or self._prazos.get(chave) != prazo:
+                self._semaforo.release()
+                continue
+            heapq.heappop(self._heap)
+            self._em_execucao.add(chave)
+            asyncio.create_task(self._executar(chave, prazo))
+
+    async def _executar(self, chave: Hashable, prazo: float):
+        inicio = time.monotonic()
+        atraso = inicio - prazo
+        self._atraso_ultimo = atraso
+        self._atraso_max = max(self._atraso_max, atraso)
+        self._atraso_medio = atraso if not self._execucoes else self._atraso_medio * 0.95 + atraso * 0.05
+        self._execucoes += 1
+
+        proximo = None
+        try:
+            proximo = await self.poll(chave)
+        except Exception as e:
+            self.logger.error(f"Erro ao executar verificação agendada de {chave}: {e}", exc_info=True)
+        finally:
+            self._semaforo.release()
+            self._em_execucao.discard(chave)
+
+        if chave not in self._prazos:
+            return
+        if self._prazos[chave] != prazo:
+            # Foi reagendada manualmente durante a execução; respeita o novo prazo.
+            novo_prazo = self._prazos[chave]
+        else:
+            intervalo = self._com_jitter(proximo if proximo is not None else self.intervalo)
+            # Mantém a frequência ancorada no prazo anterior; se estivermos
+            # atrasados, não tenta "compensar" disparando em rajada.
+            novo_prazo = max(prazo + intervalo, time.monotonic() + min(intervalo, 1.0))
+        self._prazos[chave] = novo_prazo
+        self._seq += 1
+        heapq.heappush(self._heap, (novo_prazo, self._seq, chave))
+        self._acordar.set()
+
+
+class AdaptiveInterval:
+    """
+    Calcula o intervalo até a próxima verificação de um servidor.
+
+    Servidores offline entram em backoff exponencial; servidores online ficam
+    entre o piso (contagem de jogadores mudando rápido) e o teto (contagem
+    estável). Qualquer mudança de estado volta o intervalo para o piso, para
+    confirmar a transição logo.
+    """
+
+    __slots__ = ("online", "falhas", "volatilidade", "ultimo_jogadores")
+
+    ALFA_VOLATILIDADE = 0.3
+    # Variação média (jogadores por verificação) a partir da qual usamos o piso.
+    LIMIAR_VOLATILIDADE = 2.0
+
+    def __init__(self):
+        self.online: Optional[bool] = None
+        self.falhas = 0
+        self.volatilidade = 0.0
+        self.ultimo_jogadores: Optional[int] = None
+
+    def next(self, online: bool, jogadores: Optional[int], piso: float,
+             teto_online: float, teto_offline: float) -> float:
+        teto_online = max(teto_online, piso)
+        teto_offline = max(teto_offline, piso)
+        mudou = self.online is not None and online != self.online
+        self.online = online
+
+        if not online:
+            self.falhas += 1
+            self.ultimo_jogadores = None
+            self.volatilidade = 0.0
+            if mudou:
+                return piso
+            return min(piso * 2 ** (self.falhas - 1), teto_offline)
+
+        self.falhas = 0
+        if self.ultimo_jogadores is not None and jogadores is not None:
+            delta = abs(jogadores - self.ultimo_jogadores)
+            self.volatilidade += self.ALFA_VOLATILIDADE * (delta - self.volatilidade)
+        self.ultimo_jogadores = jogadores
+        if mudou:
+            return piso
+
+        fator = min(self.volatilidade / self.LIMIAR_VOLATILIDADE, 1.0)
+        return teto_online - (teto_online - piso) * fator
@@ -0,0 +1,86 @@
+from typing import Iterable, List, Optional, Tuple
+
+from blockspy.rollups import epoch_iso
+
+# Cada sessão vai da entrada (`inicio`) à saída (`fim`) de um jogador, em segundos
+# Unix; `fim` NULL é uma sessão ainda aberta. Há no máximo uma aberta por
+# (servidor, jogador), a mesma que aparece com status_online = 1 no historico_jogadores.
+SQL_CRIAR_TABELA_SESSOES = """
+    CREATE TABLE IF NOT EXISTS sessoes_jogadores (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        servidor_id INTEGER NOT NULL,
+        nome_jogador TEXT NOT NULL,
+        uuid TEXT,
+        inicio INTEGER NOT NULL,
+        fim INTEGER,
+        FOREIGN KEY(servidor_id) REFERENCES servidores(id) ON DELETE CASCADE
+    );
+"""
+# Uma sessão cruza a janela [J, agora] se e só se terminou depois de J ou ainda está
+# aberta; com `fim` no índice, as duas condições são faixas (fim > J, fim IS NULL).
+SQLS_INDICES_SESSOES = (
+    "CREATE INDEX IF NOT EXISTS idx_sessoes_servidor_fim ON sessoes_jogadores(servidor_id, fim)",
+    "CREATE INDEX IF NOT EXISTS idx_sessoes_jogador_fim ON sessoes_jogadores(nome_jogador, fim)",
+)
+
+SQL_ABRIR_SESSAO = "INSERT INTO sessoes_jogadores (servidor_id, nome_jogador, uuid, inicio) VALUES (?, ?, ?, ?)"
+SQL_FECHAR_SESSAO = "UPDATE sessoes_jogadores SET fim = ? WHERE servidor_id = ? AND nome_jogador = ? AND fim IS NULL"
+# Servidor offline, pausado ou monitoramento encerrado: nenhuma sessão dele continua contando.
+SQL_FECHAR_SESSOES_SERVIDOR = "UPDATE sessoes_jogadores SET fim = ? WHERE servidor_id = ? AND fim IS NULL"
+
+# Sessões que cruzam a janela, filtradas por `servidor_id` ou `nome_jogador`.
+# Parâmetros: (valor, J, valor).
+SQL_SESSOES_NA_JANELA = """
+    SELECT servidor_id, nome_jogador, inicio, fim FROM sessoes_jogadores WHERE {coluna} = ? AND fim > ?
+    UNION ALL
+    SELECT servidor_id, nome_jogador, inicio, fim FROM sessoes_jogadores WHERE {coluna} = ? AND fim IS NULL
+"""
+# Segundos dentro da janela; parâmetros: (agora, agora, J) antes dos da subconsulta.
+SQL_SEGUNDOS_NA_JANELA = "SUM(MIN(COALESCE(fim, ?), ?) - MAX(inicio, ?))"
+
+SQL_TEMPO_JOGADO_POR_SERVIDOR = f"""
+    SELECT servidor_id, {SQL_SEGUNDOS_NA_JANELA} AS segundos, COUNT(*) AS sessoes
+    FROM ({SQL_SESSOES_NA_JANELA.format(coluna='nome_jogador')})
+    GROUP BY servidor_id ORDER BY segundos DESC
+"""
+SQL_TOP_JOGADORES = f"""
+    SELECT nome_jogador, {SQL_SEGUNDOS_NA_JANELA} AS segundos, COUNT(*) AS sessoes
+    FROM ({SQL_SESSOES_NA_JANELA.format(coluna='servidor_id')})
+    GROUP BY nome_jogador ORDER BY segundos DESC LIMIT ?
+"""
+SQL_SESSOES_DO_SERVIDOR = f"SELECT inicio, fim FROM ({SQL_SESSOES_NA_JANELA.format(coluna='servidor_id')})"
+
+
+def parametros_janela(valor, inicio_janela: int, agora: int) -> Tuple:
+    """Parâmetros de SQL_TEMPO_JOGADO_POR_SERVIDOR / SQL_TOP_JOGADORES (sem o LIMIT)."""
+    return (agora, agora, inicio_janela, valor, inicio_janela, valor)
+
+
+def curva_concorrencia(sessoes: Iterable[Tuple[int, Optional[int]]], inicio: int, fim: int, largura: int) -> List[dict]:
+    """
+    Máximo de sessões simultâneas em cada intervalo de `largura` segundos de [inicio, fim).
+
+    Varre as entradas (+1) e saídas (-1) em ordem; sessões abertas contam até `fim`.
+    Saídas vêm antes de entradas no mesmo segundo, para uma reconexão não contar em dobro.
+    """
+    variacoes = []
+    for entrada, saida in sessoes:
+        entrada = max(entrada, inicio)
+        saida = fim if saida is None else min(saida, fim)
+        if saida > entrada:
+            variacoes.append((entrada, 1))
+            variacoes.append((saida, -1))
+    variacoes.sort()
+
+    quantidade = max((fim - inicio + largura - 1) // largura, 1)
+    maximos = [0] * quantidade
+    atual = 0
+    anterior = inicio
+    for instante, delta in variacoes:
+        # O valor `atual` vale de `anterior` até `instante`: marca todos os intervalos cobertos.
+        if instante > anterior and atual:
+            for i in range((anterior - inicio) // largura, min((instante - 1 - inicio) // largura + 1, quantidade)):
+                maximos[i] = max(maximos[i], atual)
+        anterior = max(anterior, instante)
+        atual += delta
+    return [{"timestamp": epoch_iso(inicio + i * largura), "simultaneos": maximo} for i, maximo in enumerate(maximos)]
@@ -1,11 +1,28 @@
 import re
-import socket
+import json
 import aiohttp
 import logging
 import uuid
 import hashlib
-import asyncio
+import ipaddress
 import os
+import time
+from datetime import timezone, tzinfo
+from typing import Optional
+try:
+    from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+except ImportError:  # Python 3.8: só UTC.
+    ZoneInfo = None
+try:
+    import orjson
+except ImportError:  # Sem orjson: json da biblioteca padrão, umas 3-5x mais lento.
+    orjson = None
+from blockspy.dns_cache import dns_cache, DnsNotFoundError, DnsResolutionError
+
+# Sem base local de geolocalização, falhas da API online ficam em cache por este tempo
+# (em segundos), para não repetir a consulta a cada verificação do servidor.
+TEMPO_CACHE_FALHA_GEOIP = 600
+_falhas_geoip_online = {}
 
 # Regex do commands.py
 IP_DOMAIN_REGEX = re.compile(r"^(?:[a-zA-Z0-9](?:[a-zA-Z0-9-]{0,61}[a-zA-Z0-9])?\.)+[a-zA-Z]{2,6}(?::\d+)?$|^(?:[0-9]{1,3}\.){3}[0-9]{1,3}(?::\d+)?$")
@@ -14,6 +31,23 @@ def limpar_formatacao_minecraft(texto: str) -> str:
     """Remove os códigos de formatação de cor do Minecraft do texto."""
     return re.sub(r'§[0-9a-fk-orA-FK-OR]', '', texto)
 
+def dumps_json(dados) -> bytes:
+    """JSON compacto em UTF-8, usando orjson quando estiver instalado."""
+    if orjson is not None:
+        return orjson.dumps(dados, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(dados, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+def get_timezone(nome: Optional[str]) -> tzinfo:
+    """Fuso horário IANA (ex.: 'America/Sao_Paulo'); vazio ou 'UTC' retorna UTC."""
+    if not nome or nome.upper() == 'UTC':
+        return timezone.utc
+    if ZoneInfo is None:
+        raise ValueError("Fusos horários diferentes de UTC exigem Python 3.9 ou superior.")
+    try:
+        return ZoneInfo(nome)
+    except (ZoneInfoNotFoundError, ValueError):
+        raise ValueError(f"Fuso horário desconhecido: '{nome}'.")
+
 def is_valid_minecraft_nick(nick: str) -> bool:
     """Verifica se um nick de jogador é válido."""
     if not (3 <= len(nick) <= 16): return False
@@ -23,14 +57,44 @@ def is_valid_minecraft_nick(nick: str) -> bool:
 async def get_country_from_ip(ip_address: str, logger: logging.Logger) -> str:
     """
     Obtém o país e a bandeira a partir de um endereço IP/domínio.
+    A resolução segue o SRV do servidor e usa o cache de DNS compartilhado.
     """
-    ip_only = ip_address.split(':')[0]
     try:
-        if not re.match(r"^\d{1,3}\.\d{1,3}\.\d{1,3}\.\d{1,3}$", ip_only):
-            loop = asyncio.get_running_loop()
-            ip_only = await loop.run_in_executor(None, socket.gethostbyname, ip_only)
-    except socket.gaierror:
+        host, _ = await dns_cache.resolve_server(ip_address)
+        ip_only = await dns_cache.resolve_ip(host)
+    except DnsNotFoundError:
         return "Domínio Inválido"
+    except DnsResolutionError as e:
+        logger.warning(f"Erro ao resolver {ip_address} para geolocalização: {e}")
+        return "Falha na Consulta"
+
+    try:
+        endereco = ipaddress.ip_address(ip_only)
+    except ValueError:
+        return "IP Privado/Inválido"
+    if not endereco.is_global:
+        return "IP Privado/Inválido"
+
+    from blockspy.geoip import get_geoip_database
+    base = get_geoip_database()
+    if base.disponivel:
+        pais = base.lookup(ip_only)
+        return formatar_pais(*pais) if pais else "Não foi possível determinar"
+
+    return await _consultar_ip_api(ip_only, logger)
+
+def formatar_pais(codigo: str, nome: str) -> str:
+    """Monta o texto exibido no dashboard: bandeira + nome do país."""
+    if codigo and len(codigo) == 2:
+        flag_emoji = "".join(chr(ord(c) + 127397) for c in codigo.upper())
+        return f"{flag_emoji} {nome}"
+    return nome
+
+async def _consultar_ip_api(ip_only: str, logger: logging.Logger) -> str:
+    """Consulta o ip-api.com; usado apenas quando não há base local de geolocalização."""
+    ultima_falha = _falhas_geoip_online.get(ip_only)
+    if ultima_falha and time.monotonic() - ultima_falha < TEMPO_CACHE_FALHA_GEOIP:
+        return "Falha na Consulta"
 
     url = f"http://ip-api.com/json/{ip_only}"
     try:
@@ -39,23 +103,20 @@ async def get_country_from_ip(ip_address: str, logger: logging.Logger) -> str:
                 if response.status == 200:
                     data = await response.json()
                     if data.get('status') == 'success':
-                        country = data.get('country', 'Desconhecido')
-                        country_code = data.get('countryCode', '')
-                        if country_code:
-                            flag_emoji = "".join(chr(ord(c) + 127397) for c in country_code.upper())
-                            return f"{flag_emoji} {country}"
-                        return country
+                        return formatar_pais(data.get('countryCode', ''), data.get('country', 'Desconhecido'))
                     else:
                         return "IP Privado/Inválido"
                 else:
                     return "Não foi possível determinar"
     except Exception as e:
         logger.warning(f"Erro ao consultar API de geolocalização para {ip_only}: {e}")
+        _falhas_geoip_online[ip_only] = time.monotonic()
         return "Falha na Consulta"
 
-async def determinar_tipo_servidor(status, tipo_atual_db: str, ip: str, logger: logging.Logger) -> str:
+async def determinar_tipo_servidor(jogadores_online: int, amostra: list, tipo_atual_db: str, ip: str, logger: logging.Logger) -> str:
     """
     Determina se o servidor é Original ou Pirata, retornando o tipo para o DB.
+    `amostra` é a lista de (nome, uuid) exposta pelo status do servidor.
     """
 
     if tipo_atual_db in ("Original", "Pirata"):
@@ -63,18 +124,18 @@ async def determinar_tipo_servidor(status, tipo_atual_db: str, ip: str, logger:
 
     try:
 
-        if status.players.online == 0:
+        if jogadores_online == 0:
             return "Indeterminado"
         
 
-        if not status.players.sample:
+        if not amostra:
             return "Lista Oculta"
 
-        player_sample = status.players.sample[0]
+        nome_jogador, uuid_jogador = amostra[0]
         
-        uuid_offline = uuid.UUID(bytes=hashlib.md5(f"OfflinePlayer:{player_sample.name}".encode('utf-8')).digest(), version=3)
+        uuid_offline = uuid.UUID(bytes=hashlib.md5(f"OfflinePlayer:{nome_jogador}".encode('utf-8')).digest(), version=3)
 
-        if player_sample.id == str(uuid_offline):
+        if uuid_jogador == str(uuid_offline):
             return "Pirata"
         else:
             return "Original"
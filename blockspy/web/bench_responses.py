@@ -0,0 +1,184 @@
+"""
+Compara a camada de respostas (orjson + ETag/304 + br/gzip) com o JSONResponse padrão.
+
+Simula navegadores atualizando a lista de servidores e o histórico de um
+servidor: cada cliente guarda a ETag recebida e a reenvia, e os dados mudam a
+cada `--mudancas` pedidos (como uma nova verificação). As chamadas vão direto
+ao app ASGI, sem rede, então a latência medida é a do servidor; o custo de
+transferência aparece na coluna de bytes.
+
+Uso: python -m blockspy.web.bench_responses [--pedidos 2000] [--servidores 300] [--pontos 2000]
+"""
+import argparse
+import asyncio
+import random
+import statistics
+import time
+from datetime import datetime, timedelta, timezone
+
+from fastapi import FastAPI
+from fastapi.responses import JSONResponse
+
+from blockspy.fleet_state import COLUNAS_PUBLICAS_SERVIDOR, FleetRegistry
+from blockspy.utils import dumps_json
+from blockspy.web.responses import ResponseLayer, ResponseLayerMiddleware, json_bytes_response
+
+
+def gerar_servidores(quantidade: int) -> list:
+    linhas = []
+    for i in range(1, quantidade + 1):
+        linha = {coluna: None for coluna in COLUNAS_PUBLICAS_SERVIDOR}
+        linha.update(
+            id=i, ip_servidor=f"mc{i}.exemplo.com", nome_servidor=f"§aServidor {i} §7| Minigames 1.8-1.21",
+            versao="Paper 1.21.1", jogadores_online=random.randint(0, 500), jogadores_maximos=1000,
+            ping=random.randint(5, 200), status="online", pausado=0, tem_icone_customizado=1,
+            icone_hash="%032x" % random.getrandbits(128), localizacao="BR", tipo_servidor="Rede",
+            ultima_verificacao=datetime.now(timezone.utc).isoformat(), notificar_online_offline=1,
+            rcon_configurado=0,
+        )
+        linhas.append(linha)
+    return linhas
+
+
+def gerar_historico(pontos: int) -> list:
+    inicio = datetime.now(timezone.utc) - timedelta(days=7)
+    passo = timedelta(days=7) / pontos
+    historico = []
+    for i in range(pontos):
+        jogadores = random.randint(50, 400)
+        historico.append({
+            "timestamp": (inicio + passo * i).isoformat(), "jogadores_online": jogadores,
+            "ping": round(random.uniform(10, 80), 1), "jogadores_min": jogadores - 20, "jogadores_max": jogadores + 20,
+        })
+    return historico
+
+
+class Dados:
+    """Mesmos dados para os dois apps; `mudar()` faz o papel de uma verificação nova."""
+
+    def __init__(self, servidores: int, pontos: int):
+        self.registry = FleetRegistry()
+        self.registry.load(gerar_servidores(servidores))
+        self.pontos = pontos
+        self.historico = gerar_historico(pontos)
+        self.versao_historico = 0
+        self._historico_json = None
+
+    def mudar(self):
+        server_id = random.randint(1, len(self.registry))
+        self.registry.update(server_id, jogadores_online=random.randint(0, 500),
+                             ultima_verificacao=datetime.now(timezone.utc).isoformat())
+        self.historico = self.historico[1:] + [dict(self.historico[-1], jogadores_online=random.randint(50, 400))]
+        self.versao_historico += 1
+        self._historico_json = None
+
+    def historico_json(self) -> bytes:
+        # Equivale ao ReadModelCache: serializa uma vez por versão.
+        if self._historico_json is None:
+            self._historico_json = dumps_json(self.historico)
+        return self._historico_json
+
+
+def app_antes(dados: Dados) -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/api/servers")
+    async def servidores():
+        linhas = dados.registry.rows()
+        linhas.sort(key=lambda s: s['jogadores_online'] or 0, reverse=True)
+        return JSONResponse(content=linhas)
+
+    @app.get("/api/servers/x/history")
+    async def historico():
+        return JSONResponse(content=dados.historico)
+
+    return app
+
+
+def app_depois(dados: Dados, camada: ResponseLayer) -> FastAPI:
+    app = FastAPI()
+    app.add_middleware(ResponseLayerMiddleware, camada=camada)
+
+    @app.get("/api/servers")
+    async def servidores():
+        return json_bytes_response(dados.registry.json_bytes(), dados.registry.etag)
+
+    @app.get("/api/servers/x/history")
+    async def historico():
+        return json_bytes_response(dados.historico_json(), f'W/"h-{dados.versao_historico}"')
+
+    return app
+
+
+async def chamar(app, caminho: str, cabecalhos: dict):
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET",
+        "scheme": "http", "path": caminho, "raw_path": caminho.encode(), "query_string": b"", "root_path": "",
+        "headers": [(k.encode(), v.encode()) for k, v in cabecalhos.items()],
+        "client": ("127.0.0.1", 50000), "server": ("127.0.0.1", 8000),
+    }
+    resposta = {"bytes": 0}
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(mensagem):
+        if mensagem["type"] == "http.response.start":
+            resposta["status"] = mensagem["status"]
+            resposta["headers"] = {k.decode().lower(): v.decode() for k, v in mensagem["headers"]}
+        elif mensagem["type"] == "http.response.body":
+            resposta["bytes"] += len(mensagem.get("body", b""))
+
+    await app(scope, receive, send)
+    return resposta
+
+
+async def medir(app, caminho: str, dados: Dados, pedidos: int, mudancas: int, clientes: int, navegador: bool) -> dict:
+    random.seed(42)
+    etags = [None] * clientes
+    tempos, total_bytes, nao_modificadas = [], 0, 0
+    for i in range(pedidos):
+        if i and i % mudancas == 0:
+            dados.mudar()
+        cliente = i % clientes
+        cabecalhos = {}
+        if navegador:
+            cabecalhos["accept-encoding"] = "gzip, deflate, br"
+            if etags[cliente]:
+                cabecalhos["if-none-match"] = etags[cliente]
+        inicio = time.perf_counter()
+        resposta = await chamar(app, caminho, cabecalhos)
+        tempos.append((time.perf_counter() - inicio) * 1000)
+        total_bytes += resposta["bytes"]
+        nao_modificadas += resposta["status"] == 304
+        etags[cliente] = resposta["headers"].get("etag")
+    tempos.sort()
+    return {
+        "bytes": total_bytes,
+        "p50_ms": statistics.median(tempos),
+        "p99_ms": tempos[min(len(tempos) - 1, int(len(tempos) * 0.99))],
+        "304": nao_modificadas,
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--pedidos", type=int, default=2000)
+    parser.add_argument("--servidores", type=int, default=300)
+    parser.add_argument("--pontos", type=int, default=2000)
+    parser.add_argument("--mudancas", type=int, default=10, help="pedidos entre duas mudanças dos dados")
+    parser.add_argument("--clientes", type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'endpoint':<10} {'versão':<7} {'bytes':>12} {'p50 ms':>8} {'p99 ms':>8} {'304':>6}")
+    for nome, caminho in (("servers", "/api/servers"), ("history", "/api/servers/x/history")):
+        for versao in ("antes", "depois"):
+            random.seed(1)
+            dados = Dados(args.servidores, args.pontos)
+            app = app_antes(dados) if versao == "antes" else app_depois(dados, ResponseLayer())
+            r = await medir(app, caminho, dados, args.pedidos, args.mudancas, args.clientes, versao == "depois")
+            print(f"{nome:<10} {versao:<7} {r['bytes']:>12,} {r['p50_ms']:>8.3f} {r['p99_ms']:>8.3f} {r['304']:>6}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
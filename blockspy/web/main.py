@@ -1,12 +1,11 @@
 import asyncio
-import httpx
-from fastapi import FastAPI, Request, status, HTTPException
-from fastapi.responses import HTMLResponse, JSONResponse, Response
+from fastapi import FastAPI, Request, status, HTTPException, Query
+from fastapi.responses import HTMLResponse, Response, StreamingResponse
 from fastapi.templating import Jinja2Templates
 from fastapi.staticfiles import StaticFiles
 from contextlib import asynccontextmanager
 import logging
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi import WebSocket, WebSocketDisconnect
 from typing import List, Optional
@@ -14,7 +13,10 @@ import os
 import sys
 import json
 from blockspy.monitor_service import MonitorService, RconAuthenticationError, RconConnectionError
-from blockspy.utils import get_persistent_data_path
+from blockspy.utils import get_persistent_data_path, dumps_json
+from blockspy.web.responses import (
+    FastJSONResponse, ResponseLayer, ResponseLayerMiddleware, etag_corresponde, json_bytes_response,
+)
 
 def resource_path(relative_path):
     """ Retorna o caminho absoluto para o recurso, funcionando para dev e para o PyInstaller """
@@ -42,11 +44,9 @@ async def lifespan(app: FastAPI):
     asyncio.create_task(service.start_monitoring())
     yield
     logging.info("Aplicação web encerrada.")
-    for observer in service.log_observers.values():
-        observer.stop()
-        observer.join()
+    await service.close()
 
-app = FastAPI(lifespan=lifespan)
+app = FastAPI(lifespan=lifespan, default_response_class=FastJSONResponse)
 
 # --- MIDDLEWARE (CORS) ---
 origins = ["*"]
@@ -57,6 +57,9 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+# ETag/304 e compressão br/gzip em todas as respostas JSON da API.
+camada_http = ResponseLayer()
+app.add_middleware(ResponseLayerMiddleware, camada=camada_http)
 
 # --- ARQUIVOS ESTÁTICOS E TEMPLATES ---
 app.mount("/static", StaticFiles(directory=resource_path("blockspy/web/static")), name="static")
@@ -71,12 +74,22 @@ class RconTestRequest(BaseModel):
     rcon_port: int
     rcon_password: str
 
+class RconBroadcastRequest(BaseModel):
+    command: str
+    servers: Optional[List[str]] = None
+    tipo_servidor: Optional[str] = None
+    only_online: bool = True
+    timeout: float = 10
+
 class ServerUpdateRequest(BaseModel):
     new_ip: Optional[str] = None
     custom_name: Optional[str] = None
     caminho_servidor: Optional[str] = None
     rcon_port: Optional[int] = None
     rcon_password: Optional[str] = None
+    # Limites do intervalo adaptativo, em segundos; null volta ao padrão.
+    intervalo_min: Optional[int] = Field(None, ge=5, le=3600)
+    intervalo_max: Optional[int] = Field(None, ge=5, le=3600)
 
 # --- GERENCIADOR DE WEBSOCKET ---
 class ConnectionManager:
@@ -118,7 +131,7 @@ async def test_rcon_endpoint(request_data: RconTestRequest):
             password=request_data.rcon_password
         )
         # Se a função acima não levantar erro, a conexão foi um sucesso.
-        return JSONResponse(content={"status": "ok", "message": "Conexão RCON validada com sucesso!"})
+        return FastJSONResponse(content={"status": "ok", "message": "Conexão RCON validada com sucesso!"})
 
     except RconAuthenticationError as e:
         # Se a senha estiver errada, retorna um erro 401 (Não Autorizado)
@@ -133,14 +146,38 @@ async def test_rcon_endpoint(request_data: RconTestRequest):
         logging.error(f"Erro inesperado no teste RCON: {e}", exc_info=True)
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Ocorreu um erro interno no servidor durante o teste.")
 
+@app.post("/api/rcon/broadcast")
+async def rcon_broadcast_endpoint(request_data: RconBroadcastRequest):
+    """
+    Executa um comando em vários servidores via RCON.
+
+    Sem 'servers', vale para todos os servidores com RCON configurado (filtrados
+    por 'tipo_servidor' e, com 'only_online', só os online). A resposta é NDJSON:
+    uma linha por servidor, na ordem em que terminam, e uma linha final de resumo.
+    """
+    try:
+        alvos = service.select_rcon_targets(
+            [ip.strip() for ip in request_data.servers] if request_data.servers else None,
+            request_data.tipo_servidor,
+            request_data.only_online,
+        )
+        resultados = service.broadcast_rcon_command(alvos, request_data.command, request_data.timeout)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+    async def linhas():
+        async for resultado in resultados:
+            yield dumps_json(resultado) + b"\n"
+
+    return StreamingResponse(linhas(), media_type="application/x-ndjson")
+
 @app.get("/", response_class=HTMLResponse)
 async def read_root(request: Request):
     return templates.TemplateResponse("index.html", {"request": request})
 
 @app.get("/api/servers")
 async def get_servers_status():
-    servers = await service.get_all_servers_status()
-    return JSONResponse(content=servers)
+    return json_bytes_response(*service.get_all_servers_json())
 
 @app.post("/api/servers", status_code=status.HTTP_201_CREATED)
 async def add_new_server(server_request: ServerAddRequest):
@@ -154,7 +191,7 @@ async def add_new_server(server_request: ServerAddRequest):
 async def update_server_endpoint(server_ip: str, request_data: ServerUpdateRequest):
     try:
         result = await service.update_server_details(server_ip.strip(), request_data)
-        return JSONResponse(content=result)
+        return FastJSONResponse(content=result)
     except ValueError as e:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
     except Exception as e:
@@ -176,41 +213,109 @@ async def toggle_server_pause_endpoint(server_ip: str):
     return {"message": f"Status de monitoramento para {server_ip} alterado."}
 
 @app.get("/api/servers/{server_ip}/history")
-async def get_server_history_endpoint(server_ip: str, hours: int = 24):
+async def get_server_history_endpoint(server_ip: str, hours: int = Query(24, ge=1, le=8760), points: Optional[int] = Query(None, ge=3, le=20000)):
     """
     Busca o histórico de um servidor.
-    Aceita um parâmetro de query 'hours' para definir o período.
+    Aceita um parâmetro de query 'hours' para definir o período e 'points'
+    para limitar a quantidade de pontos devolvidos (redução por LTTB).
     """
     # Parâmetro 'hours' passa para a função do serviço
-    history_data = await service.get_server_history(server_ip.strip(), hours=hours)
-    return JSONResponse(content=history_data)
+    history_data, etag = await service.get_cached_read(server_ip.strip(), 'history', hours=hours, points=points)
+    return json_bytes_response(history_data, etag)
+
+@app.get("/api/servers/{server_ip}/players/top")
+async def get_top_players_endpoint(server_ip: str, days: int = Query(7, ge=1, le=365), limit: int = Query(10, ge=1, le=100)):
+    """Jogadores com mais horas no servidor nos últimos 'days' dias."""
+    top, etag = await service.get_cached_read(server_ip.strip(), 'top_players', dias=days, limite=limit)
+    return json_bytes_response(top, etag)
+
+@app.get("/api/servers/{server_ip}/players/concurrency")
+async def get_session_concurrency_endpoint(server_ip: str, hours: int = Query(24, ge=1, le=720), minutes: int = Query(5, ge=1, le=1440)):
+    """Máximo de jogadores em sessão ao mesmo tempo, em intervalos de 'minutes' minutos."""
+    curva, etag = await service.get_cached_read(server_ip.strip(), 'concurrency', hours=hours, minutos=minutes)
+    return json_bytes_response(curva, etag)
+
+@app.get("/api/players/{player_name}/playtime")
+async def get_player_playtime_endpoint(player_name: str, days: int = Query(7, ge=1, le=365)):
+    """Tempo jogado por um jogador nos últimos 'days' dias, somado e por servidor."""
+    return await service.get_player_playtime(player_name.strip(), dias=days)
+
+@app.get("/api/servers/{server_ip}/logs/search")
+async def search_server_logs_endpoint(server_ip: str, q: str, limit: int = Query(50, ge=1, le=200),
+                                      before: Optional[int] = None, context: int = Query(2, ge=0, le=10)):
+    """
+    Busca nos logs do servidor (latest.log e logs/*.log.gz), dos mais recentes aos mais antigos.
+    Para a próxima página, repita a busca com 'before' igual ao 'proximo' da resposta.
+    """
+    try:
+        result = await service.search_logs(server_ip.strip(), q, limite=limit, antes=before, contexto=context)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    if result is None:
+        raise HTTPException(status_code=404, detail="Servidor não encontrado")
+    return result
 
 @app.get("/api/servers/{server_ip}/players")
 async def get_player_list_endpoint(server_ip: str):
-    player_history = await service.get_player_history(server_ip.strip())
-    return JSONResponse(content=player_history)
+    player_history, etag = await service.get_cached_read(server_ip.strip(), 'players')
+    return json_bytes_response(player_history, etag)
+
+def etag_matches(request: Request, etag: str) -> bool:
+    """Verifica se o cabeçalho If-None-Match do navegador contém a ETag atual."""
+    return etag_corresponde(request.headers.get("if-none-match"), etag)
 
 @app.get("/api/icon/{server_ip:path}")
-async def get_server_icon_proxy(server_ip: str):
-    url = f"https://api.mcsrvstat.us/icon/{server_ip}"
-    async with httpx.AsyncClient() as client:
-        try:
-            response = await client.get(url, timeout=10.0, follow_redirects=True)
-            response.raise_for_status()
-            content_type = response.headers.get('content-type', 'image/png')
-            return Response(content=response.content, media_type=content_type)
-        except (httpx.RequestError, httpx.HTTPStatusError) as e:
-            raise HTTPException(status_code=404, detail=f"Ícone não encontrado ou API externa falhou: {e}")
+async def get_server_icon(server_ip: str, request: Request, v: Optional[str] = None):
+    """
+    Serve o ícone salvo localmente a partir do status do servidor.
+    Com '?v=<hash>' a resposta é imutável; sem ele, o navegador revalida pela ETag.
+    """
+    icone_hash = await service.get_server_icon_hash(server_ip.strip())
+    if not icone_hash:
+        raise HTTPException(status_code=404, detail="Ícone não encontrado.")
+
+    etag = f'"{icone_hash}"'
+    cache_control = "public, max-age=31536000, immutable" if v == icone_hash else "no-cache"
+    headers = {"ETag": etag, "Cache-Control": cache_control}
+    if etag_matches(request, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    content = service.icons.read(icone_hash)
+    if content is None:
+        raise HTTPException(status_code=404, detail="Ícone não encontrado.")
+    return Response(content=content, media_type="image/png", headers=headers)
             
 @app.get("/api/servers/{server_ip}/stats")
 async def get_server_stats_endpoint(server_ip: str):
-    stats = await service.get_server_stats(server_ip.strip())
-    return JSONResponse(content=stats)
+    stats, etag = await service.get_cached_read(server_ip.strip(), 'stats')
+    return json_bytes_response(stats, etag)
+
+@app.get("/api/monitor/stats")
+async def get_monitor_stats_endpoint():
+    return FastJSONResponse(content={**service.get_monitor_stats(), "respostas_http": camada_http.stats()})
+
+@app.post("/api/dns/flush")
+async def flush_dns_cache_endpoint(host: Optional[str] = None):
+    """Limpa o cache de DNS/SRV. Sem 'host', limpa tudo."""
+    removidas = service.flush_dns_cache(host.strip() if host else None)
+    return {"message": f"{removidas} entrada(s) removida(s) do cache de DNS."}
+
+@app.post("/api/maintenance/retention")
+async def run_retention_endpoint(vacuum: bool = False):
+    """
+    Remove agora os dados mais antigos que a retenção configurada e devolve o relatório.
+    Com 'vacuum=1', reescreve o banco em seguida (bloqueia as gravações enquanto roda).
+    """
+    return FastJSONResponse(content=await service.run_retention(vacuum))
 
 @app.get("/api/servers/{server_ip}/heatmap")
-async def get_server_heatmap_endpoint(server_ip: str):
-    heatmap_data = await service.get_activity_heatmap(server_ip.strip())
-    return JSONResponse(content=heatmap_data)
+async def get_server_heatmap_endpoint(server_ip: str, tz: Optional[str] = None):
+    """Média de jogadores por dia da semana e hora nos últimos 30 dias. 'tz' é um fuso IANA (padrão UTC)."""
+    try:
+        heatmap_data = await service.get_activity_heatmap(server_ip.strip(), tz=tz)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return FastJSONResponse(content=heatmap_data)
 
 
 # --- ENDPOINT WEBSOCKET ---
@@ -251,22 +356,56 @@ async def console_websocket_endpoint(websocket: WebSocket, server_ip: str):
                 await manager.send_personal_message(error_msg, websocket)
 
     except WebSocketDisconnect:
+        pass
+    finally:
         if log_stream_task:
             log_stream_task.cancel()
-    finally:
         manager.disconnect(client_id)
         print(f"Cliente {client_id} desconectado do console.")
+
+@app.websocket("/ws/servers")
+async def servers_websocket_endpoint(websocket: WebSocket):
+    """
+    Painel ao vivo: envia um snapshot da lista de servidores ao conectar e depois
+    só os campos que mudaram, logo após cada lote de verificações ser gravado.
+    """
+    await websocket.accept()
+    assinante = service.feed.subscribe()
+
+    async def aguardar_desconexao():
+        # O navegador não manda nada por aqui; receber só serve para notar o fechamento.
+        while True:
+            await websocket.receive_text()
+
+    leitor = asyncio.create_task(aguardar_desconexao())
+    try:
+        await websocket.send_text(service.feed.snapshot())
+        while True:
+            proximo = asyncio.create_task(service.feed.next_frame(assinante))
+            await asyncio.wait({proximo, leitor}, return_when=asyncio.FIRST_COMPLETED)
+            if leitor.done():
+                proximo.cancel()
+                break
+            await websocket.send_text(proximo.result())
+    except (WebSocketDisconnect, RuntimeError):
+        pass
+    finally:
+        leitor.cancel()
+        service.feed.unsubscribe(assinante)
         
 @app.get("/api/servers/{server_ip}/calendar_heatmap")
-async def get_calendar_heatmap_endpoint(server_ip: str, year: int, month: int):
+async def get_calendar_heatmap_endpoint(server_ip: str, year: int, month: int, tz: Optional[str] = None):
     # Passa os parâmetros recebidos para a função do serviço
-    data = await service.get_calendar_heatmap_data(server_ip.strip(), year, month)
-    return JSONResponse(content=data)
+    try:
+        data = await service.get_calendar_heatmap_data(server_ip.strip(), year, month, tz=tz)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return FastJSONResponse(content=data)
 
 @app.get("/api/servers/{server_ip}/events")
 async def get_server_events_endpoint(server_ip: str):
-    events = await service.get_server_events(server_ip.strip())
-    return JSONResponse(content=events)
+    events, etag = await service.get_cached_read(server_ip.strip(), 'events')
+    return json_bytes_response(events, etag)
 
 @app.post("/api/shutdown")
 async def shutdown_server():
@@ -274,6 +413,7 @@ async def shutdown_server():
     Endpoint para desligar a aplicação de forma segura.
     """
     print("Comando de desligamento recebido. Encerrando o processo...")
+    await service.close()
     os._exit(0)
     return {"message": "Servidor está desligando."}
 
@@ -282,7 +422,7 @@ async def get_global_settings():
     # Simplificação: assume que o webhook é o mesmo para todos os servidores.
     # Pega a configuração do primeiro servidor adicionado.
     settings = await service.get_first_server_settings()
-    return JSONResponse(content=settings)
+    return FastJSONResponse(content=settings)
 
 @app.post("/api/settings/global")
 async def save_global_settings(settings: SettingsUpdate):
@@ -295,13 +435,13 @@ async def save_global_settings(settings: SettingsUpdate):
 @app.get("/api/watchlist/{server_ip}")
 async def get_watchlist(server_ip: str):
     watchlist = await service.get_watchlist_for_server(server_ip)
-    return JSONResponse(content=watchlist)
+    return FastJSONResponse(content=watchlist)
 
 @app.post("/api/watchlist/{server_ip}")
 async def add_to_watchlist(server_ip: str, player: WatchlistPlayer):
     try:
         result = await service.add_player_to_watchlist(server_ip, player.nome_jogador)
-        return JSONResponse(content=result, status_code=201)
+        return FastJSONResponse(content=result, status_code=201)
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
 
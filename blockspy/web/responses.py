@@ -0,0 +1,206 @@
+import asyncio
+import gzip
+import hashlib
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.responses import JSONResponse, Response
+
+from blockspy.utils import dumps_json
+
+try:
+    import brotli
+except ImportError:  # Sem o pacote brotli: só gzip.
+    brotli = None
+
+# Respostas menores que isso vão sem compressão (o cabeçalho gzip não compensa).
+MIN_BYTES_COMPRESSAO = 1024
+NIVEL_GZIP = 5
+# Qualidade baixa do brotli: já comprime mais que o gzip e é rápida o bastante para respostas dinâmicas.
+QUALIDADE_BROTLI = 4
+# Acima disso a compressão roda numa thread, para não travar o loop.
+MIN_BYTES_COMPRESSAO_EM_THREAD = 256 * 1024
+# Memória das versões já comprimidas, reaproveitadas enquanto a ETag não mudar.
+MAX_BYTES_VARIANTES = 8 * 1024 * 1024
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse serializada com `dumps_json` (orjson quando instalado)."""
+
+    def render(self, content) -> bytes:
+        return dumps_json(content)
+
+
+def json_bytes_response(corpo: bytes, etag: Optional[str] = None) -> Response:
+    """Resposta com JSON já serializado; a ETag, se houver, vem da versão dos dados."""
+    return Response(content=corpo, media_type="application/json", headers={"ETag": etag} if etag else None)
+
+
+def etag_corresponde(if_none_match: Optional[str], etag: str) -> bool:
+    """Comparação fraca do If-None-Match (RFC 9110): 'W/' não importa."""
+    if not if_none_match:
+        return False
+    alvo = etag[2:] if etag.startswith("W/") else etag
+    for tag in if_none_match.split(","):
+        tag = tag.strip()
+        if tag == "*" or (tag[2:] if tag.startswith("W/") else tag) == alvo:
+            return True
+    return False
+
+
+def escolher_codificacao(accept_encoding: Optional[str]) -> Optional[str]:
+    """Melhor codificação aceita pelo cliente: br, depois gzip."""
+    if not accept_encoding:
+        return None
+    aceitas = {}
+    for parte in accept_encoding.split(","):
+        nome, _, parametros = parte.partition(";")
+        qualidade = 1.0
+        parametros = parametros.strip()
+        if parametros.startswith("q="):
+            try:
+                qualidade = float(parametros[2:])
+            except ValueError:
+                qualidade = 0.0
+        aceitas[nome.strip().lower()] = qualidade
+    for codificacao in ("br", "gzip"):
+        if codificacao == "br" and brotli is None:
+            continue
+        if aceitas.get(codificacao, aceitas.get("*", 0)) > 0:
+            return codificacao
+    return None
+
+
+def comprimir(corpo: bytes, codificacao: str) -> bytes:
+    if codificacao == "br":
+        return brotli.compress(corpo, quality=QUALIDADE_BROTLI)
+    return gzip.compress(corpo, compresslevel=NIVEL_GZIP, mtime=0)
+
+
+class ResponseLayer:
+    """
+    Camada comum às respostas JSON da API: ETag, GET condicional e compressão.
+
+    Endpoints com dados versionados (lista de servidores, leituras em cache)
+    mandam a própria ETag; nos demais ela é o hash do corpo. Se o navegador já
+    tem essa versão, volta 304 sem corpo. Senão o corpo é comprimido com br ou
+    gzip conforme o Accept-Encoding, e a versão comprimida fica guardada pela
+    ETag para os próximos pedidos da mesma versão.
+    """
+
+    def __init__(self, min_bytes: int = MIN_BYTES_COMPRESSAO, max_bytes_variantes: int = MAX_BYTES_VARIANTES):
+        self.min_bytes = min_bytes
+        self.max_bytes_variantes = max_bytes_variantes
+        self._variantes: "OrderedDict[Tuple[str, str], bytes]" = OrderedDict()
+        self._bytes_variantes = 0
+        self._respostas = 0
+        self._nao_modificadas = 0
+        self._comprimidas = 0
+        self._variantes_reaproveitadas = 0
+        self._bytes_originais = 0
+        self._bytes_enviados = 0
+
+    async def _variante(self, etag: str, codificacao: str, corpo: bytes) -> bytes:
+        chave = (etag, codificacao)
+        comprimido = self._variantes.get(chave)
+        if comprimido is not None:
+            self._variantes.move_to_end(chave)
+            self._variantes_reaproveitadas += 1
+            return comprimido
+        if len(corpo) >= MIN_BYTES_COMPRESSAO_EM_THREAD:
+            comprimido = await asyncio.get_running_loop().run_in_executor(None, comprimir, corpo, codificacao)
+        else:
+            comprimido = comprimir(corpo, codificacao)
+        if len(comprimido) <= self.max_bytes_variantes:
+            self._variantes[chave] = comprimido
+            self._bytes_variantes += len(comprimido)
+            while self._bytes_variantes > self.max_bytes_variantes:
+                _, antigo = self._variantes.popitem(last=False)
+                self._bytes_variantes -= len(antigo)
+        return comprimido
+
+    async def preparar(self, metodo: str, pedido: Headers, cabecalhos: MutableHeaders, corpo: bytes) -> Tuple[int, bytes]:
+        """Ajusta os cabeçalhos de uma resposta 200 e devolve (status, corpo) a enviar."""
+        self._respostas += 1
+        self._bytes_originais += len(corpo)
+        etag = cabecalhos.get("etag")
+        if etag is None:
+            etag = f'W/"{hashlib.blake2b(corpo, digest_size=12).hexdigest()}"'
+            cabecalhos["ETag"] = etag
+        if "cache-control" not in cabecalhos:
+            # Pode guardar, mas sempre confirma a versão antes de usar.
+            cabecalhos["Cache-Control"] = "no-cache"
+        cabecalhos.add_vary_header("Accept-Encoding")
+
+        if metodo in ("GET", "HEAD") and etag_corresponde(pedido.get("if-none-match"), etag):
+            self._nao_modificadas += 1
+            del cabecalhos["content-length"]
+            del cabecalhos["content-type"]
+            return 304, b""
+
+        codificacao = escolher_codificacao(pedido.get("accept-encoding")) if len(corpo) >= self.min_bytes else None
+        if codificacao:
+            corpo = await self._variante(etag, codificacao, corpo)
+            cabecalhos["Content-Encoding"] = codificacao
+            self._comprimidas += 1
+        cabecalhos["Content-Length"] = str(len(corpo))
+        self._bytes_enviados += len(corpo)
+        return 200, corpo
+
+    def stats(self) -> dict:
+        return {
+            "respostas": self._respostas,
+            "nao_modificadas_304": self._nao_modificadas,
+            "comprimidas": self._comprimidas,
+            "variantes_em_cache": len(self._variantes),
+            "variantes_reaproveitadas": self._variantes_reaproveitadas,
+            "bytes_originais": self._bytes_originais,
+            "bytes_enviados": self._bytes_enviados,
+        }
+
+
+class ResponseLayerMiddleware:
+    """Middleware ASGI que aplica a `ResponseLayer` às respostas JSON 200 sob `prefixo`."""
+
+    def __init__(self, app, camada: ResponseLayer, prefixo: str = "/api/"):
+        self.app = app
+        self.camada = camada
+        self.prefixo = prefixo
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not scope["path"].startswith(self.prefixo):
+            await self.app(scope, receive, send)
+            return
+
+        inicio = None
+        repassar = False
+        partes = []
+
+        async def enviar(mensagem):
+            nonlocal inicio, repassar
+            if mensagem["type"] == "http.response.start":
+                cabecalhos = Headers(raw=mensagem["headers"])
+                # Streams (NDJSON, SSE), erros e respostas já codificadas passam direto.
+                repassar = (
+                    mensagem["status"] != 200
+                    or not cabecalhos.get("content-type", "").startswith("application/json")
+                    or "content-encoding" in cabecalhos
+                )
+                if repassar:
+                    await send(mensagem)
+                else:
+                    inicio = mensagem
+                return
+            if repassar or mensagem["type"] != "http.response.body":
+                await send(mensagem)
+                return
+            partes.append(mensagem.get("body", b""))
+            if mensagem.get("more_body", False):
+                return
+            cabecalhos = MutableHeaders(raw=list(inicio["headers"]))
+            status, corpo = await self.camada.preparar(scope["method"], Headers(scope=scope), cabecalhos, b"".join(partes))
+            await send({"type": "http.response.start", "status": status, "headers": cabecalhos.raw})
+            await send({"type": "http.response.body", "body": corpo})
+
+        await self.app(scope, receive, enviar)
@@ -142,6 +142,7 @@ async function setLanguage(lang) {
     const serverListContainer = document.getElementById('server-list');
     const UPDATE_INTERVAL = 20000;
     const DETAILS_UPDATE_INTERVAL = 20000;
+    const HISTORY_MAX_POINTS = 1000;
     let allServersCache = [];
     let currentOpenServer = null;
     let historyChart = null;
@@ -434,7 +435,7 @@ async function setLanguage(lang) {
 
         const displayName = server.nome_customizado || server.nome_servidor || server.ip_servidor;
         const iconHTML = (server.tem_icone_customizado == 1)
-            ? `<div class="server-icon" data-lazy-type="icon" data-ip="${server.ip_servidor}"><span>${(displayName || '?').replace(/§[0-9a-fk-or]/gi, '').charAt(0).toUpperCase()}</span></div>`
+            ? `<div class="server-icon" data-lazy-type="icon" data-ip="${server.ip_servidor}" data-icon-hash="${server.icone_hash || ''}"><span>${(displayName || '?').replace(/§[0-9a-fk-or]/gi, '').charAt(0).toUpperCase()}</span></div>`
             : `<div class="server-icon" data-ip="${server.ip_servidor}"><img src="/static/grass.png" alt="Ícone padrão"></div>`;
 
         const flagImg = server.country_code ? `<img src="https://flagcdn.com/w20/${server.country_code.toLowerCase()}.png" alt="${server.localizacao}" class="flag-icon">` : '';
@@ -533,6 +534,23 @@ function setupConsole(serverIp) {
         }
         
         const msg = JSON.parse(event.data);
+        if (msg.type === 'log_batch') {
+            // Várias linhas do log num só quadro: monta tudo fora da página e insere de uma vez.
+            const fragment = document.createDocumentFragment();
+            for (const text of msg.data) {
+                const batchLine = document.createElement('div');
+                batchLine.className = 'log-line';
+                if (text.includes('<') && text.includes('>')) {
+                    batchLine.classList.add('log-chat');
+                }
+                batchLine.textContent = text;
+                fragment.appendChild(batchLine);
+            }
+            logDisplay.appendChild(fragment);
+            logDisplay.scrollTop = logDisplay.scrollHeight;
+            return;
+        }
+
         const logLine = document.createElement('div');
         logLine.textContent = msg.data;
 
@@ -594,13 +612,16 @@ function setupConsole(serverIp) {
     async function loadIcon(iconContainer) {
         const ip = iconContainer.dataset.ip;
         if (!ip) return;
-        const cachedBlob = await appCache.get(ip);
+        // O hash do ícone entra na chave do cache e na URL, então um ícone novo nunca é confundido com o antigo.
+        const iconHash = iconContainer.dataset.iconHash || '';
+        const cacheKey = iconHash ? `${ip}#${iconHash}` : ip;
+        const cachedBlob = iconHash ? await appCache.get(cacheKey) : null;
         if (cachedBlob) { const url = URL.createObjectURL(cachedBlob); const img = new Image(); img.src = url; img.onload = () => { iconContainer.innerHTML = ''; iconContainer.appendChild(img); URL.revokeObjectURL(url); }; return; }
         try {
-            const response = await fetch(`/api/icon/${ip}`);
-            if (!response.ok) throw new Error('Proxy falhou.');
+            const response = await fetch(iconHash ? `/api/icon/${ip}?v=${iconHash}` : `/api/icon/${ip}`);
+            if (!response.ok) throw new Error('Ícone indisponível.');
             const blob = await response.blob();
-            await appCache.set(ip, blob);
+            if (iconHash) await appCache.set(cacheKey, blob);
             const url = URL.createObjectURL(blob);
             const img = new Image(); img.src = url; img.onload = () => { iconContainer.innerHTML = ''; iconContainer.appendChild(img); URL.revokeObjectURL(url); };
         } catch (error) { console.error(`Falha ao carregar ícone para ${ip}:`, error); }
@@ -617,6 +638,54 @@ function setupConsole(serverIp) {
         applyFilterAndSort();
     } catch (error) { console.error("Falha ao buscar dados dos servidores:", error); if(serverListContainer) serverListContainer.innerHTML = '<p class="empty-message">Erro ao carregar servidores.</p>';}
 }
+
+    // --- PAINEL AO VIVO ---
+    // Recebe um snapshot ao conectar e depois só os campos que mudaram em cada servidor.
+    // Se o WebSocket cair (ou não existir), volta para a busca periódica até reconectar.
+    let serversSocket = null;
+
+    function startPollingFallback() {
+        if (!updateIntervalId) updateIntervalId = setInterval(fetchAndUpdateServers, UPDATE_INTERVAL);
+    }
+
+    function applyServersFrame(frame) {
+        if (frame.type === 'snapshot') {
+            allServersCache = frame.servers;
+        } else if (frame.type === 'diff') {
+            const byId = new Map(allServersCache.map(server => [server.id, server]));
+            frame.servers.forEach(changes => {
+                const existing = byId.get(changes.id);
+                if (existing) Object.assign(existing, changes);
+                else allServersCache.push(changes);
+            });
+            if (frame.removed && frame.removed.length) {
+                const removed = new Set(frame.removed);
+                allServersCache = allServersCache.filter(server => !removed.has(server.id));
+            }
+        }
+        populateFilters();
+        applyFilterAndSort();
+    }
+
+    function startLiveUpdates() {
+        if (serversSocket) return;
+        if (!('WebSocket' in window)) { startPollingFallback(); return; }
+
+        const protocol = window.location.protocol === 'https:' ? 'wss' : 'ws';
+        serversSocket = new WebSocket(`${protocol}://${window.location.host}/ws/servers`);
+        serversSocket.onopen = () => {
+            if (updateIntervalId) { clearInterval(updateIntervalId); updateIntervalId = null; }
+        };
+        serversSocket.onmessage = (event) => {
+            try { applyServersFrame(JSON.parse(event.data)); }
+            catch (error) { console.error("Quadro inválido do painel ao vivo:", error); }
+        };
+        serversSocket.onclose = () => {
+            serversSocket = null;
+            startPollingFallback();
+            setTimeout(startLiveUpdates, UPDATE_INTERVAL / 4);
+        };
+    }
     
     async function showDetailsView(serverObject) {
     currentOpenServer = serverObject;
@@ -646,6 +715,7 @@ function setupConsole(serverIp) {
     if (iconContainer) {
         iconContainer.innerHTML = '';
         iconContainer.dataset.ip = serverObject.ip_servidor;
+        iconContainer.dataset.iconHash = serverObject.icone_hash || '';
         if (serverObject.tem_icone_customizado == 1) {
             loadIcon(iconContainer);
         } else {
@@ -661,7 +731,7 @@ function setupConsole(serverIp) {
     if(statAvgEl) statAvgEl.textContent = '--';
 
     const serverIp = serverObject.ip_servidor;
-    const isRconConfigured = serverObject.rcon_port && serverObject.rcon_password;
+    const isRconConfigured = serverObject.rcon_port && serverObject.rcon_configurado;
     updateConsoleUI(isRconConfigured, serverObject);
 
     const periodSelector = document.querySelector('.chart-period-selector');
@@ -671,7 +741,7 @@ function setupConsole(serverIp) {
         try {
             // --- MUDANÇA 2: Removemos a busca do heatmap daqui ('calendarResponse') ---
             const [historyResponse, playersResponse, statsResponse, eventsResponse] = await Promise.all([
-                fetch(`/api/servers/${serverIp}/history?hours=${hours}`),
+                fetch(`/api/servers/${serverIp}/history?hours=${hours}&points=${HISTORY_MAX_POINTS}`),
                 fetch(`/api/servers/${serverIp}/players`),
                 fetch(`/api/servers/${serverIp}/stats`),
                 fetch(`/api/servers/${serverIp}/events`)
@@ -1208,7 +1278,9 @@ const customTooltipHandler = (context) => {
         const month = date.getMonth() + 1; // JS month é 0-11, API espera 1-12
 
         // Chama a nossa NOVA API com os parâmetros
-        const response = await fetch(`/api/servers/${serverIp}/calendar_heatmap?year=${year}&month=${month}`);
+        // Os dias do calendário seguem o fuso horário do navegador
+        const timeZone = Intl.DateTimeFormat().resolvedOptions().timeZone || 'UTC';
+        const response = await fetch(`/api/servers/${serverIp}/calendar_heatmap?year=${year}&month=${month}&tz=${encodeURIComponent(timeZone)}`);
         if (!response.ok) throw new Error("API do heatmap falhou");
 
         const heatmapData = await response.json();
@@ -1235,7 +1307,7 @@ function renderCalendarHeatmap(data, maxPlayers, referenceDate) {
     const dayGridContainer = document.createElement('div');
     dayGridContainer.className = 'heatmap-day-grid';
 
-    const dataMap = new Map(data.map(d => [new Date(Number(d.timestamp) * 1000).toISOString().split('T')[0], d.value]));
+    const dataMap = new Map(data.map(d => [d.date || new Date(Number(d.timestamp) * 1000).toISOString().split('T')[0], d.value]));
     const currentYear = referenceDate.getFullYear();
     const currentMonth = referenceDate.getMonth();
     const firstDayOfMonth = new Date(currentYear, currentMonth, 1);
@@ -1280,7 +1352,8 @@ function renderCalendarHeatmap(data, maxPlayers, referenceDate) {
         // ---- A LÓGICA CORRIGIDA ESTÁ AQUI ----
         if (date <= today) {
             // DIAS PASSADOS: Pinta com a cor da atividade ou um cinza claro se não houver dados.
-            const dateString = date.toISOString().split('T')[0];
+            // Data local (a API devolve os dias já no fuso do navegador)
+            const dateString = `${date.getFullYear()}-${String(date.getMonth() + 1).padStart(2, '0')}-${String(date.getDate()).padStart(2, '0')}`;
             const value = dataMap.get(dateString) || 0;
             dayCell.style.backgroundColor = getColorForLotação(value, maxPlayers);
             
@@ -1376,10 +1449,11 @@ function renderCalendarHeatmap(data, maxPlayers, referenceDate) {
     editIpInput.value = serverData.ip_servidor;
     editPathInput.value = serverData.caminho_servidor || '';
     editRconPortInput.value = serverData.rcon_port || '';
-    editRconPassInput.value = serverData.rcon_password || '';
+    // A senha nunca vem do servidor; o campo vazio mantém a senha já salva.
+    editRconPassInput.value = '';
 
     // A LÓGICA DO COFRE
-    const isRconConfigured = serverData.rcon_port && serverData.rcon_password;
+    const isRconConfigured = serverData.rcon_port && serverData.rcon_configurado;
 
     if (isRconConfigured) {
         // Se já está configurado, TRAVA os campos e mostra o botão de editar
@@ -1925,7 +1999,7 @@ function exportToCsv(filename, rows) {
 
         // --- LÓGICA FINAL DE CARREGAMENTO ---
         await fetchAndUpdateServers();
-        updateIntervalId = setInterval(fetchAndUpdateServers, UPDATE_INTERVAL);
+        startLiveUpdates();
 
     const shutdownBtn = document.getElementById('shutdown-button');
 if (shutdownBtn) {
@@ -2082,7 +2156,7 @@ async function initializeApp() {
 
         // Finalmente, busca os dados e inicia o monitoramento
         await fetchAndUpdateServers();
-        updateIntervalId = setInterval(fetchAndUpdateServers, UPDATE_INTERVAL);
+        startLiveUpdates();
         
     } catch (error) {
         console.error("Erro fatal na inicialização do script:", error);
@@ -3,6 +3,7 @@ import webbrowser
 import threading
 import time
 import sys
+import multiprocessing
 import os
 
 if hasattr(sys, '_MEIPASS'):
@@ -25,6 +26,8 @@ def run_server():
     uvicorn.run(app, host="127.0.0.1", port=8000, log_level="info")
 
 if __name__ == '__main__':
+    # Necessário para os processos de verificação (BLOCKSPY_POLL_WORKERS) no executável do PyInstaller.
+    multiprocessing.freeze_support()
     print("Iniciando BlockSpy...")
 
     server_thread = threading.Thread(target=run_server)